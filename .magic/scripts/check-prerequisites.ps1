@@ -9,11 +9,19 @@ $indexPath = ".design\INDEX.md"
 $rulesPath = ".design\RULES.md"
 $planPath = ".design\PLAN.md"
 $tasksPath = ".design\TASKS.md"
+$shardsDir = ".design\INDEX.d"
 
 $indexExists = Test-Path $indexPath
 $rulesExists = Test-Path $rulesPath
 $planExists = Test-Path $planPath
 $tasksExists = Test-Path $tasksPath
+
+# Registry: INDEX.md plus optional domain shards in INDEX.d\*.md, merged in name order
+$shardFiles = @()
+if (Test-Path $shardsDir -PathType Container) {
+    $shardFiles = @(Get-ChildItem -Path $shardsDir -Filter "*.md" -File | Sort-Object Name | ForEach-Object { $_.FullName })
+}
+$shardCount = $shardFiles.Count
 # Write-Host "DEBUG: CWD is $(Get-Location)"
 $checksumsExists = Test-Path ".magic\.checksums"
 
@@ -67,17 +75,24 @@ $draftCount = 0
 $rfcCount = 0
 
 if ($indexExists) {
-    $lines = Get-Content $indexPath
+    $lines = @(Get-Content $indexPath)
+    foreach ($shard in $shardFiles) { $lines += Get-Content $shard }
     $stableCount = ($lines | Where-Object { $_ -match "\|\s*Stable\s*\|" }).Count
     $draftCount = ($lines | Where-Object { $_ -match "\|\s*Draft\s*\|" }).Count
     $rfcCount = ($lines | Where-Object { $_ -match "\|\s*RFC\s*\|" }).Count
     $specCount = $stableCount + $draftCount + $rfcCount
+
+    # A spec must be registered exactly once across INDEX.md and its shards
+    $registered = $lines | Where-Object { $_ -match "^\|\s*\[.*?\]\((?:\.\./)?specifications/(.*?\.md)\)" } | ForEach-Object {
+        if ($_ -match "specifications/(.*?\.md)") { $Matches[1] }
+    }
+    foreach ($dup in ($registered | Group-Object | Where-Object { $_.Count -gt 1 })) {
+        $warnings += "Registry Duplicate: '$($dup.Name)' is registered more than once across INDEX.md and INDEX.d/"
+    }
     
     if ($indexExists -and $planExists) {
         # Extract spec filenames from INDEX.md
-        $indexSpecs = $lines | Where-Object { $_ -match "\|\s*\[.*?\]\(specifications/(.*?\.md)\)" } | ForEach-Object { 
-            if ($_ -match "specifications/(.*?\.md)") { $Matches[1] }
-        }
+        $indexSpecs = $registered | Select-Object -Unique
         
         # Check if each spec from INDEX.md exists on disk and is in PLAN.md
         $planContent = Get-Content $planPath -Raw
@@ -100,7 +115,7 @@ if ($indexExists) {
         }
         
         # Sync Gap Check: Compare INDEX.md version with PLAN.md "Based on" version
-        $indexVersionMatch = $lines | Select-String -Pattern "^\*\*Version:\*\* ([\d\.]+)"
+        $indexVersionMatch = Get-Content $indexPath | Select-String -Pattern "^\*\*Version:\*\* ([\d\.]+)"
         if ($indexVersionMatch) {
             $indexVersion = $indexVersionMatch.Matches.Groups[1].Value
             $planBasedOnMatch = Select-String -Path $planPath -Pattern "^\*\*Based on:\*\* .*? v([\d\.]+)"
@@ -115,11 +130,13 @@ if ($indexExists) {
         # Rule 57 Check: Layer Integrity (L2 Stable/RFC requires Stable L1)
         $specMetadata = @{}
         foreach ($line in $lines) {
-            if ($line -match "\|\s*\[(.*?)\]\(specifications/(.*?\.md)\)\s*\|\s*.*?\s*\|\s*(.*?)\s*\|\s*(.*?)\s*\|") {
+            if ($line -match "\|\s*\[(.*?)\]\((?:\.\./)?specifications/(.*?\.md)\)\s*\|\s*.*?\s*\|\s*(.*?)\s*\|\s*(.*?)\s*\|") {
                 $file = $Matches[2]
                 $status = $Matches[3].Trim()
                 $layer = $Matches[4].Trim()
-                $specMetadata[$file] = @{ status = $status; layer = $layer }
+                if (-not $specMetadata.ContainsKey($file)) {
+                    $specMetadata[$file] = @{ status = $status; layer = $layer }
+                }
             }
         }
 
@@ -170,6 +187,7 @@ if ($json) {
         design_dir = ".design"
         artifacts = @{
             "INDEX.md" = @{ exists = $indexExists; path = ".design/INDEX.md" }
+            "INDEX.d"  = @{ exists = ($shardCount -gt 0); path = ".design/INDEX.d"; shards = $shardCount }
             "RULES.md" = @{ exists = $rulesExists; path = ".design/RULES.md" }
             "PLAN.md"  = @{ exists = $planExists; path = ".design/PLAN.md" }
             "TASKS.md" = @{ exists = $tasksExists; path = ".design/TASKS.md" }
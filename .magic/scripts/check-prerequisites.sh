@@ -61,12 +61,30 @@ INDEX_PATH=".design/INDEX.md"
 RULES_PATH=".design/RULES.md"
 PLAN_PATH=".design/PLAN.md"
 TASKS_PATH=".design/TASKS.md"
+SHARDS_DIR=".design/INDEX.d"
 
 [ -f "$INDEX_PATH" ] && INDEX_EXISTS="true" || INDEX_EXISTS="false"
 [ -f "$RULES_PATH" ] && RULES_EXISTS="true" || RULES_EXISTS="false"
 [ -f "$PLAN_PATH" ] && PLAN_EXISTS="true" || PLAN_EXISTS="false"
 [ -f "$TASKS_PATH" ] && TASKS_EXISTS="true" || TASKS_EXISTS="false"
 
+# Registry: INDEX.md plus optional domain shards in INDEX.d/*.md, merged in name order
+REGISTRY_FILES=()
+[ "$INDEX_EXISTS" = "true" ] && REGISTRY_FILES+=("$INDEX_PATH")
+SHARD_COUNT=0
+if [ -d "$SHARDS_DIR" ]; then
+    for shard in "$SHARDS_DIR"/*.md; do
+        [ -f "$shard" ] || continue
+        REGISTRY_FILES+=("$shard")
+        SHARD_COUNT=$((SHARD_COUNT + 1))
+    done
+fi
+[ "$SHARD_COUNT" -gt 0 ] && SHARDS_EXIST="true" || SHARDS_EXIST="false"
+
+registry_rows() {
+    [ ${#REGISTRY_FILES[@]} -gt 0 ] && cat "${REGISTRY_FILES[@]}" || true
+}
+
 if [ "$INDEX_EXISTS" = "false" ]; then
     MISSING+=("INDEX.md")
 fi
@@ -89,10 +107,16 @@ DRAFT_COUNT=0
 RFC_COUNT=0
 
 if [ "$INDEX_EXISTS" = "true" ]; then
-    STABLE_COUNT=$(grep -c "| Stable |" "$INDEX_PATH" || true)
-    DRAFT_COUNT=$(grep -c "| Draft |" "$INDEX_PATH" || true)
-    RFC_COUNT=$(grep -c "| RFC |" "$INDEX_PATH" || true)
+    STABLE_COUNT=$(registry_rows | grep -c "| Stable |" || true)
+    DRAFT_COUNT=$(registry_rows | grep -c "| Draft |" || true)
+    RFC_COUNT=$(registry_rows | grep -c "| RFC |" || true)
     SPEC_COUNT=$((STABLE_COUNT + DRAFT_COUNT + RFC_COUNT))
+
+    # A spec must be registered exactly once across INDEX.md and its shards
+    DUPLICATE_SPECS=$(registry_rows | grep "^| \[" | grep -o "specifications/[^)]*\.md" | sed 's|specifications/||' | sort | uniq -d || true)
+    for spec in $DUPLICATE_SPECS; do
+        WARNINGS+=("Registry Duplicate: '$spec' is registered more than once across INDEX.md and INDEX.d/")
+    done
 fi
 
 if [ "$REQ_SPECS" = "1" ] && [ "$STABLE_COUNT" -eq 0 ]; then
@@ -113,7 +137,7 @@ fi
 
 if [ "$PLAN_EXISTS" = "true" ] && [ "$INDEX_EXISTS" = "true" ]; then
     # Extract spec filenames from INDEX.md
-    INDEX_SPECS=$(grep -o "specifications/[^)]*\.md" "$INDEX_PATH" | sed 's|specifications/||' || true)
+    INDEX_SPECS=$(registry_rows | grep -o "specifications/[^)]*\.md" | sed 's|specifications/||' | sort -u || true)
     
     # Check if each spec registered in INDEX exists and is in PLAN
     for spec in $INDEX_SPECS; do
@@ -153,7 +177,7 @@ if [ "$PLAN_EXISTS" = "true" ] && [ "$INDEX_EXISTS" = "true" ]; then
                 if [ -f ".design/specifications/$file" ]; then
                     parent=$(grep -m 1 "\*\*Implements:\*\*" ".design/specifications/$file" | grep -o "specifications/[^)]*\.md" | sed 's|specifications/||' | head -n 1)
                     if [ ! -z "$parent" ]; then
-                        parent_status=$(grep "| \[$parent\]" "$INDEX_PATH" | awk -F'|' '{print $4}' | xargs)
+                        parent_status=$(registry_rows | grep "| \[$parent\]" | head -n 1 | awk -F'|' '{print $4}' | xargs)
                         if [ ! -z "$parent_status" ] && [ "$parent_status" != "Stable" ]; then
                             WARNINGS+=("Rule 57 Violation: L2 spec '$file' is $status, but its L1 parent '$parent' is $parent_status (Must be Stable).")
                         fi
@@ -161,7 +185,7 @@ if [ "$PLAN_EXISTS" = "true" ] && [ "$INDEX_EXISTS" = "true" ]; then
                 fi
             fi
         fi
-    done < "$INDEX_PATH"
+    done < <(registry_rows)
 fi
 
 if [ ${#MISSING[@]} -gt 0 ]; then
@@ -200,6 +224,7 @@ if [ "$JSON_OUTPUT" = "1" ]; then
   "design_dir": ".design",
   "artifacts": {
     "INDEX.md":  { "exists": $INDEX_EXISTS,  "path": "$INDEX_PATH" },
+    "INDEX.d":   { "exists": $SHARDS_EXIST, "path": "$SHARDS_DIR", "shards": $SHARD_COUNT },
     "RULES.md":  { "exists": $RULES_EXISTS,  "path": "$RULES_PATH" },
     "PLAN.md":   { "exists": $PLAN_EXISTS, "path": "$PLAN_PATH"  },
     "TASKS.md":  { "exists": $TASKS_EXISTS, "path": "$TASKS_PATH" },
@@ -1,4 +1,6 @@
 const { spawn } = require('child_process');
+const crypto = require('crypto');
+const os = require('os');
 const path = require('path');
 const fs = require('fs');
 
@@ -36,13 +38,225 @@ if (fs.existsSync(jsPath)) {
     }
 }
 
-const child = spawn(command, cmdArgs, { stdio: 'inherit', shell: false });
+/**
+ * Per-user cache root, matching the magic-spec CLI (MAGIC_SPEC_CACHE_DIR overrides).
+ */
+function userCacheDir() {
+    if (process.env.MAGIC_SPEC_CACHE_DIR) {
+        return process.env.MAGIC_SPEC_CACHE_DIR;
+    }
+    const home = os.homedir();
+    if (isWindows) {
+        return path.join(process.env.LOCALAPPDATA || path.join(home, 'AppData', 'Local'), 'magic-spec');
+    }
+    if (process.platform === 'darwin') {
+        return path.join(home, 'Library', 'Caches', 'magic-spec');
+    }
+    return path.join(process.env.XDG_CACHE_HOME || path.join(home, '.cache'), 'magic-spec');
+}
 
-child.on('exit', (code) => {
-    process.exit(code || 0);
-});
+const projectRoot = path.resolve(__dirname, '..', '..');
 
-child.on('error', (err) => {
-    console.error(`Failed to start script: ${err.message}`);
-    process.exit(1);
-});
+/**
+ * Cache key of the project root, two levels above this script (same as the CLI).
+ */
+function projectKey() {
+    return crypto.createHash('sha256').update(fs.realpathSync(projectRoot)).digest('hex').slice(0, 16);
+}
+
+/**
+ * Project-relative files each script may write. A file counts as written by a
+ * run when its modification time changed while the script ran.
+ */
+const SCRIPT_OUTPUTS = {
+    'init': ['.design/INDEX.md', '.design/RULES.md'],
+    'generate-context': ['.design/CONTEXT.md'],
+    'generate-checksums': ['.magic/.checksums'],
+};
+const METRICS_FILES_CAP = 50;
+
+function outputStamps() {
+    return (SCRIPT_OUTPUTS[scriptName] || []).map((file) => {
+        try {
+            return fs.statSync(path.join(projectRoot, file)).mtimeMs;
+        } catch (e) {
+            return null;
+        }
+    });
+}
+
+function writtenSince(before) {
+    const after = outputStamps();
+    return (SCRIPT_OUTPUTS[scriptName] || []).filter((file, i) => after[i] !== null && after[i] !== before[i]);
+}
+
+/**
+ * Appends one run record to the project's metrics log (read by `magic-spec stats`).
+ * Same schema as the CLI's records: `filesWritten` lists at most
+ * METRICS_FILES_CAP paths, `filesWrittenCount` has the full number.
+ * Recording must never change the script's outcome, so errors are ignored.
+ */
+function recordRun(exitCode, durationMs, written, extra) {
+    if (process.env.MAGIC_SPEC_NO_METRICS) {
+        return;
+    }
+    try {
+        const logPath = path.join(userCacheDir(), 'metrics', `${projectKey()}.jsonl`);
+        const record = {
+            v: 2,
+            ts: new Date().toISOString(),
+            source: 'executor',
+            command: `script:${scriptName}`,
+            exitCode,
+            durationMs: Math.round(durationMs * 1000) / 1000,
+            args: args.length,
+            filesWritten: written.slice(0, METRICS_FILES_CAP),
+            filesWrittenCount: written.length,
+            ...extra,
+        };
+        fs.mkdirSync(path.dirname(logPath), { recursive: true });
+        fs.appendFileSync(logPath, `${JSON.stringify(record)}\n`);
+    } catch (e) {
+        // Metrics are best effort.
+    }
+}
+
+/**
+ * Regenerations that parallel agents tend to request at the same moment.
+ * They run one at a time per project, and a request is dropped when a run
+ * that started after it has already finished: N agents cause one write.
+ */
+const COALESCED_SCRIPTS = new Set(['generate-context', 'generate-checksums']);
+const LOCK_TIMEOUT_MS = 120000;
+const LOCK_POLL_MS = 25;
+
+function isAlive(pid) {
+    try {
+        process.kill(pid, 0);
+        return true;
+    } catch (e) {
+        return e.code === 'EPERM';
+    }
+}
+
+/**
+ * Takes an exclusive lock by creating `lockPath` (holding our pid). A lock
+ * left behind by a process that no longer exists is removed.
+ */
+function acquireLock(lockPath) {
+    const deadline = Date.now() + LOCK_TIMEOUT_MS;
+    return new Promise((resolve, reject) => {
+        const attempt = () => {
+            try {
+                fs.writeFileSync(lockPath, String(process.pid), { flag: 'wx' });
+                resolve();
+                return;
+            } catch (e) {
+                if (e.code !== 'EEXIST') {
+                    reject(e);
+                    return;
+                }
+            }
+            let owner = NaN;
+            try {
+                owner = parseInt(fs.readFileSync(lockPath, 'utf8'), 10);
+            } catch (e) {
+                // Released or still being written; retry below.
+            }
+            if (owner && !isAlive(owner)) {
+                try {
+                    fs.unlinkSync(lockPath);
+                } catch (e) {
+                    // Another waiter cleaned it up first.
+                }
+                setImmediate(attempt);
+            } else if (Date.now() > deadline) {
+                reject(new Error(`timed out waiting for ${path.basename(lockPath)}`));
+            } else {
+                setTimeout(attempt, LOCK_POLL_MS);
+            }
+        };
+        attempt();
+    });
+}
+
+function runScript() {
+    return new Promise((resolve) => {
+        const child = spawn(command, cmdArgs, { stdio: 'inherit', shell: false });
+        child.on('exit', (code) => resolve(code || 0));
+        child.on('error', (err) => {
+            console.error(`Failed to start script: ${err.message}`);
+            resolve(1);
+        });
+    });
+}
+
+/**
+ * Runs the script and reports which of its known outputs it wrote.
+ */
+async function runTracked() {
+    const before = outputStamps();
+    const code = await runScript();
+    return { code, written: writtenSince(before) };
+}
+
+async function runCoalesced() {
+    const requestedAt = Date.now();
+    const lockDir = path.join(userCacheDir(), 'locks', projectKey());
+    const key = args.length
+        ? `${scriptName}-${crypto.createHash('sha256').update(args.join('\0')).digest('hex').slice(0, 8)}`
+        : scriptName;
+    const lockPath = path.join(lockDir, `${key}.lock`);
+    const stampPath = path.join(lockDir, `${key}.done`);
+    fs.mkdirSync(lockDir, { recursive: true });
+
+    await acquireLock(lockPath);
+    try {
+        let lastStart = 0;
+        try {
+            lastStart = JSON.parse(fs.readFileSync(stampPath, 'utf8')).startedAt || 0;
+        } catch (e) {
+            // No completed run recorded yet.
+        }
+        if (lastStart >= requestedAt) {
+            console.log(`${scriptName}: already regenerated by a concurrent run.`);
+            return { code: 0, coalesced: true, written: [] };
+        }
+        const runStartedAt = Date.now();
+        const { code, written } = await runTracked();
+        if (code === 0) {
+            const tmpPath = `${stampPath}.${process.pid}.tmp`;
+            fs.writeFileSync(tmpPath, JSON.stringify({ startedAt: runStartedAt }));
+            fs.renameSync(tmpPath, stampPath);
+        }
+        return { code, coalesced: false, written };
+    } finally {
+        try {
+            fs.unlinkSync(lockPath);
+        } catch (e) {
+            // Already gone.
+        }
+    }
+}
+
+const startedAt = process.hrtime.bigint();
+const elapsedMs = () => Number(process.hrtime.bigint() - startedAt) / 1e6;
+
+if (COALESCED_SCRIPTS.has(scriptName)) {
+    runCoalesced().then(
+        ({ code, coalesced, written }) => {
+            recordRun(code, elapsedMs(), written, coalesced ? { coalesced } : undefined);
+            process.exit(code);
+        },
+        (err) => {
+            console.error(`Failed to run ${scriptName}: ${err.message}`);
+            recordRun(1, elapsedMs(), []);
+            process.exit(1);
+        },
+    );
+} else {
+    runTracked().then(({ code, written }) => {
+        recordRun(code, elapsedMs(), written);
+        process.exit(code);
+    });
+}
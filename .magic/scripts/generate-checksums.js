@@ -5,6 +5,8 @@ const crypto = require('crypto');
 const MAGIC_DIR = path.join(__dirname, '..');
 const CHECKSUMS_FILE = '.checksums';
 const CHECKSUMS_PATH = path.join(MAGIC_DIR, CHECKSUMS_FILE);
+// Temporary files of a write in progress (see run()); never hashed.
+const TEMP_FILE_PATTERN = /^\.checksums\..+\.tmp$/;
 
 /**
  * Calculates SHA256 hash of a file.
@@ -25,6 +27,9 @@ function getAllFiles(dirPath, arrayOfFiles) {
     arrayOfFiles = arrayOfFiles || [];
 
     files.forEach((file) => {
+        if (TEMP_FILE_PATTERN.test(file)) {
+            return;
+        }
         if (fs.statSync(path.join(dirPath, file)).isDirectory()) {
             arrayOfFiles = getAllFiles(path.join(dirPath, file), arrayOfFiles);
         } else {
@@ -61,9 +66,12 @@ function run() {
         checksums[relativePath] = getFileHash(fullPath);
     });
 
-    // Write to .checksums
+    // Write to a temporary file and rename it over .checksums, so a reader
+    // (or a concurrent run) never sees a truncated file.
     const output = JSON.stringify(checksums, null, 2);
-    fs.writeFileSync(CHECKSUMS_PATH, output + '\n');
+    const tmpPath = path.join(MAGIC_DIR, `${CHECKSUMS_FILE}.${process.pid}.tmp`);
+    fs.writeFileSync(tmpPath, output + '\n');
+    fs.renameSync(tmpPath, CHECKSUMS_PATH);
 
     console.log(`Successfully updated ${CHECKSUMS_PATH}`);
     console.log(`Files processed: ${Object.keys(checksums).length}`);
@@ -66,4 +66,15 @@ $structure${codeFence}
 $recentChanges
 "@
 
-Set-Content -Path $contextFile -Value $outputStr -Encoding UTF8
+# Write next to the target and swap it in, so readers never see a partial file.
+$tmpFile = Join-Path $designDir (".CONTEXT.md." + [System.IO.Path]::GetRandomFileName())
+try {
+    Set-Content -Path $tmpFile -Value $outputStr -Encoding UTF8
+    if (Test-Path $contextFile) {
+        [System.IO.File]::Replace((Resolve-Path $tmpFile).Path, (Resolve-Path $contextFile).Path, $null)
+    } else {
+        Move-Item -Path $tmpFile -Destination $contextFile
+    }
+} finally {
+    if (Test-Path $tmpFile) { Remove-Item -Path $tmpFile -Force }
+}
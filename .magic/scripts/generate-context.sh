@@ -10,13 +10,10 @@ if [ ! -d "$DESIGN_DIR" ]; then
     exit 1
 fi
 
-echo "# Project Context" > "$CONTEXT_FILE"
-echo "" >> "$CONTEXT_FILE"
-echo "**Generated:** $(date +%Y-%m-%d)" >> "$CONTEXT_FILE"
-echo "" >> "$CONTEXT_FILE"
-
-echo "## Active Technologies" >> "$CONTEXT_FILE"
-echo "" >> "$CONTEXT_FILE"
+# Build the file next to its target and rename it into place, so readers
+# never see a half-written CONTEXT.md.
+TMP_FILE=$(mktemp "$DESIGN_DIR/.CONTEXT.md.XXXXXX")
+trap 'rm -f "$TMP_FILE"' EXIT
 
 TECH_LIST=""
 [ -f "package.json" ]    && TECH_LIST="$TECH_LIST - Node.js\n"
@@ -26,31 +23,43 @@ TECH_LIST=""
 [ -f "go.mod" ]          && TECH_LIST="$TECH_LIST - Go\n"
 [ -f "Makefile" ]        && TECH_LIST="$TECH_LIST - Make\n"
 
-if [ -z "$TECH_LIST" ]; then
-    echo "- Unknown (no manifest detected)" >> "$CONTEXT_FILE"
-else
-    echo -e "$TECH_LIST" >> "$CONTEXT_FILE"
-fi
-echo "" >> "$CONTEXT_FILE"
-
-echo "## Core Project Structure" >> "$CONTEXT_FILE"
-echo "" >> "$CONTEXT_FILE"
-echo "\`\`\`plaintext" >> "$CONTEXT_FILE"
-if command -v tree &> /dev/null; then
-    tree -L 2 -I 'node_modules|target|.git|.venv|__pycache__' >> "$CONTEXT_FILE"
-else
-    echo "- Project root" >> "$CONTEXT_FILE"
-    echo "  - .design/" >> "$CONTEXT_FILE"
-    echo "  - .magic/"  >> "$CONTEXT_FILE"
-fi
-echo "\`\`\`" >> "$CONTEXT_FILE"
-echo "" >> "$CONTEXT_FILE"
-
-echo "## Recent Changes" >> "$CONTEXT_FILE"
-echo "" >> "$CONTEXT_FILE"
-if [ -f "$CHANGELOG_FILE" ]; then
-    tail -n 15 "$CHANGELOG_FILE" >> "$CONTEXT_FILE"
-else
-    echo "No recent changelog found." >> "$CONTEXT_FILE"
-fi
-echo "" >> "$CONTEXT_FILE"
+{
+    echo "# Project Context"
+    echo ""
+    echo "**Generated:** $(date +%Y-%m-%d)"
+    echo ""
+
+    echo "## Active Technologies"
+    echo ""
+    if [ -z "$TECH_LIST" ]; then
+        echo "- Unknown (no manifest detected)"
+    else
+        echo -e "$TECH_LIST"
+    fi
+    echo ""
+
+    echo "## Core Project Structure"
+    echo ""
+    echo "\`\`\`plaintext"
+    if command -v tree &> /dev/null; then
+        tree -L 2 -I 'node_modules|target|.git|.venv|__pycache__'
+    else
+        echo "- Project root"
+        echo "  - .design/"
+        echo "  - .magic/"
+    fi
+    echo "\`\`\`"
+    echo ""
+
+    echo "## Recent Changes"
+    echo ""
+    if [ -f "$CHANGELOG_FILE" ]; then
+        tail -n 15 "$CHANGELOG_FILE"
+    else
+        echo "No recent changelog found."
+    fi
+    echo ""
+} > "$TMP_FILE"
+
+chmod 644 "$TMP_FILE"
+mv -f "$TMP_FILE" "$CONTEXT_FILE"
@@ -8,6 +8,18 @@ foreach ($dir in @($D, "$D/specifications", "$D/tasks", "$D/archives/tasks")) {
 }
 $Date = Get-Date -Format "yyyy-MM-dd"
 
+# Sharded registry: rows live in INDEX.d/<domain>.md, INDEX.md keeps version and history
+$ShardCount = @(Get-ChildItem -Path "$D/INDEX.d" -Filter "*.md" -File -ErrorAction SilentlyContinue).Count
+if ($ShardCount -gt 0) {
+    $RegistrySection = "Specifications are registered in domain shards under [INDEX.d/](INDEX.d/), one file per domain."
+} else {
+    $RegistrySection = @"
+| File | Description | Status | Layer | Version |
+| :--- | :--- | :--- | :--- | :--- |
+<!-- Add your specifications here -->
+"@
+}
+
 $IndexPath = "$D/INDEX.md"
 if (!(Test-Path $IndexPath)) {
     Set-Content $IndexPath -Encoding UTF8 @"
@@ -22,9 +34,7 @@ Central registry of all project specifications and their current state.
 - [RULES.md](RULES.md) - Project constitution and standing conventions.
 
 ## Domain Specifications
-| File | Description | Status | Layer | Version |
-| :--- | :--- | :--- | :--- | :--- |
-<!-- Add your specifications here -->
+$RegistrySection
 
 ## Meta Information
 - **Maintainer**: Core Team
@@ -33,6 +43,9 @@ Central registry of all project specifications and their current state.
 "@
     Write-Host "Created .design/INDEX.md"
 }
+if ($ShardCount -gt 0) {
+    Write-Host "Found $ShardCount registry shard(s) in .design/INDEX.d/"
+}
 
 $RulesPath = "$D/RULES.md"
 if (!(Test-Path $RulesPath)) {
@@ -7,6 +7,16 @@ DESIGN_DIR=".design"
 mkdir -p "$DESIGN_DIR/specifications" "$DESIGN_DIR/tasks" "$DESIGN_DIR/archives/tasks"
 DATE=$(date +%Y-%m-%d)
 
+# Sharded registry: rows live in INDEX.d/<domain>.md, INDEX.md keeps version and history
+SHARD_COUNT=$(find "$DESIGN_DIR/INDEX.d" -maxdepth 1 -name "*.md" -type f 2>/dev/null | wc -l | tr -d ' ')
+if [ "$SHARD_COUNT" -gt 0 ]; then
+REGISTRY_SECTION="Specifications are registered in domain shards under [INDEX.d/](INDEX.d/), one file per domain."
+else
+REGISTRY_SECTION="| File | Description | Status | Layer | Version |
+| :--- | :--- | :--- | :--- | :--- |
+<!-- Add your specifications here -->"
+fi
+
 if [ ! -f "$DESIGN_DIR/INDEX.md" ]; then
 cat <<EOF > "$DESIGN_DIR/INDEX.md"
 # Specifications Registry
@@ -20,9 +30,7 @@ Central registry of all project specifications and their current state.
 - [RULES.md](RULES.md) - Project constitution and standing conventions.
 
 ## Domain Specifications
-| File | Description | Status | Layer | Version |
-| :--- | :--- | :--- | :--- | :--- |
-<!-- Add your specifications here -->
+$REGISTRY_SECTION
 
 ## Meta Information
 - **Maintainer**: Core Team
@@ -31,6 +39,9 @@ Central registry of all project specifications and their current state.
 EOF
 echo "Created .design/INDEX.md"
 fi
+if [ "$SHARD_COUNT" -gt 0 ]; then
+echo "Found $SHARD_COUNT registry shard(s) in .design/INDEX.d/"
+fi
 
 if [ ! -f "$DESIGN_DIR/RULES.md" ]; then
 cat <<'EOF' > "$DESIGN_DIR/RULES.md"
@@ -1,2 +1,3 @@
 """magic-spec: Specification-Driven Development (SDD) Workflow Installer."""
+
 __version__ = "1.3.2"
@@ -5,114 +5,96 @@ from __future__ import annotations
 
 import json
 import os
-import hashlib
+import contextlib
 import pathlib
 import re
 import shutil
 import subprocess
 import sys
-import tarfile
 import tempfile
+import time
 from importlib.metadata import PackageNotFoundError, version as package_version
 import urllib.error
 import urllib.request
 
-
-def _find_installer_config_path() -> pathlib.Path:
-    candidates = [
-        pathlib.Path(__file__).with_name("config.json"),
-        pathlib.Path(__file__).resolve().parents[2] / "config.json",
-    ]
-    for config_path in candidates:
-        if config_path.exists():
-            return config_path
-    raise RuntimeError("installers/config.json was not found.")
-
-
-def _require_non_empty_str(value: object, field_name: str) -> str:
-    if not isinstance(value, str) or not value.strip():
-        raise RuntimeError(
-            f"Invalid installers/config.json: field '{field_name}' must be a non-empty string."
-        )
-    return value.strip()
-
-
-def _require_positive_int(value: object, field_name: str) -> int:
-    if not isinstance(value, int) or value <= 0:
-        raise RuntimeError(
-            f"Invalid installers/config.json: field '{field_name}' must be a positive integer."
-        )
-    return value
-
-
-def _load_installer_config() -> dict:
-    config_path = _find_installer_config_path()
-    try:
-        parsed = json.loads(config_path.read_text(encoding="utf-8"))
-    except Exception as e:
-        raise RuntimeError(f"Failed to read installers/config.json: {e}") from e
-
-    if not isinstance(parsed, dict):
-        raise RuntimeError(
-            "Invalid installers/config.json: root must be a JSON object."
-        )
-
-    github_repo = _require_non_empty_str(parsed.get("githubRepo"), "githubRepo")
-    package_name = _require_non_empty_str(parsed.get("packageName"), "packageName")
-
-    download_cfg = parsed.get("download")
-    if not isinstance(download_cfg, dict):
-        raise RuntimeError(
-            "Invalid installers/config.json: field 'download' must be an object."
-        )
-    timeout_ms = _require_positive_int(
-        download_cfg.get("timeoutMs"), "download.timeoutMs"
-    )
-
-    user_agent_cfg = parsed.get("userAgent")
-    if not isinstance(user_agent_cfg, dict):
-        raise RuntimeError(
-            "Invalid installers/config.json: field 'userAgent' must be an object."
-        )
-    python_user_agent = _require_non_empty_str(
-        user_agent_cfg.get("python"), "userAgent.python"
-    )
-
-    return {
-        "githubRepo": github_repo,
-        "packageName": package_name,
-        "download": {
-            "timeoutMs": timeout_ms,
-            "tempPrefix": parsed["download"].get("tempPrefix", "magic-spec-"),
-        },
-        "userAgent": {"python": python_user_agent},
-        "ejectTargets": parsed.get("eject", {}).get(
-            "targets", [".magic", ".agent", ".magic.bak", ".agent.bak"]
-        ),
-        "removePrefix": parsed.get("removePrefix", ""),
-        "engineDir": _require_non_empty_str(parsed.get("engineDir"), "engineDir"),
-        "agentDir": _require_non_empty_str(parsed.get("agentDir"), "agentDir"),
-        "workflowsDir": _require_non_empty_str(
-            parsed.get("workflowsDir"), "workflowsDir"
-        ),
-        "defaultExt": _require_non_empty_str(parsed.get("defaultExt"), "defaultExt"),
-        "workflows": parsed.get("workflows", []),
-        "magicFiles": parsed.get("magicFiles", []),
-    }
-
-
-INSTALLER_CONFIG = _load_installer_config()
-GITHUB_REPO = INSTALLER_CONFIG["githubRepo"]
-PACKAGE_NAME = INSTALLER_CONFIG["packageName"]
-DOWNLOAD_TIMEOUT_SECONDS = INSTALLER_CONFIG["download"]["timeoutMs"] / 1000.0
-PYTHON_USER_AGENT = INSTALLER_CONFIG["userAgent"]["python"]
-DEFAULT_REMOVE_PREFIX = INSTALLER_CONFIG["removePrefix"]
-ENGINE_DIR = INSTALLER_CONFIG["engineDir"]
-AGENT_DIR = INSTALLER_CONFIG["agentDir"]
-WORKFLOWS_DIR = INSTALLER_CONFIG["workflowsDir"]
-DEFAULT_EXT = INSTALLER_CONFIG["defaultExt"]
-WORKFLOWS = INSTALLER_CONFIG["workflows"]
-MAGIC_FILES = INSTALLER_CONFIG["magicFiles"]
+if __package__ in (None, ""):
+    # Run as a script: make the magic_spec package importable.
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from magic_spec.core import (
+    ADAPTER_MANIFEST_FILE,
+    ADAPTER_MANIFEST_SCHEMA_VERSION,
+    AGENT_DIR,
+    BACKUP_DIR,
+    DEFAULT_EXT,
+    DEFAULT_PAYLOAD_FORMAT,
+    DESIGN_DIR,
+    ENGINE_DIR,
+    INSTALLER_CONFIG,
+    MAGIC_FILES,
+    PACKAGE_NAME,
+    PAYLOAD_FORMATS,
+    PYTHON_USER_AGENT,
+    RELEASES_CACHE_TTL_SECONDS,
+    RELEASES_ENDPOINT,
+    RELEASES_TIMEOUT_SECONDS,
+    WORKFLOWS,
+    WORKFLOWS_DIR,
+    _REPORT,
+    _TRACE,
+    _get_file_checksum,
+    _print_error,
+    _print_warning,
+    _sha256_bytes,
+    _user_cache_dir,
+)
+from magic_spec.fsio import (
+    BulkWriter,
+    StagedInstall,
+    _atomic_write,
+)
+from magic_spec.adapters import (
+    _adapter_dest_name,
+    _default_adapter,
+    _materialize_adapter_links,
+    _render_workflow_bytes,
+    adapter_manifest_entry,
+    install_adapter,
+    load_adapter_manifest,
+    load_adapters,
+    refresh_adapter_store,
+    update_adapters,
+)
+from magic_spec.download import (
+    download_and_extract,
+)
+from magic_spec.backups import (
+    create_backup,
+    run_rollback,
+)
+from magic_spec.metrics import (
+    cli_run_record,
+    record_run,
+    run_stats,
+)
+from magic_spec.tasks import (
+    run_analytics,
+    run_tasks,
+)
+from magic_spec.changelog import (
+    run_changelog,
+)
+from magic_spec.registry import (
+    run_index,
+)
+from magic_spec.search import (
+    run_get,
+    run_search,
+)
+from magic_spec.pack import (
+    _parse_budget,
+    run_pack,
+)
 
 
 def _resolve_package_version() -> str:
@@ -146,13 +128,6 @@ def _resolve_package_version() -> str:
     )
 
 
-def get_download_url(version: str) -> str:
-    """Returns the tarball URL for the given version tag."""
-    if version == "main":
-        return f"https://github.com/{GITHUB_REPO}/archive/refs/heads/main.tar.gz"
-    return f"https://github.com/{GITHUB_REPO}/archive/refs/tags/v{version}.tar.gz"
-
-
 def _parse_csv_values(raw: str) -> list[str]:
     return [item.strip() for item in raw.split(",") if item.strip()]
 
@@ -177,152 +152,6 @@ def _parse_env_values(args: list[str]) -> list[str]:
     return unique
 
 
-def _is_within_directory(base_dir: pathlib.Path, target: pathlib.Path) -> bool:
-    try:
-        target.relative_to(base_dir)
-        return True
-    except ValueError:
-        return False
-
-
-def _safe_extract_tar(archive_path: str, extract_dir: pathlib.Path) -> None:
-    with tarfile.open(archive_path, "r:gz") as tar:
-        resolved_base = extract_dir.resolve()
-        for member in tar.getmembers():
-            member_path = (resolved_base / member.name).resolve()
-            if not _is_within_directory(resolved_base, member_path):
-                raise RuntimeError(
-                    f"Unsafe tar entry detected outside target directory: {member.name}"
-                )
-        tar.extractall(path=extract_dir)
-
-
-def download_and_extract(version: str, target_dir: pathlib.Path) -> pathlib.Path:
-    """
-    Downloads the GitHub release tarball for the version and extracts it
-    to a temporary directory. Returns the path to the extracted project root.
-    """
-    url = get_download_url(version)
-    version_label = "main branch" if version == "main" else f"v{version}"
-    print(f"Downloading magic-spec payload ({version_label}) from GitHub...")
-
-    try:
-        req = urllib.request.Request(url, headers={"User-Agent": PYTHON_USER_AGENT})
-        with urllib.request.urlopen(req, timeout=DOWNLOAD_TIMEOUT_SECONDS) as response:
-            with tempfile.NamedTemporaryFile(
-                suffix=".tar.gz", delete=False
-            ) as tmp_file:
-                shutil.copyfileobj(response, tmp_file)
-                tmp_path = tmp_file.name
-    except urllib.error.HTTPError as e:
-        if e.code == 404:
-            print(f"Error: Release {version} not found on GitHub.")
-            print("   (Use --fallback-main to pull from the main branch instead)")
-            sys.exit(1)
-        else:
-            print(f"HTTP error downloading payload: {e}")
-            sys.exit(1)
-    except Exception as e:
-        print(f"Error downloading payload: {e}")
-        sys.exit(1)
-
-    print("Extracting payload...")
-    extract_dir = (
-        target_dir / f"{INSTALLER_CONFIG['download']['tempPrefix']}extraction-{version}"
-    )
-    extract_dir.mkdir(parents=True, exist_ok=True)
-
-    try:
-        _safe_extract_tar(tmp_path, extract_dir)
-    except Exception as e:
-        print(f"Error extracting payload: {e}")
-        sys.exit(1)
-    finally:
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
-
-    # Find the extracted root (github tarballs usually have a single root dir like magic-spec-1.1.0)
-    extracted_items = list(extract_dir.iterdir())
-    if len(extracted_items) == 1 and extracted_items[0].is_dir():
-        return extracted_items[0]
-    return extract_dir
-
-
-def _copy_dir(src: pathlib.Path, dest: pathlib.Path) -> None:
-    if not src.exists():
-        print(f"Warning: source not found: {src}")
-        return
-    shutil.copytree(src, dest, dirs_exist_ok=True)
-
-
-def _convert_to_toml(content: str, description: str) -> str:
-    # Escape quotes and backslashes for TOML triple-quoted strings
-    escaped_content = content.replace("\\", "\\\\").replace('"""', '\\"\\"\\"')
-    escaped_desc = description.replace("\\", "\\\\")
-    return 'description = "{}"\n\nprompt = """\n{}\n"""\n'.format(
-        escaped_desc, escaped_content
-    )
-
-
-def _convert_to_mdc(content: str, description: str) -> str:
-    return f"---\ndescription: {description}\nglobs: \n---\n{content}"
-
-
-def install_adapter(
-    source_root: pathlib.Path, dest: pathlib.Path, env: str, adapters: dict
-) -> None:
-    adapter = adapters.get(env)
-    if not adapter:
-        print(f"⚠️  Unknown --env value: '{env}'.")
-        print(f"   Valid values: {', '.join(adapters.keys())}")
-        print(f"   Falling back to default {AGENT_DIR}/")
-        _copy_dir(source_root / AGENT_DIR, dest / AGENT_DIR)
-        return
-
-    src_dir = source_root / AGENT_DIR / WORKFLOWS_DIR
-    dest_dir = dest / adapter["dest"]
-
-    if not src_dir.exists():
-        print(f"⚠️  Source {AGENT_DIR}/{WORKFLOWS_DIR}/ not found.")
-        return
-
-    dest_dir.mkdir(parents=True, exist_ok=True)
-    target_ext = adapter["ext"]
-    remove_prefix = (
-        adapter["removePrefix"] if "removePrefix" in adapter else DEFAULT_REMOVE_PREFIX
-    )
-
-    for wf_name in WORKFLOWS:
-        src_file = src_dir / (wf_name + DEFAULT_EXT)
-        if not src_file.exists():
-            continue
-        dest_name = src_file.stem
-        if remove_prefix and dest_name.startswith(remove_prefix):
-            dest_name = dest_name[len(remove_prefix) :]
-
-        is_toml = adapter.get("format") == "toml" or target_ext == ".toml"
-        is_mdc = adapter.get("format") == "mdc" or target_ext == ".mdc"
-        full_dest_name = dest_name + target_ext
-        dest_file = dest_dir / full_dest_name
-
-        if is_toml:
-            content = src_file.read_text(encoding="utf-8")
-            description = f"Magic SDD Workflow: {full_dest_name}"
-            dest_file.write_text(
-                _convert_to_toml(content, description), encoding="utf-8"
-            )
-        elif is_mdc:
-            content = src_file.read_text(encoding="utf-8")
-            description = f"Magic SDD Workflow: {full_dest_name}"
-            dest_file.write_text(
-                _convert_to_mdc(content, description), encoding="utf-8"
-            )
-        else:
-            shutil.copy2(src_file, dest_file)
-
-    print(f"Adapter installed: {env} -> {adapter['dest']}/ ({target_ext})")
-
-
 def run_doctor(dest: pathlib.Path) -> int:
     is_windows = sys.platform == "win32"
     check_script = (
@@ -331,7 +160,7 @@ def run_doctor(dest: pathlib.Path) -> int:
         else dest / ENGINE_DIR / "scripts" / "check-prerequisites.sh"
     )
     if not check_script.exists():
-        print("Error: SDD engine not initialized. Run magic-spec first.")
+        _print_error("Error: SDD engine not initialized. Run magic-spec first.")
         return 1
 
     print(f"🔍 {PACKAGE_NAME} Doctor:")
@@ -350,7 +179,7 @@ def run_doctor(dest: pathlib.Path) -> int:
 
         result = subprocess.run(cmd, capture_output=True, text=True, check=False)
         if result.returncode != 0:
-            print(
+            _print_error(
                 f"Error: doctor prerequisite script failed with code {result.returncode}."
             )
             if result.stderr:
@@ -358,18 +187,27 @@ def run_doctor(dest: pathlib.Path) -> int:
             return 1
 
         json_str = result.stdout.strip()
-        match = re.search(r"\{.*\}", json_str, re.DOTALL)
-        if match:
-            json_str = match.group(0)
-        if not json_str:
-            print("Error: doctor output did not contain JSON.")
-            return 1
-
-        data = json.loads(json_str)
+        try:
+            data = json.loads(json_str)
+        except ValueError:
+            # Older engine scripts print banner lines around the JSON object.
+            match = re.search(r"\{.*\}", json_str, re.DOTALL)
+            if not match:
+                _print_error("Error: doctor output did not contain JSON.")
+                return 1
+            data = json.loads(match.group(0))
         arts = data.get("artifacts", {})
+        checks: dict[str, dict] = {}
+        _REPORT.result = {"artifacts": checks, "specs": arts.get("specs", {})}
 
         def check_item(name: str, item: dict, required_hint: str = "") -> None:
-            if item and item.get("exists"):
+            present = bool(item and item.get("exists"))
+            checks[name] = {
+                "present": present,
+                "path": item.get("path", f".design/{name}") if item else None,
+                "hint": None if present else required_hint or None,
+            }
+            if present:
                 print(f"✅ {item.get('path', name)} is present")
             else:
                 hint = f" (Hint: {required_hint})" if required_hint else ""
@@ -378,6 +216,11 @@ def run_doctor(dest: pathlib.Path) -> int:
         check_item("INDEX.md", arts.get("INDEX.md", {}), "Run /magic.spec")
         check_item("RULES.md", arts.get("RULES.md", {}), "Created at init")
 
+        shards = arts.get("INDEX.d", {}).get("shards", 0)
+        _REPORT.result["registryShards"] = shards
+        if shards:
+            print(f"✅ {shards} registry shard(s) in .design/INDEX.d/")
+
         if "PLAN.md" in arts:
             check_item("PLAN.md", arts["PLAN.md"], "Run /magic.task")
         if "TASKS.md" in arts:
@@ -385,7 +228,7 @@ def run_doctor(dest: pathlib.Path) -> int:
 
         warnings = data.get("warnings", [])
         for warn in warnings:
-            print(f"Warning: {warn}")
+            _print_warning(f"Warning: {warn}")
 
         specs = arts.get("specs", {})
         if specs:
@@ -395,7 +238,7 @@ def run_doctor(dest: pathlib.Path) -> int:
         return 0
 
     except Exception as e:
-        print(f"Failed to parse doctor output: {e}")
+        _print_error(f"Failed to parse doctor output: {e}")
         return 1
 
 
@@ -425,20 +268,89 @@ def run_info(dest: pathlib.Path) -> int:
         f"Engine            : {ENGINE_DIR}/     {'✅ present' if engine_present else '❌ missing'}"
     )
 
-    workspace_present = (dest / ".design").exists()
+    workspace_present = (dest / DESIGN_DIR).exists()
     print(
         f"Workspace         : .design/    {'✅ present' if workspace_present else '❌ missing'}"
     )
+    _REPORT.result = {
+        "installedVersion": None if installed_version == "none" else installed_version,
+        "activeEnv": active_env,
+        "engine": engine_present,
+        "workspace": workspace_present,
+    }
 
     print("────────────────────────────────")
     print(f"Run `{PACKAGE_NAME} --update` to refresh engine files.")
     return 0
 
 
-def run_check(dest: pathlib.Path) -> int:
+def _version_key(value: str) -> tuple:
+    """Sort key for release versions like "1.10.0" (non-numeric parts rank 0)."""
+    parts = re.split(r"[.+-]", value.strip().lstrip("vV"))
+    return tuple(int(p) if p.isdigit() else 0 for p in parts[:3])
+
+
+def _release_cache_path() -> pathlib.Path:
+    return _user_cache_dir() / "latest-release.json"
+
+
+def fetch_latest_release(refresh: bool = False) -> tuple[str | None, str]:
+    """
+    Returns (latest released version, where it came from). The answer and its
+    ETag are cached in the user cache dir: within the TTL no request is made,
+    afterwards a conditional `If-None-Match` request usually gets a cheap 304.
+    Network failures fall back to a stale cached answer ("stale") or None
+    ("offline"). MAGIC_SPEC_RELEASES_URL overrides the configured endpoint.
+    """
+    endpoint = os.environ.get("MAGIC_SPEC_RELEASES_URL") or RELEASES_ENDPOINT
+    cache_path = _release_cache_path()
+    try:
+        cached = json.loads(cache_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        cached = {}
+    if not isinstance(cached, dict) or cached.get("endpoint") != endpoint:
+        cached = {}
+
+    now = time.time()
+    age = now - cached.get("fetchedAt", 0)
+    if cached.get("version") and not refresh and age < RELEASES_CACHE_TTL_SECONDS:
+        return cached["version"], "cache"
+
+    headers = {"User-Agent": PYTHON_USER_AGENT, "Accept": "application/json"}
+    if cached.get("etag") and cached.get("version"):
+        headers["If-None-Match"] = cached["etag"]
+    req = urllib.request.Request(endpoint, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=RELEASES_TIMEOUT_SECONDS) as response:
+            release = json.loads(response.read().decode("utf-8"))
+            etag = response.headers.get("ETag")
+        tag = release.get("tag_name") if isinstance(release, dict) else None
+        if not isinstance(tag, str) or not tag:
+            raise ValueError("release response has no tag_name")
+        cached = {"endpoint": endpoint, "version": tag.lstrip("vV"), "etag": etag}
+        source = "network"
+    except urllib.error.HTTPError as e:
+        if e.code != 304:
+            return cached.get("version"), "stale" if cached else "offline"
+        source = "not-modified"
+    except Exception:
+        return cached.get("version"), "stale" if cached else "offline"
+
+    cached["fetchedAt"] = now
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        _atomic_write(cache_path, json.dumps(cached))
+    except OSError:
+        pass
+    return cached["version"], source
+
+
+def run_check(dest: pathlib.Path, remote: bool = True, refresh: bool = False) -> int:
     version_file = dest / ENGINE_DIR / ".version"
     if not version_file.exists():
-        print(f"⚠️  Not installed via magic-spec (no {ENGINE_DIR}/.version file)")
+        _print_warning(
+            f"⚠️  Not installed via magic-spec (no {ENGINE_DIR}/.version file)"
+        )
         return 0
 
     installed_version = version_file.read_text(encoding="utf-8").strip()
@@ -449,43 +361,44 @@ def run_check(dest: pathlib.Path) -> int:
 
     print(f"Installed version: {installed_version}")
     print(f"Package version:   {current_version}")
+    _REPORT.result = {
+        "installedVersion": installed_version,
+        "packageVersion": current_version,
+        "upToDate": installed_version == current_version,
+        "latestRelease": None,
+        "latestSource": None,
+        "updateAvailable": None,
+    }
 
     if installed_version == current_version:
         print(f"✅ magic-spec {current_version} — up to date")
     else:
         print(f"⚠️  Installed: {installed_version} | Package: {current_version}")
         print("   Run --update to upgrade")
-    return 0
-
 
-def create_backup(dest: pathlib.Path) -> None:
-    print("📦 Creating backup of existing engine files...")
-    magic_dir = dest / ENGINE_DIR
-    if magic_dir.exists():
-        _copy_dir(magic_dir, dest / f"{ENGINE_DIR}.bak")
-
-    agent_dir = dest / AGENT_DIR
-    if agent_dir.exists():
-        _copy_dir(agent_dir, dest / f"{AGENT_DIR}.bak")
-
-    # Update .gitignore
-    gitignore_file = dest / ".gitignore"
-    if gitignore_file.exists():
-        content = gitignore_file.read_text(encoding="utf-8")
-        altered = False
-        for entry in [f"{ENGINE_DIR}.bak/", f"{AGENT_DIR}.bak/"]:
-            if entry not in content:
-                content += f"\n{entry}"
-                altered = True
-        if altered:
-            gitignore_file.write_text(content.strip() + "\n", encoding="utf-8")
+    if not remote:
+        return 0
+    latest_version, source = fetch_latest_release(refresh=refresh)
+    _REPORT.result["latestSource"] = source
+    if latest_version is None:
+        print("Latest release:    unknown (release lookup failed)")
+        return 0
+    note = {"cache": " (cached)", "stale": " (cached, lookup failed)"}.get(source, "")
+    print(f"Latest release:    {latest_version}{note}")
+    newer = _version_key(latest_version) > _version_key(installed_version)
+    _REPORT.result["latestRelease"] = latest_version
+    _REPORT.result["updateAvailable"] = newer
+    if newer:
+        print(f"⬆️  Newer release available: {latest_version}")
+        print(f"   Run `{PACKAGE_NAME} --update` to upgrade")
+    return 0
 
 
 def run_eject(dest: pathlib.Path, auto_accept: bool = False) -> int:
     print("\n⚠️  This will remove:")
     print(f"   -  {ENGINE_DIR}/")
     print(f"   -  {AGENT_DIR}/  (or active env adapter dir)")
-    print(f"   -  {ENGINE_DIR}.bak/  (if exists)")
+    print(f"   -  {BACKUP_DIR}/  (if exists)")
     print("\n   Your .design/ workspace will NOT be affected.")
 
     should_run = auto_accept
@@ -497,7 +410,12 @@ def run_eject(dest: pathlib.Path, auto_accept: bool = False) -> int:
             should_run = False
 
     if should_run:
+        # Adapter files linked into .magic/rendered/ would dangle otherwise.
+        materialized = _materialize_adapter_links(dest, load_adapters())
+        if materialized:
+            print(f"📄 Replaced {materialized} adapter link(s) with copies.")
         targets = INSTALLER_CONFIG["ejectTargets"]
+        removed = []
         for target in targets:
             p = dest / target
             if p.exists():
@@ -505,40 +423,92 @@ def run_eject(dest: pathlib.Path, auto_accept: bool = False) -> int:
                     shutil.rmtree(p)
                 else:
                     p.unlink()
+                removed.append(target)
                 print(f"🗑️  Removed: {target}/")
+        _REPORT.result = {"ejected": True, "removed": removed}
         print(f"✅ {PACKAGE_NAME} ejected successfully.")
         return 0
     else:
+        _REPORT.result = {"ejected": False, "removed": []}
         print("❌ Eject cancelled.")
         return 0
 
 
-def _detect_environment(dest: pathlib.Path, adapters: dict) -> str | None:
+def _build_marker_index(adapters: dict) -> dict[str, list[str]]:
+    """Maps each marker path to the adapters using it, in registry order."""
+    index: dict[str, list[str]] = {}
     for env, item in adapters.items():
         marker = item.get("marker")
-        if marker and (dest / marker).exists():
-            return env
-    return None
+        if marker:
+            index.setdefault(marker.replace("\\", "/").strip("/"), []).append(env)
+    return index
 
 
-def _save_magic_rc(dest: pathlib.Path, config: dict) -> None:
-    magicrc_file = dest / ".magicrc"
-    magicrc_file.write_text(json.dumps(config, indent=2), encoding="utf-8")
+def _scandir_names(directory: pathlib.Path) -> set[str]:
+    try:
+        with os.scandir(directory) as entries:
+            return {entry.name for entry in entries}
+    except OSError:
+        return set()
 
 
-def _get_file_checksum(file_path: pathlib.Path) -> str | None:
-    if not file_path.exists():
-        return None
-    sha256_hash = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
-    return sha256_hash.hexdigest()
+def detect_environments(dest: pathlib.Path, adapters: dict) -> list[tuple[str, int]]:
+    """
+    Returns every adapter whose marker exists in `dest`, ranked by confidence:
+    2 when the adapter's `dest` directory already exists inside the marker,
+    1 when only the marker is present. Ties keep adapters.json order.
+
+    The project root is listed once with os.scandir; marker directories are
+    listed only when they are present, so shared markers such as `.github`
+    cost a single extra listing no matter how many adapters use them.
+    """
+    index = _build_marker_index(adapters)
+    root_names = _scandir_names(dest)
+    marker_children: dict[str, set[str]] = {}
+    detected: list[tuple[str, int]] = []
+
+    for marker, envs in index.items():
+        head, _, rest = marker.partition("/")
+        if head not in root_names:
+            continue
+        if rest and not (dest / marker).exists():
+            continue
+        if marker not in marker_children:
+            marker_children[marker] = _scandir_names(dest / marker)
+        for env in envs:
+            adapter_dest = adapters[env].get("dest", "").replace("\\", "/").strip("/")
+            confidence = 1
+            if adapter_dest.startswith(marker + "/"):
+                child = adapter_dest[len(marker) + 1 :].split("/", 1)[0]
+                if child in marker_children[marker]:
+                    confidence = 2
+            detected.append((env, confidence))
+
+    order = {env: i for i, env in enumerate(adapters)}
+    detected.sort(key=lambda item: (-item[1], order[item[0]]))
+    return detected
+
+
+def _detect_environment(dest: pathlib.Path, adapters: dict) -> str | None:
+    detected = detect_environments(dest, adapters)
+    return detected[0][0] if detected else None
+
+
+def _save_magic_rc(dest: pathlib.Path, config: dict) -> None:
+    magicrc_file = dest / ".magicrc"
+    _atomic_write(magicrc_file, json.dumps(config, indent=2))
 
 
 def _get_directory_checksums(
-    directory: pathlib.Path, base_dir: pathlib.Path | None = None
+    directory: pathlib.Path,
+    base_dir: pathlib.Path | None = None,
+    known: dict[str, str] | None = None,
 ) -> dict[str, str]:
+    """
+    Maps every file under `directory` to its sha256. Digests already in
+    `known` (e.g. computed while the payload streamed in) are reused instead
+    of reading the file again.
+    """
     results = {}
     if base_dir is None:
         base_dir = directory
@@ -547,12 +517,15 @@ def _get_directory_checksums(
 
     for item in directory.iterdir():
         if item.is_dir():
-            results.update(_get_directory_checksums(item, base_dir))
+            results.update(_get_directory_checksums(item, base_dir, known))
         else:
             if item.name == ".checksums":
                 continue
             rel_path = str(item.relative_to(base_dir)).replace("\\", "/")
-            results[rel_path] = _get_file_checksum(item)
+            if known and rel_path in known:
+                results[rel_path] = known[rel_path]
+            else:
+                results[rel_path] = _get_file_checksum(item)
     return results
 
 
@@ -604,6 +577,18 @@ def _handle_conflicts(dest: pathlib.Path, auto_accept: bool = False) -> dict | N
 
 
 def run_list_envs(adapters: dict) -> int:
+    _REPORT.result = {
+        "environments": [
+            {
+                "id": name,
+                "dest": adapter["dest"],
+                "ext": adapter.get("ext", DEFAULT_EXT),
+                "description": adapter.get("description", ""),
+            }
+            for name, adapter in adapters.items()
+        ],
+        "default": {"dest": f"{AGENT_DIR}/{WORKFLOWS_DIR}", "ext": DEFAULT_EXT},
+    }
     print("Supported environments:")
     print(
         f"  (default)    {AGENT_DIR}/{WORKFLOWS_DIR}/magic.*{DEFAULT_EXT}  general agents, Gemini"
@@ -640,7 +625,7 @@ def run_init(dest: pathlib.Path, auto_accept: bool = False) -> None:
         print(f"\nℹ️  Auto-accepting initialization script: {init_script}")
 
     if not should_run:
-        print("⚠️  Initialization script skipped by user.")
+        _print_warning("⚠️  Initialization script skipped by user.")
         return
 
     if is_windows:
@@ -655,14 +640,95 @@ def run_init(dest: pathlib.Path, auto_accept: bool = False) -> None:
         os.chmod(init_script, 0o755)
         cmd = ["bash", str(init_script)]
 
-    result = subprocess.run(cmd, check=False)
+    # Keep stdout clean for the --json report.
+    script_stdout = sys.stderr if _REPORT.json_output else None
+    result = subprocess.run(cmd, check=False, stdout=script_stdout)
     if result.returncode != 0:
         raise RuntimeError(
             f"Initialization script failed with exit code {result.returncode}."
         )
 
 
+def _profile_target(args: list[str]) -> pathlib.Path | None:
+    """--profile[=<file>] or MAGIC_SPEC_PROFILE=<file|1> enables the JSON trace."""
+    for a in args:
+        if a == "--profile":
+            return pathlib.Path("magic-spec-profile.json")
+        if a.startswith("--profile="):
+            return pathlib.Path(a.split("=", 1)[1])
+    value = os.environ.get("MAGIC_SPEC_PROFILE")
+    if value:
+        return pathlib.Path("magic-spec-profile.json" if value == "1" else value)
+    return None
+
+
+def _cprofile_rows(profiler, limit: int = 25) -> list[dict]:
+    import pstats
+
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, func), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append(
+            {
+                "function": f"{pathlib.Path(filename).name}:{line}({func})",
+                "calls": calls,
+                "tottime_ms": round(tottime * 1000, 3),
+                "cumtime_ms": round(cumtime * 1000, 3),
+            }
+        )
+    rows.sort(key=lambda row: row["cumtime_ms"], reverse=True)
+    return rows[:limit]
+
+
 def main() -> None:
+    """
+    Entry point: runs the command inside a fresh trace and, when profiling
+    is enabled, writes the trace (and optional cProfile data) on exit.
+    """
+    _TRACE.reset()
+    _REPORT.reset()
+    args = sys.argv[1:]
+    json_output = _REPORT.json_output = "--json" in args
+    profile_path = _profile_target(args)
+    profiler = None
+    if profile_path is not None and "--cprofile" in args:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    exit_code = 0
+    stdout = sys.stdout
+    try:
+        # With --json, stdout carries only the report; human text goes to stderr.
+        with contextlib.redirect_stdout(sys.stderr if json_output else stdout):
+            _main()
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        raise
+    except BaseException:
+        exit_code = 1
+        raise
+    finally:
+        if _REPORT.command not in ("help", "stats"):
+            record_run(pathlib.Path.cwd(), cli_run_record(exit_code))
+        if json_output:
+            stdout.write(json.dumps(_REPORT.to_dict(exit_code), indent=2) + "\n")
+            stdout.flush()
+        if profile_path is not None:
+            trace = _TRACE.to_dict(args, exit_code)
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(str(profile_path.with_suffix(".prof")))
+                trace["cprofile"] = _cprofile_rows(profiler)
+            try:
+                profile_path.write_text(json.dumps(trace, indent=2), encoding="utf-8")
+                print(f"⏱️  Profile written to {profile_path}", file=sys.stderr)
+            except OSError as e:
+                print(f"Warning: Failed to write profile: {e}", file=sys.stderr)
+
+
+def _main() -> None:
     dest = pathlib.Path.cwd()
 
     # Parse args
@@ -671,49 +737,199 @@ def main() -> None:
     fallback_main = "--fallback-main" in args
     auto_accept = "--yes" in args or "-y" in args
     if "--help" in args or "-h" in args:
+        _REPORT.command = "help"
         print("Usage: magic-spec [command] [options]")
         print("\nCommands:")
         print("  info                 Show installation status")
-        print("  --check              Check for updates")
+        print("  --check              Check for updates (add --offline / --refresh)")
         print("  --doctor             Run prerequisite check")
         print("  --list-envs          List supported environments")
         print("  --eject              Remove magic-spec from project")
+        print("  --rollback [gen]     Restore engine files from a backup generation")
+        print("  stats                Run timings for this project (p50/p95, trend)")
+        print("  analytics            Task throughput from TASKS.md and phase archives")
+        print("  tasks set <ID> <Status> Update one task row and its phase summary")
+        print(
+            "  changelog compile    Prepend the .design/CHANGELOG.md draft as a release"
+        )
+        print(
+            "  index [split|join]   Show, shard (--by=prefix|layer) or merge INDEX.md"
+        )
+        print("  search <query>       Ranked spec sections; filters like status:stable")
+        print("  get <file>[#section] Print one section of a .magic/.design file")
+        print("                       (#rule-57 or #<section>/57: numbered list item)")
+        print(
+            "  pack                 Write .design/PACK.md (--budget=<n|nt> --pin=<f#s>)"
+        )
         print("\nOptions:")
-        print("  --env <adapter>      Specify environment adapter")
+        print(
+            "  --env <adapter>      Specify environment adapter ('auto' = all detected)"
+        )
         print("  --<adapter>          Shortcut for --env <adapter> (e.g. --cursor)")
         print("  --update             Update engine files only")
         print("  --fallback-main      Pull payload from main branch")
+        print("  --sha256=<digest>    Verify the downloaded archive digest")
+        print("  --format=<tar.gz|zip> Payload archive format (zip reads selectively)")
+        print("  --payload=<file>     Install from a local .tar.gz or .zip bundle")
+        print("  --download-chunks=<n> Fetch large payloads as n concurrent ranges")
+        print("  --minify             Compact adapter Markdown (--no-minify to undo)")
+        print("  --minify-strip=<tags> Also drop sections tagged <!-- tags: ... -->")
+        print("  --link-adapters      Symlink adapter files to one copy per format")
+        print("  --profile[=<file>]   Write a JSON timing trace (add --cprofile)")
+        print("  --json               Print a machine-readable report on stdout")
         print("  --yes                Auto-accept prompts")
         sys.exit(0)
 
+    subcommand = next((a for a in args if not a.startswith("-")), None)
     is_update = "--update" in args
     is_doctor = "--doctor" in args
-    is_check = "--check" in args
+    # `pack --check` is the pack staleness check, not the update check.
+    is_check = "--check" in args and subcommand != "pack"
     is_info = "info" in args
     is_list_envs = "--list-envs" in args
     is_eject = "--eject" in args
+    rollback_arg = next(
+        (a for a in args if a == "--rollback" or a.startswith("--rollback=")), None
+    )
 
     # Command modes (do not need download)
     if is_doctor:
-        sys.exit(run_doctor(dest))
+        _REPORT.command = "doctor"
+        with _TRACE.span("doctor"):
+            code = run_doctor(dest)
+        sys.exit(code)
 
     if is_check:
-        sys.exit(run_check(dest))
+        _REPORT.command = "check"
+        with _TRACE.span("check"):
+            code = run_check(
+                dest, remote="--offline" not in args, refresh="--refresh" in args
+            )
+        sys.exit(code)
+
+    if subcommand == "analytics":
+        _REPORT.command = "analytics"
+        with _TRACE.span("analytics"):
+            code = run_analytics(dest)
+        sys.exit(code)
+
+    if subcommand == "tasks":
+        _REPORT.command = "tasks"
+        positionals = [a for a in args if not a.startswith("-")]
+        assignee = next(
+            (a.split("=", 1)[1] for a in args if a.startswith("--assignee=")), None
+        )
+        with _TRACE.span("tasks"):
+            code = run_tasks(dest, positionals[1:], assignee)
+        sys.exit(code)
+
+    if subcommand == "changelog":
+        _REPORT.command = "changelog"
+        positionals = [a for a in args if not a.startswith("-")]
+        release = next(
+            (a.split("=", 1)[1] for a in args if a.startswith("--release=")), None
+        )
+        date = next((a.split("=", 1)[1] for a in args if a.startswith("--date=")), None)
+        with _TRACE.span("changelog"):
+            code = run_changelog(
+                dest,
+                positionals[1] if len(positionals) > 1 else None,
+                release,
+                date,
+                dry_run="--dry-run" in args,
+            )
+        sys.exit(code)
+
+    if subcommand == "index":
+        _REPORT.command = "index"
+        positionals = [a for a in args if not a.startswith("-")]
+        by = next((a.split("=", 1)[1] for a in args if a.startswith("--by=")), "prefix")
+        with _TRACE.span("index"):
+            code = run_index(dest, positionals[1] if len(positionals) > 1 else None, by)
+        sys.exit(code)
+
+    if subcommand == "search":
+        _REPORT.command = "search"
+        positionals = [a for a in args if not a.startswith("-")]
+        limit = next(
+            (a.split("=", 1)[1] for a in args if a.startswith("--limit=")), "10"
+        )
+        if not limit.isdigit():
+            _print_error(f"Error: invalid --limit: {limit}")
+            sys.exit(1)
+        with _TRACE.span("search"):
+            code = run_search(dest, " ".join(positionals[1:]), int(limit))
+        sys.exit(code)
+
+    if subcommand == "get":
+        _REPORT.command = "get"
+        positionals = [a for a in args if not a.startswith("-")]
+        with _TRACE.span("get"):
+            code = run_get(dest, positionals[1] if len(positionals) > 1 else None)
+        sys.exit(code)
+
+    if subcommand == "pack":
+        _REPORT.command = "pack"
+        budget_arg = next(
+            (a.split("=", 1)[1] for a in args if a.startswith("--budget=")), None
+        )
+        try:
+            budget = _parse_budget(budget_arg) if budget_arg else None
+        except ValueError as e:
+            _print_error(f"Error: {e}")
+            sys.exit(1)
+        pins = [a.split("=", 1)[1] for a in args if a.startswith("--pin=")]
+        with _TRACE.span("pack"):
+            code = run_pack(
+                dest,
+                budget,
+                pins,
+                check="--check" in args,
+                force="--force" in args,
+            )
+        sys.exit(code)
+
+    if subcommand == "stats":
+        _REPORT.command = "stats"
+        command_filter = next(
+            (a.split("=", 1)[1] for a in args if a.startswith("--command=")), None
+        )
+        sys.exit(run_stats(dest, command_filter))
 
     if is_info:
-        sys.exit(run_info(dest))
+        _REPORT.command = "info"
+        with _TRACE.span("info"):
+            code = run_info(dest)
+        sys.exit(code)
 
     if is_eject:
-        sys.exit(run_eject(dest, auto_accept=auto_accept))
+        _REPORT.command = "eject"
+        with _TRACE.span("eject"):
+            code = run_eject(dest, auto_accept=auto_accept)
+        sys.exit(code)
+
+    if rollback_arg is not None:
+        raw = rollback_arg.split("=", 1)[1] if "=" in rollback_arg else ""
+        index = args.index(rollback_arg)
+        if not raw and index + 1 < len(args) and args[index + 1].isdigit():
+            raw = args[index + 1]
+        if raw and not raw.isdigit():
+            _print_error(f"Error: invalid --rollback generation: {raw}")
+            sys.exit(1)
+        _REPORT.command = "rollback"
+        with _TRACE.span("rollback"):
+            code = run_rollback(dest, int(raw) if raw else None)
+        sys.exit(code)
 
-    # Download Step
-    if is_update:
-        print("Updating magic-spec (.magic only)...")
-        create_backup(dest)
-    else:
-        print("Initializing magic-spec...")
+    # Bundled registry: listing and detection do not need the payload.
+    with _TRACE.span("load-adapters"):
+        adapters = load_adapters()
 
-    version_to_fetch = "main" if fallback_main else _resolve_package_version()
+    if is_list_envs:
+        _REPORT.command = "list-envs"
+        with _TRACE.span("list-envs"):
+            code = run_list_envs(adapters)
+        sys.exit(code)
 
     # Load .magicrc
     magicrc = {}
@@ -724,150 +940,395 @@ def main() -> None:
         except Exception:
             pass
 
+    # Determine environment
+    for env in adapters:
+        if f"--{env}" in args:
+            if env not in env_values:
+                env_values.append(env)
+
+    if "auto" in env_values:
+        # --env auto: install every detected adapter, best match first
+        with _TRACE.span("detect"):
+            detected_envs = [env for env, _ in detect_environments(dest, adapters)]
+        expanded: list[str] = []
+        for env in env_values:
+            for item in detected_envs if env == "auto" else [env]:
+                if item not in expanded:
+                    expanded.append(item)
+        env_values = expanded
+        if detected_envs:
+            print(f"💡 Auto-detected environments: {', '.join(detected_envs)}")
+        else:
+            print("💡 No environments detected; using default.")
+
+    selected_env = None
+    if env_values:
+        selected_env = env_values[0]
+    elif magicrc.get("env"):
+        selected_env = magicrc["env"] if magicrc["env"] != "default" else None
+
+    if not selected_env and not is_update:
+        with _TRACE.span("detect"):
+            ranked = detect_environments(dest, adapters)
+        detected = ranked[0][0] if ranked else None
+        if detected and detected in adapters:
+            adapter_desc = adapters[detected].get("description", detected)
+            print(f"\n💡 Detected {adapter_desc} ({detected}/ directory found).")
+            if len(ranked) > 1:
+                others = ", ".join(env for env, _ in ranked[1:])
+                print(f"   Also detected: {others} (use --env auto to install all)")
+            should_adopt = auto_accept
+            if not should_adopt:
+                try:
+                    answer = (
+                        input(
+                            f"   Install {detected} adapter instead of default? (y/N): "
+                        )
+                        .strip()
+                        .lower()
+                    )
+                    should_adopt = answer == "y"
+                except EOFError:
+                    should_adopt = False
+            if should_adopt:
+                selected_env = detected
+
+    # Download Step
+    _REPORT.command = "update" if is_update else "install"
+    if is_update:
+        print("Updating magic-spec (.magic only)...")
+        with _TRACE.span("backup"):
+            create_backup(dest)
+    else:
+        print("Initializing magic-spec...")
+
+    version_to_fetch = "main" if fallback_main else _resolve_package_version()
+    payload_format = next(
+        (a.split("=", 1)[1] for a in args if a.startswith("--format=")),
+        DEFAULT_PAYLOAD_FORMAT,
+    )
+    if payload_format not in PAYLOAD_FORMATS:
+        _print_error(f"Error: unsupported --format '{payload_format}'.")
+        print(f"   Valid values: {', '.join(PAYLOAD_FORMATS)}")
+        sys.exit(1)
+    local_payload = next(
+        (pathlib.Path(a.split("=", 1)[1]) for a in args if a.startswith("--payload=")),
+        None,
+    )
+    if local_payload is not None and not local_payload.is_file():
+        _print_error(f"Error: payload archive not found: {local_payload}")
+        sys.exit(1)
+    download_chunks = next(
+        (
+            int(a.split("=", 1)[1])
+            for a in args
+            if a.startswith("--download-chunks=") and a.split("=", 1)[1].isdigit()
+        ),
+        None,
+    )
+    expected_sha256 = next(
+        (a.split("=", 1)[1] for a in args if a.startswith("--sha256=")),
+        os.environ.get("MAGIC_SPEC_SHA256"),
+    )
+
+    # --minify[-strip=<tags>] compacts adapter Markdown; remembered in .magicrc.
+    minify_strip = next(
+        (
+            _parse_csv_values(a.split("=", 1)[1])
+            for a in args
+            if a.startswith("--minify-strip=")
+        ),
+        None,
+    )
+    minify: dict | None = (
+        magicrc.get("minify") if isinstance(magicrc.get("minify"), dict) else None
+    )
+    if "--minify" in args or minify_strip is not None:
+        minify = {"strip": minify_strip or []}
+    if "--no-minify" in args:
+        minify = None
+    # --link-adapters keeps one copy per format in .magic/rendered/.
+    link_adapters = bool(magicrc.get("linkAdapters"))
+    if "--link-adapters" in args:
+        link_adapters = True
+    if "--no-link-adapters" in args:
+        link_adapters = False
+
+    # Render workflows for the chosen adapters as their members stream in.
+    planned_envs = list(env_values)
+    if not planned_envs and selected_env:
+        planned_envs = [selected_env]
+    if is_update:
+        planned_envs = []
+    planned_adapters = {env: adapters[env] for env in planned_envs if env in adapters}
+    early_renders: dict[str, dict[str, bytes]] = {}
+    workflows_prefix = f"{AGENT_DIR}/{WORKFLOWS_DIR}/"
+
+    def prerender(rel_path: str, data: bytes) -> None:
+        if not rel_path.startswith(workflows_prefix):
+            return
+        wf_name = rel_path[len(workflows_prefix) :]
+        if not wf_name.endswith(DEFAULT_EXT):
+            return
+        wf_name = wf_name[: -len(DEFAULT_EXT)]
+        if wf_name not in WORKFLOWS:
+            return
+        for env, adapter in planned_adapters.items():
+            name = _adapter_dest_name(wf_name, adapter)
+            early_renders.setdefault(env, {})[name] = _render_workflow_bytes(
+                data, name, adapter, minify
+            )
+
     try:
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_dir_path = pathlib.Path(temp_dir)
-            source_root = download_and_extract(version_to_fetch, temp_dir_path)
-
-            try:
-                with open(
-                    source_root / "installers" / "adapters.json", "r", encoding="utf-8"
-                ) as f:
-                    adapters = json.load(f)
-            except Exception:
-                adapters = {}
-
-            if is_list_envs:
-                sys.exit(run_list_envs(adapters))
+            payload_digests: dict[str, str] = {}
+            with _TRACE.span("download", format=payload_format):
+                source_root = download_and_extract(
+                    version_to_fetch,
+                    temp_dir_path,
+                    on_member=prerender,
+                    digests=payload_digests,
+                    expected_sha256=expected_sha256,
+                    payload_format=payload_format,
+                    local_payload=local_payload,
+                    chunks=download_chunks,
+                )
 
-            # Determine environment
+            # Overlay adapters shipped in the payload (newer releases may add some)
+            adapters = load_adapters(source_root)
+            for env, adapter in planned_adapters.items():
+                if adapters.get(env) != adapter:
+                    early_renders.pop(env, None)
             for env in adapters:
                 if f"--{env}" in args:
                     if env not in env_values:
                         env_values.append(env)
-
-            selected_env = None
-            if env_values:
+            if env_values and not selected_env:
                 selected_env = env_values[0]
-            elif magicrc.get("env"):
-                selected_env = magicrc["env"] if magicrc["env"] != "default" else None
-
-            if not selected_env and not is_update:
-                detected = _detect_environment(dest, adapters)
-                if detected and detected in adapters:
-                    adapter_desc = adapters[detected].get("description", detected)
-                    print(
-                        f"\n💡 Detected {adapter_desc} ({detected}/ directory found)."
-                    )
-                    should_adopt = auto_accept
-                    if not should_adopt:
-                        try:
-                            answer = (
-                                input(
-                                    f"   Install {detected} adapter instead of default? (y/N): "
-                                )
-                                .strip()
-                                .lower()
-                            )
-                            should_adopt = answer == "y"
-                        except EOFError:
-                            should_adopt = False
-                    if should_adopt:
-                        selected_env = detected
 
             if is_update:
-                conflict_result = _handle_conflicts(dest, auto_accept=auto_accept)
+                with _TRACE.span("conflicts"):
+                    conflict_result = _handle_conflicts(dest, auto_accept=auto_accept)
                 conflicts_to_skip = (
                     conflict_result.get("conflicts", []) if conflict_result else []
                 )
                 if conflicts_to_skip:
-                    print(f"⚠️  Skipping {len(conflicts_to_skip)} conflicting file(s).")
-
-            # 1. Copy .magic (SDD engine) - selective [T-3A01]
-            src_magic = source_root / ENGINE_DIR
-            dest_magic = dest / ENGINE_DIR
-            dest_magic.mkdir(parents=True, exist_ok=True)
-
-            for rel_path in MAGIC_FILES:
-                if is_update and rel_path in conflicts_to_skip:
-                    continue
-
-                src_file = src_magic / rel_path
-                dest_file = dest_magic / rel_path
-                if src_file.exists():
-                    dest_file.parent.mkdir(parents=True, exist_ok=True)
-                    shutil.copy2(src_file, dest_file)
-
-            # 2. Adapters (skip on --update)
-            if not is_update:
-                if env_values:
-                    for env in env_values:
-                        install_adapter(source_root, dest, env, adapters)
-                elif selected_env:
-                    install_adapter(source_root, dest, selected_env, adapters)
-                else:
-                    # Default install - selective
-                    src_eng = source_root / AGENT_DIR
-                    dest_eng = dest / AGENT_DIR
-                    dest_eng.mkdir(parents=True, exist_ok=True)
-                    (dest_eng / WORKFLOWS_DIR).mkdir(parents=True, exist_ok=True)
-
-                    for wf_name in WORKFLOWS:
-                        src_wf = src_eng / WORKFLOWS_DIR / (wf_name + DEFAULT_EXT)
-                        if src_wf.exists():
-                            shutil.copy2(
-                                src_wf,
-                                dest_eng / WORKFLOWS_DIR / (wf_name + DEFAULT_EXT),
-                            )
+                    _print_warning(
+                        f"⚠️  Skipping {len(conflicts_to_skip)} conflicting file(s)."
+                    )
 
-                    # Copy other files in .agent if any (not workflows subfolder)
-                    for item in src_eng.iterdir():
-                        if item.name == WORKFLOWS_DIR:
+            # Everything below is written into staging trees next to the
+            # targets and swapped in at once by stage.commit().
+            writer = BulkWriter()
+            with StagedInstall(writer) as stage:
+                # 1. Copy .magic (SDD engine) - selective [T-3A01]
+                with _TRACE.span("copy-engine"):
+                    src_magic = source_root / ENGINE_DIR
+                    dest_magic = dest / ENGINE_DIR
+                    staged_magic = stage.path_for(dest_magic)
+
+                    # Digests of engine files taken from the payload while it streamed
+                    known_checksums: dict[str, str] = {}
+                    for rel_path in MAGIC_FILES:
+                        if is_update and rel_path in conflicts_to_skip:
                             continue
-                        if item.is_dir():
-                            _copy_dir(item, dest_eng / item.name)
-                        else:
-                            shutil.copy2(item, dest_eng / item.name)
 
-            # 3. Run init script (skip on --update)
-            if not is_update:
-                run_init(dest, auto_accept=auto_accept)
-                print(f"✅ {PACKAGE_NAME} initialized successfully!")
-            else:
-                print(f"✅ {PACKAGE_NAME} updated successfully!")
+                        src_file = src_magic / rel_path
+                        if src_file.exists():
+                            writer.copy_file(src_file, staged_magic / rel_path)
+                            digest = payload_digests.get(f"{ENGINE_DIR}/{rel_path}")
+                            if digest:
+                                known_checksums[rel_path] = digest
+
+                # 2. Adapters (skip on --update)
+                minified: dict[str, dict] = {}
+                adapter_manifest = load_adapter_manifest(dest)
+                refreshed: dict | None = None
+                with _TRACE.span("adapters") as span:
+                    if is_update and adapter_manifest:
+                        refreshed = update_adapters(
+                            source_root,
+                            dest,
+                            adapters,
+                            adapter_manifest,
+                            writer,
+                            stage=stage,
+                            minify=minify,
+                        )
+                        span["updated"] = len(refreshed["updated"])
+                        span["kept"] = len(refreshed["kept"])
+                    elif is_update:
+                        # Installed before the manifest existed: linked
+                        # adapters follow their store files; refresh those.
+                        span["storeFiles"] = refresh_adapter_store(
+                            source_root,
+                            dest,
+                            adapters,
+                            writer,
+                            stage=stage,
+                            minify=minify,
+                            skip=conflicts_to_skip,
+                        )
+                    else:
+                        adapter_manifest = adapter_manifest or {
+                            "schemaVersion": ADAPTER_MANIFEST_SCHEMA_VERSION,
+                            "adapters": {},
+                        }
+                        for env in env_values or (
+                            [selected_env] if selected_env else []
+                        ):
+                            stats = install_adapter(
+                                source_root,
+                                dest,
+                                env,
+                                adapters,
+                                stage=stage,
+                                rendered=early_renders.get(env),
+                                minify=minify,
+                                link=link_adapters,
+                                manifest=adapter_manifest["adapters"],
+                            )
+                            if stats:
+                                minified[env] = stats
+                        if not (env_values or selected_env):
+                            # Default install - selective
+                            src_eng = source_root / AGENT_DIR
+                            dest_eng = stage.path_for(dest / AGENT_DIR)
+                            writer.ensure_dir(dest_eng / WORKFLOWS_DIR)
+
+                            full = size = 0
+                            written: dict[str, bytes] = {}
+                            for wf_name in WORKFLOWS:
+                                src_wf = (
+                                    src_eng / WORKFLOWS_DIR / (wf_name + DEFAULT_EXT)
+                                )
+                                dest_wf = dest_eng / WORKFLOWS_DIR / src_wf.name
+                                if not src_wf.exists():
+                                    continue
+                                data = src_wf.read_bytes()
+                                if minify is None:
+                                    writer.copy_file(src_wf, dest_wf)
+                                    written[src_wf.name] = data
+                                    continue
+                                small = _render_workflow_bytes(
+                                    data, src_wf.name, {"ext": DEFAULT_EXT}, minify
+                                )
+                                writer.write_bytes(dest_wf, small)
+                                written[src_wf.name] = small
+                                full, size = full + len(data), size + len(small)
+                            adapter_manifest["adapters"]["default"] = (
+                                adapter_manifest_entry(
+                                    source_root, _default_adapter(), written, minify
+                                )
+                            )
+                            if minify is not None:
+                                minified["default"] = {
+                                    "sourceBytes": full,
+                                    "bytes": size,
+                                    "savedBytes": full - size,
+                                }
+
+                            # Copy other files in .agent if any (not workflows subfolder)
+                            for item in src_eng.iterdir():
+                                if item.name == WORKFLOWS_DIR:
+                                    continue
+                                if item.is_dir():
+                                    writer.copy_tree(item, dest_eng / item.name)
+                                else:
+                                    writer.copy_file(item, dest_eng / item.name)
+
+                if refreshed:
+                    print(
+                        f"🔄 Adapters: {len(refreshed['updated'])} file(s) refreshed, "
+                        f"{refreshed['unchanged']} unchanged."
+                    )
+                    for rel in refreshed["kept"]:
+                        _print_warning(
+                            f"⚠️  Kept locally edited {rel}; its workflow changed upstream."
+                        )
+                if adapter_manifest:
+                    writer.write_bytes(
+                        staged_magic / ADAPTER_MANIFEST_FILE,
+                        (
+                            json.dumps(adapter_manifest, indent=2, sort_keys=True)
+                            + "\n"
+                        ).encode("utf-8"),
+                    )
 
-            # 4. Write version file (.magic/.version) - [T-2B01]
-            try:
-                version_file = dest / ".magic" / ".version"
+                # 3. Write version file (.magic/.version) - [T-2B01]
                 real_version = (
                     _resolve_package_version()
                     if version_to_fetch == "main"
                     else version_to_fetch
                 )
-                version_file.write_text(real_version, encoding="utf-8")
-            except Exception as v_err:
-                print(f"Warning: Failed to write .magic/.version: {v_err}")
+                try:
+                    version_bytes = real_version.encode("utf-8")
+                    writer.write_bytes(staged_magic / ".version", version_bytes)
+                    known_checksums[".version"] = _sha256_bytes(version_bytes)
+                except Exception as v_err:
+                    _print_warning(f"Warning: Failed to write .magic/.version: {v_err}")
+
+                # 4. Save checksums - [T-2C03]
+                with _TRACE.span("checksums"):
+                    try:
+                        current_checksums = _get_directory_checksums(
+                            staged_magic, known=known_checksums
+                        )
+                        writer.write_bytes(
+                            staged_magic / ".checksums",
+                            json.dumps(current_checksums, indent=2).encode("utf-8"),
+                        )
+                    except Exception as c_err:
+                        _print_warning(f"Warning: Failed to save checksums: {c_err}")
+
+                # 5. Commit point: swap adapters first, the engine last
+                with _TRACE.span("commit"):
+                    stage.commit(order=[dest_magic])
+
+            print(f"📝 {writer.summary()}")
+            _REPORT.files_written = sorted(
+                stage.final_path(path).relative_to(dest).as_posix()
+                for path in writer.written
+            )
 
-            # 5. Update .magicrc - [T-2C02]
+            # 6. Update .magicrc - [T-2C02]
             try:
                 new_config = {
                     "env": selected_env or magicrc.get("env") or "default",
                     "version": real_version,
                 }
+                if minify is not None:
+                    new_config["minify"] = minify
+                if link_adapters:
+                    new_config["linkAdapters"] = True
                 _save_magic_rc(dest, new_config)
             except Exception as rc_err:
-                print(f"Warning: Failed to update .magicrc: {rc_err}")
-
-            # 6. Save checksums - [T-2C03]
-            try:
-                current_checksums = _get_directory_checksums(dest / ".magic")
-                (dest / ".magic" / ".checksums").write_text(
-                    json.dumps(current_checksums, indent=2), encoding="utf-8"
-                )
-            except Exception as c_err:
-                print(f"Warning: Failed to save checksums: {c_err}")
+                _print_warning(f"Warning: Failed to update .magicrc: {rc_err}")
+
+            _REPORT.result = {
+                "version": real_version,
+                "env": selected_env or "default",
+                "adapters": [env for env in env_values if env in adapters]
+                or ([selected_env] if selected_env in adapters else []),
+                "filesWritten": writer.files_written,
+                "filesSkipped": writer.files_skipped,
+                "bytesWritten": writer.bytes_copied,
+            }
+            if minified:
+                _REPORT.result["minified"] = minified
+            if refreshed:
+                _REPORT.result["adapterRefresh"] = refreshed
+
+            # 7. Run init script (skip on --update)
+            if not is_update:
+                with _TRACE.span("init"):
+                    run_init(dest, auto_accept=auto_accept)
+                print(f"✅ {PACKAGE_NAME} initialized successfully!")
+            else:
+                print(f"✅ {PACKAGE_NAME} updated successfully!")
     except Exception as e:
-        print(f"magic-spec initialization failed: {e}")
+        _print_error(f"magic-spec initialization failed: {e}")
         sys.exit(1)
 
 
@@ -0,0 +1,659 @@
+"""Workflow rendering for IDE adapters, release bundles and the adapter store."""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import re
+
+from .core import (
+    ADAPTER_BUNDLES_DIR,
+    ADAPTER_MANIFEST_FILE,
+    ADAPTER_MANIFEST_SCHEMA_VERSION,
+    ADAPTER_STORE_DIR,
+    AGENT_DIR,
+    DEFAULT_EXT,
+    DEFAULT_REMOVE_PREFIX,
+    ENGINE_DIR,
+    MAGIC_FILES,
+    WORKFLOWS,
+    WORKFLOWS_DIR,
+    _TRACE,
+    _find_bundled_adapters_path,
+    _format_bytes,
+    _is_within_directory,
+    _print_warning,
+    _sha256_bytes,
+)
+from .fsio import (
+    BulkWriter,
+    StagedInstall,
+)
+from .markdown import (
+    markdown_sections,
+)
+
+
+def _read_adapters_file(adapters_path: pathlib.Path) -> dict:
+    try:
+        parsed = json.loads(adapters_path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def load_adapters(source_root: pathlib.Path | None = None) -> dict:
+    """
+    Returns the adapter registry shipped with the package. When `source_root`
+    (an extracted payload) is given, its adapters.json is overlaid on top so
+    adapters added in a newer release are picked up without a package upgrade.
+    """
+    adapters: dict = {}
+    bundled_path = _find_bundled_adapters_path()
+    if bundled_path is not None:
+        adapters.update(_read_adapters_file(bundled_path))
+    if source_root is not None:
+        payload_path = source_root / "installers" / "adapters.json"
+        if payload_path.exists():
+            adapters.update(_read_adapters_file(payload_path))
+    return adapters
+
+
+_FENCED_BLOCK = re.compile(
+    r"^[ \t]{0,3}(```|~~~).*?^[ \t]{0,3}\1[^\n]*(?:\n|$)", re.M | re.S
+)
+
+
+_HTML_COMMENT = re.compile(r"<!--.*?-->", re.S)
+
+
+_OPTIONAL_BLOCK = re.compile(
+    r"<!--\s*optional\s*-->.*?<!--\s*/optional\s*-->[ \t]*\n?", re.S
+)
+
+
+_SECTION_TAGS = re.compile(r"<!--\s*tags?:\s*([\w ,-]+?)\s*-->")
+
+
+_TABLE_SEPARATOR_CELL = re.compile(r"^(:?)-+(:?)$")
+
+
+_THEMATIC_BREAK = re.compile(r"^(?:-{3,}|\*{3,}|_{3,})$")
+
+
+def _minify_prose(text: str) -> str:
+    """Whitespace, table and comment compaction for text outside code fences."""
+    text = _HTML_COMMENT.sub("", text)
+    out: list[str] = []
+    for line in text.split("\n"):
+        line = line.rstrip()
+        if line.startswith("|") and line.endswith("|"):
+            cells = [c.strip() for c in line[1:-1].split("|")]
+            separators = [_TABLE_SEPARATOR_CELL.match(c) for c in cells]
+            if all(separators):
+                cells = [f"{m.group(1)}-{m.group(2)}" for m in separators]
+            line = "|" + "|".join(cells) + "|"
+        elif _THEMATIC_BREAK.match(line) and (not out or not out[-1]):
+            continue
+        if not line and (not out or not out[-1]):
+            continue
+        out.append(line)
+    return "\n".join(out)
+
+
+def minify_markdown(text: str, strip_tags: list[str] | tuple = ()) -> str:
+    """
+    Compacts workflow Markdown for prompt payloads. YAML front matter and
+    fenced code are kept verbatim. Drops HTML comments, `<!-- optional -->`
+    ... `<!-- /optional -->` regions, thematic breaks and repeated blank
+    lines, and pads tables minimally. Sections whose heading carries
+    `<!-- tags: a, b -->` are removed when one of their tags is in
+    `strip_tags`.
+    """
+    front = ""
+    if text.startswith("---\n"):
+        end = text.find("\n---\n", 4)
+        if end != -1:
+            front, text = text[: end + 5], text[end + 5 :]
+
+    if strip_tags:
+        wanted = {t.lower() for t in strip_tags}
+        data = text.encode("utf-8")
+        cuts: list[tuple[int, int]] = []
+        for section in markdown_sections(data):
+            line_end = data.find(b"\n", section["start"])
+            line = data[section["start"] : line_end if line_end != -1 else len(data)]
+            match = _SECTION_TAGS.search(line.decode("utf-8", errors="replace"))
+            tags = (
+                {t.strip().lower() for t in match.group(1).split(",")}
+                if match
+                else set()
+            )
+            if tags & wanted and not (cuts and section["start"] < cuts[-1][1]):
+                cuts.append((section["start"], section["end"]))
+        for start, end in reversed(cuts):
+            data = data[:start] + data[end:]
+        text = data.decode("utf-8")
+
+    text = _OPTIONAL_BLOCK.sub("", text)
+    pieces: list[str] = []
+    last = 0
+    for match in _FENCED_BLOCK.finditer(text):
+        pieces.append(_minify_prose(text[last : match.start()]))
+        pieces.append(match.group(0).rstrip("\n"))
+        last = match.end()
+    pieces.append(_minify_prose(text[last:]))
+    body = "\n".join(p.strip("\n") for p in pieces if p.strip())
+    return front + body + "\n"
+
+
+def _convert_to_toml(content: str, description: str) -> str:
+    # Escape quotes and backslashes for TOML triple-quoted strings
+    escaped_content = content.replace("\\", "\\\\").replace('"""', '\\"\\"\\"')
+    escaped_desc = description.replace("\\", "\\\\")
+    return 'description = "{}"\n\nprompt = """\n{}\n"""\n'.format(
+        escaped_desc, escaped_content
+    )
+
+
+def _convert_to_mdc(content: str, description: str) -> str:
+    return f"---\ndescription: {description}\nglobs: \n---\n{content}"
+
+
+def _adapter_remove_prefix(adapter: dict) -> str:
+    return (
+        adapter["removePrefix"] if "removePrefix" in adapter else DEFAULT_REMOVE_PREFIX
+    )
+
+
+def _adapter_dest_name(wf_name: str, adapter: dict) -> str:
+    remove_prefix = _adapter_remove_prefix(adapter)
+    dest_name = wf_name
+    if remove_prefix and dest_name.startswith(remove_prefix):
+        dest_name = dest_name[len(remove_prefix) :]
+    return dest_name + adapter["ext"]
+
+
+def _adapter_format(adapter: dict) -> str:
+    """`toml`, `mdc` or `md`: what a workflow is converted to for `adapter`."""
+    target_ext = adapter["ext"]
+    if adapter.get("format") == "toml" or target_ext == ".toml":
+        return "toml"
+    if adapter.get("format") == "mdc" or target_ext == ".mdc":
+        return "mdc"
+    return "md"
+
+
+def _render_workflow_bytes(
+    data: bytes, full_dest_name: str, adapter: dict, minify: dict | None = None
+) -> bytes:
+    target_format = _adapter_format(adapter)
+    is_toml = target_format == "toml"
+    is_mdc = target_format == "mdc"
+    if not is_toml and not is_mdc and minify is None:
+        return data
+
+    # Same newline handling as Path.read_text()
+    content = data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+    if minify is not None:
+        # The source digest keeps a minified file traceable to its workflow.
+        content = minify_markdown(content, minify.get("strip", ())) + (
+            f"<!-- minified; source sha256:{_sha256_bytes(data)} -->\n"
+        )
+        if not is_toml and not is_mdc:
+            return content.encode("utf-8")
+    description = f"Magic SDD Workflow: {full_dest_name}"
+    if is_toml:
+        return _convert_to_toml(content, description).encode("utf-8")
+    return _convert_to_mdc(content, description).encode("utf-8")
+
+
+def _render_workflow(
+    src_file: pathlib.Path,
+    full_dest_name: str,
+    adapter: dict,
+    minify: dict | None = None,
+) -> bytes:
+    return _render_workflow_bytes(
+        src_file.read_bytes(), full_dest_name, adapter, minify
+    )
+
+
+def render_adapter(
+    source_root: pathlib.Path, adapter: dict, minify: dict | None = None
+) -> dict[str, bytes]:
+    """
+    Renders every workflow for one adapter. Returns a mapping of file names
+    (relative to the adapter's `dest`) to their rendered content; `minify`
+    ({"strip": [tags]}) compacts the Markdown first.
+    """
+    src_dir = source_root / AGENT_DIR / WORKFLOWS_DIR
+    rendered: dict[str, bytes] = {}
+    for wf_name in WORKFLOWS:
+        src_file = src_dir / (wf_name + DEFAULT_EXT)
+        if not src_file.exists():
+            continue
+        full_dest_name = _adapter_dest_name(wf_name, adapter)
+        rendered[full_dest_name] = _render_workflow(
+            src_file, full_dest_name, adapter, minify
+        )
+    return rendered
+
+
+def _load_bundle_manifest(source_root: pathlib.Path) -> dict | None:
+    manifest_file = source_root / ADAPTER_BUNDLES_DIR / "manifest.json"
+    if not manifest_file.exists():
+        return None
+    try:
+        manifest = json.loads(manifest_file.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("adapters"), dict):
+        return None
+    return manifest
+
+
+def _load_prerendered_adapter(
+    source_root: pathlib.Path, env: str, adapter: dict
+) -> dict[str, bytes] | None:
+    """
+    Returns the pre-rendered files for `env` from the release bundle, or None
+    when the bundle is missing, stale (source workflow changed since it was
+    rendered) or does not match its manifest.
+    """
+    manifest = _load_bundle_manifest(source_root)
+    if manifest is None:
+        return None
+    entry = manifest["adapters"].get(env)
+    if not isinstance(entry, dict) or entry.get("dest") != adapter.get("dest"):
+        return None
+
+    src_dir = source_root / AGENT_DIR / WORKFLOWS_DIR
+    bundle_dir = source_root / ADAPTER_BUNDLES_DIR / env
+    source_hashes = manifest.get("sources", {})
+    rendered: dict[str, bytes] = {}
+    for name, meta in entry.get("files", {}).items():
+        source_name = meta.get("source", "")
+        src_file = src_dir / source_name
+        if not src_file.exists():
+            return None
+        if _sha256_bytes(src_file.read_bytes()) != source_hashes.get(source_name):
+            return None
+        bundle_file = bundle_dir / name
+        if not bundle_file.exists():
+            return None
+        data = bundle_file.read_bytes()
+        if _sha256_bytes(data) != meta.get("sha256"):
+            return None
+        rendered[name] = data
+    return rendered or None
+
+
+def build_payload_manifest(source_root: pathlib.Path) -> dict[str, str]:
+    """sha256 of every payload file the installer consumes, keyed by repo path."""
+    paths = [f"{ENGINE_DIR}/{rel}" for rel in MAGIC_FILES]
+    paths += [f"{AGENT_DIR}/{WORKFLOWS_DIR}/{wf}{DEFAULT_EXT}" for wf in WORKFLOWS]
+    paths.append("installers/adapters.json")
+    manifest: dict[str, str] = {}
+    for rel_path in paths:
+        path = source_root / rel_path
+        if path.is_file():
+            manifest[rel_path] = _sha256_bytes(path.read_bytes())
+    return manifest
+
+
+def build_adapter_bundle(
+    source_root: pathlib.Path, adapters: dict, out_dir: pathlib.Path, version: str
+) -> dict:
+    """
+    Renders every adapter into `out_dir/<env>/` and writes `out_dir/manifest.json`
+    with the sha256 of each rendered file and of the workflow it came from,
+    plus the payload digests the installer verifies downloads against.
+    Used at release time so installers can copy files instead of converting them.
+    """
+    src_dir = source_root / AGENT_DIR / WORKFLOWS_DIR
+    sources: dict[str, str] = {}
+    for wf_name in WORKFLOWS:
+        src_file = src_dir / (wf_name + DEFAULT_EXT)
+        if src_file.exists():
+            sources[src_file.name] = _sha256_bytes(src_file.read_bytes())
+
+    manifest: dict = {
+        "schemaVersion": 1,
+        "version": version,
+        "sources": sources,
+        "payload": build_payload_manifest(source_root),
+        "adapters": {},
+    }
+    for env, adapter in adapters.items():
+        rendered = render_adapter(source_root, adapter)
+        files: dict[str, dict] = {}
+        for wf_name in WORKFLOWS:
+            name = _adapter_dest_name(wf_name, adapter)
+            if name not in rendered:
+                continue
+            out_file = out_dir / env / name
+            out_file.parent.mkdir(parents=True, exist_ok=True)
+            out_file.write_bytes(rendered[name])
+            files[name] = {
+                "sha256": _sha256_bytes(rendered[name]),
+                "source": wf_name + DEFAULT_EXT,
+            }
+        manifest["adapters"][env] = {"dest": adapter["dest"], "files": files}
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / "manifest.json").write_text(
+        json.dumps(manifest, indent=2, sort_keys=True) + "\n", encoding="utf-8"
+    )
+    return manifest
+
+
+def _adapter_store_path(dest: pathlib.Path, adapter: dict, name: str) -> pathlib.Path:
+    # A rendering depends only on the target format and the file name.
+    return dest / ENGINE_DIR / ADAPTER_STORE_DIR / _adapter_format(adapter) / name
+
+
+def _linked_store_file(dest: pathlib.Path, path: pathlib.Path) -> pathlib.Path | None:
+    """The store file `path` links to, or None if it is not a store link."""
+    try:
+        target = os.readlink(path)
+    except OSError:
+        return None
+    store = pathlib.Path(os.path.abspath(dest / ENGINE_DIR / ADAPTER_STORE_DIR))
+    resolved = pathlib.Path(os.path.abspath(path.parent / target))
+    return resolved if _is_within_directory(store, resolved) else None
+
+
+def refresh_adapter_store(
+    source_root: pathlib.Path,
+    dest: pathlib.Path,
+    adapters: dict,
+    writer: BulkWriter,
+    stage: StagedInstall | None = None,
+    minify: dict | None = None,
+    skip: list[str] | tuple = (),
+) -> int:
+    """
+    Re-renders the store files that adapter links in `dest` point to, so an
+    update writes each format once however many adapters share it. Store
+    files listed in `skip` (engine-relative, e.g. update conflicts) are kept.
+    Returns the number of store files refreshed.
+    """
+    src_dir = source_root / AGENT_DIR / WORKFLOWS_DIR
+    done: set[pathlib.Path] = set()
+    for adapter in adapters.values():
+        for wf_name in WORKFLOWS:
+            src_file = src_dir / (wf_name + DEFAULT_EXT)
+            name = _adapter_dest_name(wf_name, adapter)
+            store_file = _adapter_store_path(dest, adapter, name)
+            linked = _linked_store_file(dest, dest / adapter["dest"] / name)
+            if (
+                linked is None
+                or linked != pathlib.Path(os.path.abspath(store_file))
+                or store_file in done
+                or not src_file.exists()
+            ):
+                continue
+            done.add(store_file)
+            rel = f"{ADAPTER_STORE_DIR}/{_adapter_format(adapter)}/{name}"
+            if rel in skip:
+                continue
+            data = _render_workflow(src_file, name, adapter, minify)
+            store_dir = (
+                stage.path_for(store_file.parent) if stage else store_file.parent
+            )
+            writer.write_bytes(store_dir / name, data)
+    return len(done)
+
+
+def _default_adapter() -> dict:
+    """The plain `.agent/workflows/` install, described as an adapter."""
+    return {
+        "dest": f"{AGENT_DIR}/{WORKFLOWS_DIR}",
+        "ext": DEFAULT_EXT,
+        "removePrefix": "",
+    }
+
+
+def adapter_manifest_entry(
+    source_root: pathlib.Path,
+    adapter: dict,
+    rendered: dict[str, bytes],
+    minify: dict | None = None,
+    link: bool = False,
+) -> dict:
+    """
+    Manifest record for one installed adapter: for each rendered file, the
+    workflow it came from with that workflow's sha256, and the sha256 of the
+    bytes written, which tells a later update whether the file was edited.
+    """
+    src_dir = source_root / AGENT_DIR / WORKFLOWS_DIR
+    files: dict[str, dict] = {}
+    for wf_name in WORKFLOWS:
+        name = _adapter_dest_name(wf_name, adapter)
+        src_file = src_dir / (wf_name + DEFAULT_EXT)
+        if name in rendered and src_file.exists():
+            files[name] = {
+                "source": src_file.name,
+                "sourceSha256": _sha256_bytes(src_file.read_bytes()),
+                "sha256": _sha256_bytes(rendered[name]),
+            }
+    return {
+        "dest": adapter["dest"],
+        "format": _adapter_format(adapter),
+        "minify": minify,
+        "linked": bool(link and BulkWriter._use_symlink),
+        "files": files,
+    }
+
+
+def load_adapter_manifest(dest: pathlib.Path) -> dict | None:
+    path = dest / ENGINE_DIR / ADAPTER_MANIFEST_FILE
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if (
+        not isinstance(manifest, dict)
+        or manifest.get("schemaVersion") != ADAPTER_MANIFEST_SCHEMA_VERSION
+        or not isinstance(manifest.get("adapters"), dict)
+    ):
+        return None
+    return manifest
+
+
+def update_adapters(
+    source_root: pathlib.Path,
+    dest: pathlib.Path,
+    adapters: dict,
+    manifest: dict,
+    writer: BulkWriter,
+    stage: StagedInstall | None = None,
+    minify: dict | None = None,
+) -> dict:
+    """
+    Refreshes the adapters recorded in `manifest` (updated in place). Only
+    files whose source workflow changed, or that are new in this release,
+    are rendered and written. A file whose current content no longer matches
+    the recorded sha256 was edited or deleted locally and is left alone.
+    """
+
+    def target_path(path: pathlib.Path) -> pathlib.Path:
+        return stage.path_for(path) if stage else path
+
+    src_dir = source_root / AGENT_DIR / WORKFLOWS_DIR
+    result: dict = {"updated": [], "kept": [], "unchanged": 0}
+    for env, entry in manifest["adapters"].items():
+        adapter = _default_adapter() if env == "default" else adapters.get(env)
+        if not adapter or adapter["dest"] != entry.get("dest"):
+            continue
+        dest_dir = dest / adapter["dest"]
+        options_changed = entry.get("minify") != minify
+        for wf_name in WORKFLOWS:
+            src_file = src_dir / (wf_name + DEFAULT_EXT)
+            if not src_file.exists():
+                continue
+            name = _adapter_dest_name(wf_name, adapter)
+            rel = f"{adapter['dest']}/{name}"
+            source = src_file.read_bytes()
+            recorded = entry["files"].get(name)
+            if (
+                recorded
+                and recorded["sourceSha256"] == _sha256_bytes(source)
+                and not options_changed
+            ):
+                result["unchanged"] += 1
+                continue
+
+            store_file = _adapter_store_path(dest, adapter, name)
+            local = store_file if entry.get("linked") else dest_dir / name
+            if recorded:
+                try:
+                    if entry.get("linked") and not _linked_store_file(
+                        dest, dest_dir / name
+                    ):
+                        raise OSError("link replaced by a regular file")
+                    current = _sha256_bytes(local.read_bytes())
+                except OSError:
+                    current = None
+                if current != recorded["sha256"]:
+                    result["kept"].append(rel)
+                    continue
+
+            data = _render_workflow_bytes(source, name, adapter, minify)
+            if entry.get("linked"):
+                writer.write_bytes(target_path(store_file.parent) / name, data)
+                writer.link_file(
+                    target_path(dest_dir) / name,
+                    os.path.relpath(store_file, dest_dir),
+                    data,
+                )
+            else:
+                writer.write_bytes(target_path(dest_dir) / name, data)
+            entry["files"][name] = {
+                "source": src_file.name,
+                "sourceSha256": _sha256_bytes(source),
+                "sha256": _sha256_bytes(data),
+            }
+            result["updated"].append(rel)
+        entry["minify"] = minify
+    return result
+
+
+def _materialize_adapter_links(dest: pathlib.Path, adapters: dict) -> int:
+    """Replaces adapter links into the store with copies of their content."""
+    count = 0
+    for adapter in adapters.values():
+        dest_dir = dest / adapter["dest"]
+        if not dest_dir.is_dir():
+            continue
+        for path in dest_dir.iterdir():
+            if _linked_store_file(dest, path) is None:
+                continue
+            try:
+                data = path.read_bytes()
+            except OSError:
+                continue
+            path.unlink()
+            path.write_bytes(data)
+            count += 1
+    return count
+
+
+def install_adapter(
+    source_root: pathlib.Path,
+    dest: pathlib.Path,
+    env: str,
+    adapters: dict,
+    writer: BulkWriter | None = None,
+    stage: StagedInstall | None = None,
+    rendered: dict[str, bytes] | None = None,
+    minify: dict | None = None,
+    link: bool = False,
+    manifest: dict | None = None,
+) -> dict | None:
+    """
+    Writes one adapter's workflows. With `minify`, returns the rendered size
+    against the source workflows so callers can report the bytes saved.
+    With `link`, each file is written once to the shared store under
+    .magic/rendered/ and the adapter's files become symlinks to it.
+    The files written are recorded in `manifest` (see adapter_manifest_entry).
+    """
+    if writer is None:
+        writer = stage.writer if stage else BulkWriter()
+
+    def target_path(path: pathlib.Path) -> pathlib.Path:
+        return stage.path_for(path) if stage else path
+
+    adapter = adapters.get(env)
+    if not adapter:
+        _print_warning(f"⚠️  Unknown --env value: '{env}'.")
+        print(f"   Valid values: {', '.join(adapters.keys())}")
+        print(f"   Falling back to default {AGENT_DIR}/")
+        writer.copy_tree(source_root / AGENT_DIR, target_path(dest / AGENT_DIR))
+        return None
+
+    src_dir = source_root / AGENT_DIR / WORKFLOWS_DIR
+    dest_dir = dest / adapter["dest"]
+    target_ext = adapter["ext"]
+
+    if not src_dir.exists():
+        _print_warning(f"⚠️  Source {AGENT_DIR}/{WORKFLOWS_DIR}/ not found.")
+        return None
+
+    with _TRACE.span(f"adapter:{env}") as span:
+        span["source"] = "streamed"
+        if rendered is not None:
+            # Rendered while the payload was streaming; use it only if complete.
+            expected = {
+                _adapter_dest_name(wf_name, adapter)
+                for wf_name in WORKFLOWS
+                if (src_dir / (wf_name + DEFAULT_EXT)).exists()
+            }
+            if set(rendered) != expected:
+                rendered = None
+        if rendered is None and minify is None:
+            # Release bundles hold the verbatim rendering only.
+            span["source"] = "bundle"
+            rendered = _load_prerendered_adapter(source_root, env, adapter)
+        if rendered is None:
+            span["source"] = "rendered"
+            rendered = render_adapter(source_root, adapter, minify)
+
+        staged_dir = target_path(dest_dir)
+        writer.ensure_dir(staged_dir)
+        for name, data in rendered.items():
+            if not link:
+                writer.write_bytes(staged_dir / name, data)
+                continue
+            # Links are relative and computed between final locations, so
+            # they stay valid once the staging trees are swapped in.
+            store_file = _adapter_store_path(dest, adapter, name)
+            writer.write_bytes(target_path(store_file.parent) / name, data)
+            writer.link_file(
+                staged_dir / name, os.path.relpath(store_file, dest_dir), data
+            )
+        if link:
+            span["linked"] = BulkWriter._use_symlink
+        if manifest is not None:
+            manifest[env] = adapter_manifest_entry(
+                source_root, adapter, rendered, minify, link
+            )
+
+    print(f"Adapter installed: {env} -> {adapter['dest']}/ ({target_ext})")
+    if minify is None:
+        return None
+    # Source lengths, as for the default adapter: no second, verbatim render.
+    full = sum(
+        (src_dir / (wf_name + DEFAULT_EXT)).stat().st_size
+        for wf_name in WORKFLOWS
+        if _adapter_dest_name(wf_name, adapter) in rendered
+    )
+    size = sum(len(data) for data in rendered.values())
+    saved = full - size
+    print(
+        f"   Minified: {_format_bytes(full)} -> {_format_bytes(size)} "
+        f"(saved {_format_bytes(max(saved, 0))}, {saved / full if full else 0:.0%})"
+    )
+    return {"sourceBytes": full, "bytes": size, "savedBytes": saved}
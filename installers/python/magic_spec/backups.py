@@ -0,0 +1,246 @@
+"""Content-addressed backup generations and rollback."""
+
+from __future__ import annotations
+
+import json
+import os
+import datetime
+import pathlib
+import stat
+
+from .core import (
+    AGENT_DIR,
+    BACKUP_DIR,
+    BACKUP_KEEP,
+    BACKUP_MAX_BYTES,
+    ENGINE_DIR,
+    _REPORT,
+    _format_bytes,
+    _get_file_checksum,
+    _print_error,
+)
+from .fsio import (
+    BulkWriter,
+    StagedInstall,
+)
+
+
+def _backup_roots() -> list[str]:
+    return [ENGINE_DIR, AGENT_DIR]
+
+
+def _list_generations(store: pathlib.Path) -> list[int]:
+    gen_dir = store / "generations"
+    if not gen_dir.exists():
+        return []
+    return sorted(int(p.stem) for p in gen_dir.glob("*.json") if p.stem.isdigit())
+
+
+def _read_generation(store: pathlib.Path, generation: int) -> dict:
+    gen_file = store / "generations" / f"{generation}.json"
+    return json.loads(gen_file.read_text(encoding="utf-8"))
+
+
+def _backup_object_path(store: pathlib.Path, digest: str) -> pathlib.Path:
+    return store / "objects" / digest[:2] / digest[2:]
+
+
+def _store_backup_object(store: pathlib.Path, source: pathlib.Path, digest: str) -> int:
+    """
+    Adds `source` to the object store. Returns the bytes newly stored.
+    Objects are reflinked or copied, never hardlinked: an editor rewriting
+    the live file in place would otherwise change every generation's copy.
+    They are made read-only and restored by copy as well.
+    """
+    obj = _backup_object_path(store, digest)
+    try:
+        st = os.stat(obj)
+        # Objects from older installers may still share the live file's inode.
+        if st.st_nlink == 1 and st.st_size == os.stat(source).st_size:
+            return 0
+        os.chmod(obj, stat.S_IMODE(st.st_mode) | stat.S_IWUSR)
+    except FileNotFoundError:
+        pass
+    tmp = obj.with_name(f"{obj.name}.tmp-{os.getpid()}")
+    BulkWriter().copy_file(source, tmp)
+    os.chmod(tmp, stat.S_IMODE(os.stat(tmp).st_mode) & ~0o222)
+    os.replace(tmp, obj)
+    return obj.stat().st_size
+
+
+def _restore_backup_object(
+    writer: BulkWriter, obj: pathlib.Path, target: pathlib.Path
+) -> None:
+    writer.copy_file(obj, target)
+    os.chmod(target, stat.S_IMODE(os.stat(target).st_mode) | stat.S_IWUSR)
+
+
+def _update_gitignore(dest: pathlib.Path, entries: list[str]) -> None:
+    gitignore_file = dest / ".gitignore"
+    if not gitignore_file.exists():
+        return
+    content = gitignore_file.read_text(encoding="utf-8")
+    altered = False
+    for entry in entries:
+        if entry not in content:
+            content += f"\n{entry}"
+            altered = True
+    if altered:
+        gitignore_file.write_text(content.strip() + "\n", encoding="utf-8")
+
+
+def _prune_backups(store: pathlib.Path) -> None:
+    """
+    Keeps the newest BACKUP_KEEP generations (at least 1; the config loader
+    rejects smaller values), dropping the oldest while they exceed
+    BACKUP_MAX_BYTES, then deletes objects no kept generation references.
+    """
+    generations = _list_generations(store)
+    manifests = {g: _read_generation(store, g) for g in generations}
+
+    def stored_bytes(kept: list[int]) -> int:
+        digests = {d for g in kept for d in manifests[g]["files"].values()}
+        total = 0
+        for digest in digests:
+            try:
+                total += _backup_object_path(store, digest).stat().st_size
+            except OSError:
+                pass
+        return total
+
+    kept = generations[-BACKUP_KEEP:]
+    while len(kept) > 1 and stored_bytes(kept) > BACKUP_MAX_BYTES:
+        kept = kept[1:]
+
+    for generation in generations:
+        if generation not in kept:
+            (store / "generations" / f"{generation}.json").unlink()
+
+    referenced = {d for g in kept for d in manifests[g]["files"].values()}
+    objects_dir = store / "objects"
+    if not objects_dir.exists():
+        return
+    for bucket in objects_dir.iterdir():
+        for obj in bucket.iterdir():
+            if bucket.name + obj.name not in referenced:
+                os.chmod(obj, stat.S_IWUSR | stat.S_IRUSR)  # Windows: read-only
+                obj.unlink()
+        if not any(bucket.iterdir()):
+            bucket.rmdir()
+
+
+def create_backup(dest: pathlib.Path, prune: bool = True) -> int | None:
+    """
+    Snapshots .magic/ and .agent/ into the content-addressed backup store and
+    records a generation manifest. Files already in the store (same digest)
+    are not copied again, and a snapshot identical to the latest generation
+    creates no new generation. With prune=False old generations are kept
+    until the caller prunes. Returns the generation number, if any.
+    """
+    print("📦 Creating backup of existing engine files...")
+    store = dest / BACKUP_DIR
+    files: dict[str, str] = {}
+    new_bytes = 0
+    for root_name in _backup_roots():
+        root = dest / root_name
+        if not root.is_dir():
+            continue
+        for dirpath, _dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                path = pathlib.Path(dirpath) / filename
+                rel = path.relative_to(dest).as_posix()
+                digest = _get_file_checksum(path)
+                if digest is None:
+                    continue
+                new_bytes += _store_backup_object(store, path, digest)
+                files[rel] = digest
+
+    if not files:
+        return None
+
+    generations = _list_generations(store)
+    if generations and _read_generation(store, generations[-1])["files"] == files:
+        print(f"   Unchanged since backup generation {generations[-1]}.")
+        return generations[-1]
+
+    generation = (generations[-1] + 1) if generations else 1
+    version_file = dest / ENGINE_DIR / ".version"
+    manifest = {
+        "generation": generation,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(
+            timespec="seconds"
+        ),
+        "version": (
+            version_file.read_text(encoding="utf-8").strip()
+            if version_file.exists()
+            else None
+        ),
+        "files": files,
+    }
+    gen_dir = store / "generations"
+    gen_dir.mkdir(parents=True, exist_ok=True)
+    tmp = gen_dir / f"{generation}.json.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, gen_dir / f"{generation}.json")
+    print(
+        f"   Backup generation {generation}: {len(files)} file(s), "
+        f"{_format_bytes(new_bytes)} newly stored."
+    )
+
+    if prune:
+        _prune_backups(store)
+    _update_gitignore(dest, [f"{BACKUP_DIR}/"])
+    return generation
+
+
+def run_rollback(dest: pathlib.Path, generation: int | None = None) -> int:
+    store = dest / BACKUP_DIR
+    generations = _list_generations(store)
+    if not generations:
+        _print_error(f"Error: no backups found in {BACKUP_DIR}/.")
+        return 1
+    if generation is None:
+        generation = generations[-1]
+    if generation not in generations:
+        _print_error(f"Error: backup generation {generation} not found.")
+        print(f"   Available: {', '.join(str(g) for g in generations)}")
+        return 1
+
+    manifest = _read_generation(store, generation)
+    for rel, digest in manifest["files"].items():
+        obj = _backup_object_path(store, digest)
+        if not obj.exists() or _get_file_checksum(obj) != digest:
+            _print_error(f"Error: backup object for {rel} is missing or corrupted.")
+            return 1
+
+    # Snapshot the current state first so the rollback itself can be undone.
+    # Pruning waits until the restore is done: it could drop the very
+    # generation being restored and delete its objects.
+    create_backup(dest, prune=False)
+
+    print(f"⏪ Restoring backup generation {generation}...")
+    writer = BulkWriter()
+    with StagedInstall(writer) as stage:
+        for root_name in _backup_roots():
+            prefix = root_name + "/"
+            entries = {
+                rel[len(prefix) :]: digest
+                for rel, digest in manifest["files"].items()
+                if rel.startswith(prefix)
+            }
+            if not entries:
+                continue
+            staged_root = stage.path_for(dest / root_name, clone=False)
+            for rel, digest in entries.items():
+                target = staged_root / rel
+                _restore_backup_object(
+                    writer, _backup_object_path(store, digest), target
+                )
+        stage.commit(order=[dest / ENGINE_DIR])
+    _prune_backups(store)
+
+    version = manifest.get("version") or "unknown"
+    _REPORT.result = {"generation": generation, "version": version}
+    _REPORT.files_written = sorted(manifest["files"])
+    print(f"✅ Rolled back to generation {generation} (version {version}).")
+    return 0
@@ -0,0 +1,283 @@
+"""Compiles the .design/CHANGELOG.md draft into release blocks."""
+
+from __future__ import annotations
+
+import datetime
+import pathlib
+import re
+
+from .core import (
+    DESIGN_DIR,
+    ENGINE_DIR,
+    _REPORT,
+    _print_error,
+)
+from .fsio import (
+    _atomic_write,
+    _project_lock,
+)
+from .markdown import (
+    _MD_FENCE,
+)
+
+CHANGELOG_CATEGORIES = (
+    "Added",
+    "Changed",
+    "Deprecated",
+    "Removed",
+    "Fixed",
+    "Security",
+)
+
+
+CHANGELOG_DRAFT_TEMPLATE = (
+    "# Changelog Accumulator (Unreleased)\n\n"
+    "**Current Scope:** Empty (Accumulating for next milestone)\n"
+    "**Status:** Accumulating\n"
+)
+
+
+_CHANGELOG_PHASE = re.compile(r"^##\s+(.+?)\s*$")
+
+
+_CHANGELOG_CATEGORY = re.compile(r"^###\s+(.+?)\s*$")
+
+
+_CHANGELOG_BULLET = re.compile(r"^\s*[-*+]\s+(.*\S)\s*$")
+
+
+_CHANGELOG_RELEASE = re.compile(r"^## \[([^\]]+)\](.*)$", re.M)
+
+
+_CHANGE_RECORD = re.compile(r"^(Created|Modified|Deleted|Decided):\s*", re.I)
+
+
+_TASK_REF = re.compile(r"^\[?T-\d+[A-Z]\d+\]?\s*(?:[:—–-]\s*)?", re.I)
+
+
+# Leading words of an uncategorized draft bullet, checked in this order.
+_CHANGELOG_VERBS = (
+    ("Security", ("security", "harden", "sanitize", "sanitise")),
+    ("Fixed", ("fix", "fixed", "fixes", "repair", "resolve", "resolved")),
+    ("Removed", ("remove", "removed", "delete", "deleted", "drop", "dropped")),
+    ("Deprecated", ("deprecate", "deprecated")),
+    ("Added", ("add", "added", "create", "created", "implement", "introduce")),
+)
+
+
+def _changelog_category(text: str, heading: str | None) -> str | None:
+    """Keep a Changelog category of one draft bullet; None for internal notes."""
+    record = _CHANGE_RECORD.match(text)
+    if record:
+        kind = record.group(1).lower()
+        if kind == "decided":
+            return None
+        if kind == "created":
+            return "Added"
+        if kind == "deleted":
+            return "Removed"
+    if heading:
+        for category in CHANGELOG_CATEGORIES:
+            if heading.lower() == category.lower():
+                return category
+    words = re.findall(
+        r"[a-z]+", _TASK_REF.sub("", _CHANGE_RECORD.sub("", text)).lower()
+    )
+    first = words[0] if words else ""
+    for category, verbs in _CHANGELOG_VERBS:
+        if first in verbs or (category == "Fixed" and set(words) & set(verbs)):
+            return category
+    return "Changed"
+
+
+def parse_changelog_draft(text: str) -> dict:
+    """
+    Structured model of .design/CHANGELOG.md: one entry per phase block with
+    its bullets grouped by category. Bullets under a `### <Category>` heading
+    keep it; others are classified from a Change Record prefix (`Created:`,
+    `Modified:`, `Deleted:`) or their leading verb. `Decided:` notes and
+    task ids are dropped as internal.
+    """
+    phases: list[dict] = []
+    phase: dict | None = None
+    heading: str | None = None
+    in_fence = False
+    for line in text.splitlines():
+        if _MD_FENCE.match(line.encode("utf-8")):
+            in_fence = not in_fence
+            continue
+        if in_fence:
+            continue
+        match = _CHANGELOG_PHASE.match(line)
+        if match:
+            phase = {"title": match.group(1), "entries": []}
+            phases.append(phase)
+            heading = None
+            continue
+        match = _CHANGELOG_CATEGORY.match(line)
+        if match:
+            heading = match.group(1)
+            continue
+        match = _CHANGELOG_BULLET.match(line)
+        if not match or phase is None:
+            continue
+        category = _changelog_category(match.group(1), heading)
+        if category is None:
+            continue
+        entry = _TASK_REF.sub("", _CHANGE_RECORD.sub("", match.group(1)))
+        if entry:
+            phase["entries"].append(
+                {"category": category, "text": entry[0].upper() + entry[1:]}
+            )
+    return {"phases": phases}
+
+
+def _changelog_key(text: str) -> str:
+    return " ".join(re.sub(r"[`*_]", "", text).lower().split()).rstrip(".;:")
+
+
+def compile_changelog(draft: dict, version: str, date: str, sep: str = "-") -> dict:
+    """
+    Merges every phase of a parsed draft into one `## [version]` block in
+    Keep a Changelog category order. Entries equal after case, whitespace
+    and Markdown emphasis are normalized are listed once; the first wording
+    wins.
+    """
+    grouped: dict[str, list[str]] = {c: [] for c in CHANGELOG_CATEGORIES}
+    seen: set[str] = set()
+    duplicates = 0
+    for phase in draft["phases"]:
+        for entry in phase["entries"]:
+            key = _changelog_key(entry["text"])
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            grouped[entry["category"]].append(entry["text"])
+    lines = [f"## [{version}] {sep} {date}"]
+    for category, items in grouped.items():
+        if items:
+            lines += ["", f"### {category}", ""] + [f"- {item}" for item in items]
+    return {
+        "text": "\n".join(lines) + "\n",
+        "categories": {c: items for c, items in grouped.items() if items},
+        "entries": len(seen),
+        "duplicates": duplicates,
+    }
+
+
+def _release_insert_offset(text: str) -> tuple[int, str]:
+    """
+    Where a new release block goes in the root CHANGELOG.md (before the
+    newest release, after `[Unreleased]`) and the heading separator the
+    file already uses.
+    """
+    for match in _CHANGELOG_RELEASE.finditer(text):
+        if match.group(1).lower() == "unreleased":
+            continue
+        sep = "—" if match.group(2).lstrip().startswith("—") else "-"
+        return match.start(), sep
+    return len(text), "-"
+
+
+def compile_changelog_release(
+    dest: pathlib.Path,
+    version: str | None = None,
+    date: str | None = None,
+    dry_run: bool = False,
+) -> dict:
+    """
+    Compiles .design/CHANGELOG.md into the root CHANGELOG.md. The release
+    block is spliced in before the newest release; the rest of the file is
+    kept byte for byte. The draft is reset to its empty template afterwards.
+    A version already present in the root file is left alone.
+    """
+    draft_path = dest / DESIGN_DIR / "CHANGELOG.md"
+    root_path = dest / "CHANGELOG.md"
+    if version is None:
+        version_file = dest / ENGINE_DIR / ".version"
+        if not version_file.is_file():
+            raise LookupError(f"no {ENGINE_DIR}/.version; pass --release=<version>")
+        version = version_file.read_text(encoding="utf-8").strip()
+    version = version.lstrip("v")
+    date = date or datetime.date.today().isoformat()
+
+    with _project_lock(dest, "CHANGELOG.md"):
+        try:
+            draft_text = draft_path.read_text(encoding="utf-8-sig")
+        except OSError:
+            draft_text = ""
+        try:
+            root = root_path.read_bytes().decode("utf-8")
+        except OSError:
+            root = ""
+        result = {"version": version, "date": date, "written": False}
+
+        released = {m.group(1) for m in _CHANGELOG_RELEASE.finditer(root)}
+        if version in released:
+            return dict(result, reason="released")
+        offset, sep = _release_insert_offset(root)
+        block = compile_changelog(parse_changelog_draft(draft_text), version, date, sep)
+        result.update(
+            text=block["text"],
+            categories=block["categories"],
+            entries=block["entries"],
+            duplicates=block["duplicates"],
+        )
+        if not block["entries"]:
+            return dict(result, reason="empty")
+        if dry_run:
+            return result
+
+        if not root:
+            root = (
+                "# Changelog\n\nAll notable changes to this project will be "
+                "documented in this file.\n\n"
+            )
+            offset = len(root)
+        head = root[:offset]
+        if head and not head.endswith("\n\n"):
+            head = head.rstrip("\n") + "\n\n"
+        tail = root[offset:]
+        _atomic_write(
+            root_path, (head + block["text"] + ("\n" if tail else "") + tail).encode()
+        )
+        if draft_path.is_file():
+            _atomic_write(draft_path, CHANGELOG_DRAFT_TEMPLATE.encode())
+    return dict(result, written=True)
+
+
+def run_changelog(
+    dest: pathlib.Path,
+    action: str | None,
+    version: str | None = None,
+    date: str | None = None,
+    dry_run: bool = False,
+) -> int:
+    if action != "compile":
+        _print_error(
+            "Usage: magic-spec changelog compile [--release=<X.Y.Z>] [--dry-run]"
+        )
+        return 1
+    try:
+        result = compile_changelog_release(dest, version, date, dry_run)
+    except (LookupError, TimeoutError) as e:
+        _print_error(f"Error: {e}.")
+        return 1
+    _REPORT.result = result
+    if result.get("reason") == "released":
+        print(f"✅ CHANGELOG.md already has [{result['version']}]; nothing to compile.")
+        return 0
+    if result.get("reason") == "empty":
+        print(f"✅ {DESIGN_DIR}/CHANGELOG.md has no entries; nothing to compile.")
+        return 0
+    if dry_run:
+        print(result["text"].rstrip("\n"))
+        return 0
+    _REPORT.files_written += ["CHANGELOG.md", f"{DESIGN_DIR}/CHANGELOG.md"]
+    counts = ", ".join(f"{len(v)} {k}" for k, v in result["categories"].items())
+    dropped = (
+        f"; {result['duplicates']} duplicates merged" if result["duplicates"] else ""
+    )
+    print(f"📝 Added [{result['version']}] to CHANGELOG.md ({counts}{dropped}).")
+    return 0
@@ -0,0 +1,445 @@
+"""Installer configuration, shared constants and the per-run report."""
+
+from __future__ import annotations
+
+import json
+import os
+import contextlib
+import datetime
+import hashlib
+import pathlib
+import re
+import sys
+import threading
+import time
+
+
+def _find_installer_config_path() -> pathlib.Path:
+    candidates = [
+        pathlib.Path(__file__).with_name("config.json"),
+        pathlib.Path(__file__).resolve().parents[2] / "config.json",
+    ]
+    for config_path in candidates:
+        if config_path.exists():
+            return config_path
+    raise RuntimeError("installers/config.json was not found.")
+
+
+def _find_bundled_adapters_path() -> pathlib.Path | None:
+    candidates = [
+        pathlib.Path(__file__).with_name("adapters.json"),
+        pathlib.Path(__file__).resolve().parents[2] / "adapters.json",
+    ]
+    for adapters_path in candidates:
+        if adapters_path.exists():
+            return adapters_path
+    return None
+
+
+def _require_non_empty_str(value: object, field_name: str) -> str:
+    if not isinstance(value, str) or not value.strip():
+        raise RuntimeError(
+            f"Invalid installers/config.json: field '{field_name}' must be a non-empty string."
+        )
+    return value.strip()
+
+
+def _require_positive_int(value: object, field_name: str) -> int:
+    if not isinstance(value, int) or value <= 0:
+        raise RuntimeError(
+            f"Invalid installers/config.json: field '{field_name}' must be a positive integer."
+        )
+    return value
+
+
+def _require_non_negative_int(value: object, field_name: str) -> int:
+    if not isinstance(value, int) or value < 0:
+        raise RuntimeError(
+            f"Invalid installers/config.json: field '{field_name}' must be a non-negative integer."
+        )
+    return value
+
+
+def _require_choice(value: object, field_name: str, choices: tuple[str, ...]) -> str:
+    if value not in choices:
+        raise RuntimeError(
+            f"Invalid installers/config.json: field '{field_name}' must be one of: "
+            + ", ".join(choices)
+            + "."
+        )
+    return value
+
+
+def _optional_object(parsed: dict, field_name: str) -> dict:
+    value = parsed.get(field_name, {})
+    if not isinstance(value, dict):
+        raise RuntimeError(
+            f"Invalid installers/config.json: field '{field_name}' must be an object."
+        )
+    return value
+
+
+PAYLOAD_FORMATS = ("tar.gz", "zip")
+
+
+def _load_installer_config() -> dict:
+    config_path = _find_installer_config_path()
+    try:
+        parsed = json.loads(config_path.read_text(encoding="utf-8"))
+    except Exception as e:
+        raise RuntimeError(f"Failed to read installers/config.json: {e}") from e
+
+    if not isinstance(parsed, dict):
+        raise RuntimeError(
+            "Invalid installers/config.json: root must be a JSON object."
+        )
+
+    github_repo = _require_non_empty_str(parsed.get("githubRepo"), "githubRepo")
+    package_name = _require_non_empty_str(parsed.get("packageName"), "packageName")
+
+    download_cfg = parsed.get("download")
+    if not isinstance(download_cfg, dict):
+        raise RuntimeError(
+            "Invalid installers/config.json: field 'download' must be an object."
+        )
+    timeout_ms = _require_positive_int(
+        download_cfg.get("timeoutMs"), "download.timeoutMs"
+    )
+
+    user_agent_cfg = parsed.get("userAgent")
+    if not isinstance(user_agent_cfg, dict):
+        raise RuntimeError(
+            "Invalid installers/config.json: field 'userAgent' must be an object."
+        )
+    python_user_agent = _require_non_empty_str(
+        user_agent_cfg.get("python"), "userAgent.python"
+    )
+    backup_cfg = _optional_object(parsed, "backup")
+    releases_cfg = _optional_object(parsed, "releases")
+
+    return {
+        "githubRepo": github_repo,
+        "packageName": package_name,
+        "download": {
+            "timeoutMs": timeout_ms,
+            "tempPrefix": parsed["download"].get("tempPrefix", "magic-spec-"),
+            "format": _require_choice(
+                download_cfg.get("format", "tar.gz"),
+                "download.format",
+                PAYLOAD_FORMATS,
+            ),
+            "retries": _require_non_negative_int(
+                download_cfg.get("retries", 4), "download.retries"
+            ),
+            "backoffMs": _require_non_negative_int(
+                download_cfg.get("backoffMs", 500), "download.backoffMs"
+            ),
+            "chunks": _require_positive_int(
+                download_cfg.get("chunks", 1), "download.chunks"
+            ),
+        },
+        "userAgent": {"python": python_user_agent},
+        "ejectTargets": parsed.get("eject", {}).get(
+            "targets",
+            [".magic", ".agent", ".magic.bak", ".agent.bak", ".magic-backups"],
+        ),
+        "removePrefix": parsed.get("removePrefix", ""),
+        "engineDir": _require_non_empty_str(parsed.get("engineDir"), "engineDir"),
+        "agentDir": _require_non_empty_str(parsed.get("agentDir"), "agentDir"),
+        "workflowsDir": _require_non_empty_str(
+            parsed.get("workflowsDir"), "workflowsDir"
+        ),
+        "defaultExt": _require_non_empty_str(parsed.get("defaultExt"), "defaultExt"),
+        "workflows": parsed.get("workflows", []),
+        "magicFiles": parsed.get("magicFiles", []),
+        "adapterBundlesDir": parsed.get("adapterBundlesDir", "installers/bundles"),
+        "backup": {
+            "dir": _require_non_empty_str(
+                backup_cfg.get("dir", ".magic-backups"), "backup.dir"
+            ),
+            "keep": _require_positive_int(backup_cfg.get("keep", 5), "backup.keep"),
+            "maxBytes": _require_positive_int(
+                backup_cfg.get("maxBytes", 50 * 1024 * 1024), "backup.maxBytes"
+            ),
+        },
+        "releases": {
+            "endpoint": _require_non_empty_str(
+                releases_cfg.get(
+                    "endpoint",
+                    f"https://api.github.com/repos/{github_repo}/releases/latest",
+                ),
+                "releases.endpoint",
+            ),
+            "cacheTtlSeconds": _require_non_negative_int(
+                releases_cfg.get("cacheTtlSeconds", 3600), "releases.cacheTtlSeconds"
+            ),
+            "timeoutMs": _require_positive_int(
+                releases_cfg.get("timeoutMs", 5000), "releases.timeoutMs"
+            ),
+        },
+    }
+
+
+INSTALLER_CONFIG = _load_installer_config()
+
+
+GITHUB_REPO = INSTALLER_CONFIG["githubRepo"]
+
+
+PACKAGE_NAME = INSTALLER_CONFIG["packageName"]
+
+
+DOWNLOAD_TIMEOUT_SECONDS = INSTALLER_CONFIG["download"]["timeoutMs"] / 1000.0
+
+
+PYTHON_USER_AGENT = INSTALLER_CONFIG["userAgent"]["python"]
+
+
+DEFAULT_PAYLOAD_FORMAT = INSTALLER_CONFIG["download"]["format"]
+
+
+DOWNLOAD_RETRIES = INSTALLER_CONFIG["download"]["retries"]
+
+
+DOWNLOAD_BACKOFF_SECONDS = INSTALLER_CONFIG["download"]["backoffMs"] / 1000.0
+
+
+DOWNLOAD_CHUNKS = INSTALLER_CONFIG["download"]["chunks"]
+
+
+DEFAULT_REMOVE_PREFIX = INSTALLER_CONFIG["removePrefix"]
+
+
+ENGINE_DIR = INSTALLER_CONFIG["engineDir"]
+
+
+AGENT_DIR = INSTALLER_CONFIG["agentDir"]
+
+
+WORKFLOWS_DIR = INSTALLER_CONFIG["workflowsDir"]
+
+
+DEFAULT_EXT = INSTALLER_CONFIG["defaultExt"]
+
+
+WORKFLOWS = INSTALLER_CONFIG["workflows"]
+
+
+MAGIC_FILES = INSTALLER_CONFIG["magicFiles"]
+
+
+ADAPTER_BUNDLES_DIR = INSTALLER_CONFIG["adapterBundlesDir"]
+
+
+# Shared adapter files, one per rendered format: .magic/rendered/<format>/<name>
+ADAPTER_STORE_DIR = "rendered"
+
+
+# Rendered adapter files and the workflow hashes they came from (under .magic/)
+ADAPTER_MANIFEST_FILE = ".adapters.json"
+
+
+ADAPTER_MANIFEST_SCHEMA_VERSION = 1
+
+
+BACKUP_DIR = INSTALLER_CONFIG["backup"]["dir"]
+
+
+BACKUP_KEEP = INSTALLER_CONFIG["backup"]["keep"]
+
+
+BACKUP_MAX_BYTES = INSTALLER_CONFIG["backup"]["maxBytes"]
+
+
+DESIGN_DIR = ".design"
+
+
+RELEASES_ENDPOINT = INSTALLER_CONFIG["releases"]["endpoint"]
+
+
+RELEASES_CACHE_TTL_SECONDS = INSTALLER_CONFIG["releases"]["cacheTtlSeconds"]
+
+
+RELEASES_TIMEOUT_SECONDS = INSTALLER_CONFIG["releases"]["timeoutMs"] / 1000.0
+
+
+def _is_within_directory(base_dir: pathlib.Path, target: pathlib.Path) -> bool:
+    try:
+        target.relative_to(base_dir)
+        return True
+    except ValueError:
+        return False
+
+
+TRACE_SCHEMA_VERSION = 1
+
+
+class _Trace:
+    """
+    Nested timing spans for one CLI run. Spans carry counters (bytes, files)
+    that code running inside them adds with count(), including worker
+    threads of the download pipeline. Written out as JSON by --profile.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        """Starts a fresh trace; the module-level instance is reused per run."""
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.spans: list[dict] = []
+        self.counters: dict[str, int] = {}
+        self._stack: list[dict] = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attrs):
+        with self._lock:
+            record = {
+                "name": name,
+                "parent": self._stack[-1]["id"] if self._stack else None,
+                "id": len(self.spans),
+                "start_ms": round((time.perf_counter() - self._t0) * 1000, 3),
+                "duration_ms": None,
+                "attrs": dict(attrs),
+            }
+            self.spans.append(record)
+            self._stack.append(record)
+        started = time.perf_counter()
+        try:
+            yield record["attrs"]
+        finally:
+            record["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            with self._lock:
+                self._stack.remove(record)
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            attrs = self._stack[-1]["attrs"] if self._stack else self.counters
+            attrs[key] = attrs.get(key, 0) + amount
+
+    def phases(self) -> dict[str, float]:
+        """Milliseconds per top-level span name (repeated spans are summed)."""
+        totals: dict[str, float] = {}
+        for record in self.spans:
+            if record["parent"] is None and record["duration_ms"] is not None:
+                totals[record["name"]] = round(
+                    totals.get(record["name"], 0.0) + record["duration_ms"], 3
+                )
+        return totals
+
+    def to_dict(self, command: list[str], exit_code: int) -> dict:
+        return {
+            "schemaVersion": TRACE_SCHEMA_VERSION,
+            "tool": PACKAGE_NAME,
+            "command": command,
+            "started": datetime.datetime.fromtimestamp(
+                self.started, datetime.timezone.utc
+            ).isoformat(),
+            "duration_ms": round((time.perf_counter() - self._t0) * 1000, 3),
+            "exit_code": exit_code,
+            "phases": self.phases(),
+            "counters": self.counters,
+            "spans": self.spans,
+        }
+
+
+_TRACE = _Trace()
+
+
+REPORT_SCHEMA_VERSION = 1
+
+
+class _Report:
+    """
+    Structured outcome of one CLI command, emitted on stdout by --json.
+    Commands fill `result` while printing their human-readable output.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.command = "install"
+        self.result: dict = {}
+        self.warnings: list[str] = []
+        self.errors: list[str] = []
+        self.files_written: list[str] = []
+        self.json_output = False
+
+    def to_dict(self, exit_code: int) -> dict:
+        return {
+            "schemaVersion": REPORT_SCHEMA_VERSION,
+            "tool": PACKAGE_NAME,
+            "command": self.command,
+            "ok": exit_code == 0 and not self.errors,
+            "exitCode": exit_code,
+            "result": self.result,
+            "warnings": self.warnings,
+            "errors": self.errors,
+            "timings": {
+                "totalMs": round((time.perf_counter() - _TRACE._t0) * 1000, 3),
+                "phases": _TRACE.phases(),
+            },
+            "filesWritten": self.files_written,
+        }
+
+
+_REPORT = _Report()
+
+
+_MESSAGE_PREFIX = re.compile(r"^(?:⚠️\s*|❌\s*|Error:\s*|Warning:\s*)")
+
+
+def _print_error(text: str) -> None:
+    """Prints an error line and records it for --json."""
+    print(text)
+    _REPORT.errors.append(_MESSAGE_PREFIX.sub("", text))
+
+
+def _print_warning(text: str) -> None:
+    """Prints a warning line and records it for --json."""
+    print(text)
+    _REPORT.warnings.append(_MESSAGE_PREFIX.sub("", text))
+
+
+def _user_cache_dir() -> pathlib.Path:
+    """Per-user cache root; MAGIC_SPEC_CACHE_DIR overrides the platform default."""
+    override = os.environ.get("MAGIC_SPEC_CACHE_DIR")
+    if override:
+        return pathlib.Path(override)
+    home = pathlib.Path.home()
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or home / "AppData" / "Local"
+    elif sys.platform == "darwin":
+        base = home / "Library" / "Caches"
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or home / ".cache"
+    return pathlib.Path(base) / PACKAGE_NAME
+
+
+def _format_bytes(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+def _sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _get_file_checksum(file_path: pathlib.Path) -> str | None:
+    if not file_path.exists():
+        return None
+    sha256_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for byte_block in iter(lambda: f.read(4096), b""):
+            sha256_hash.update(byte_block)
+    return sha256_hash.hexdigest()
+
+
+def _project_key(dest: pathlib.Path) -> str:
+    return hashlib.sha256(str(dest.resolve()).encode("utf-8")).hexdigest()[:16]
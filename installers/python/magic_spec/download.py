@@ -0,0 +1,927 @@
+"""Payload download: resumable and chunked fetches, streaming extraction."""
+
+from __future__ import annotations
+
+import json
+import os
+import asyncio
+import concurrent.futures
+import hashlib
+import http.client
+import io
+import pathlib
+import queue
+import random
+import re
+import socket
+import sys
+import tarfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import zipfile
+
+from .core import (
+    ADAPTER_BUNDLES_DIR,
+    AGENT_DIR,
+    DEFAULT_PAYLOAD_FORMAT,
+    DOWNLOAD_BACKOFF_SECONDS,
+    DOWNLOAD_CHUNKS,
+    DOWNLOAD_RETRIES,
+    DOWNLOAD_TIMEOUT_SECONDS,
+    ENGINE_DIR,
+    GITHUB_REPO,
+    INSTALLER_CONFIG,
+    PYTHON_USER_AGENT,
+    _TRACE,
+    _format_bytes,
+    _is_within_directory,
+    _print_error,
+    _sha256_bytes,
+    _user_cache_dir,
+)
+from .fsio import (
+    _COPY_CHUNK,
+)
+from .adapters import (
+    _load_bundle_manifest,
+)
+
+
+def get_download_url(version: str, payload_format: str = "tar.gz") -> str:
+    """Returns the archive URL (tarball or zipball) for the given version tag."""
+    if version == "main":
+        return (
+            f"https://github.com/{GITHUB_REPO}/archive/refs/heads/main.{payload_format}"
+        )
+    return f"https://github.com/{GITHUB_REPO}/archive/refs/tags/v{version}.{payload_format}"
+
+
+_PIPELINE_QUEUE_SIZE = 32
+
+
+_PIPELINE_WORKERS = 4
+
+
+_NETWORK_CHUNK = 64 * 1024
+
+
+class _PayloadDownloadError(Exception):
+    """Raised by the pipeline when the network stage failed."""
+
+
+class _ChunkStream(io.RawIOBase):
+    """Read-only file object over a queue of byte chunks (None marks the end)."""
+
+    def __init__(self, chunks: queue.Queue) -> None:
+        super().__init__()
+        self._chunks = chunks
+        self._buffer = b""
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer and not self._eof:
+            item = self._chunks.get()
+            if item is None:
+                self._eof = True
+            elif isinstance(item, BaseException):
+                self._eof = True
+                raise _PayloadDownloadError(str(item)) from item
+            else:
+                self._buffer = item
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def drain(self) -> None:
+        """Consumes the rest of the stream so the producer thread can finish."""
+        while not self._eof:
+            item = self._chunks.get()
+            if item is None or isinstance(item, BaseException):
+                self._eof = True
+
+    def discard(self) -> None:
+        """Drops queued chunks without waiting, unblocking a producer stuck on put."""
+        self._eof = True
+        while True:
+            try:
+                self._chunks.get_nowait()
+            except queue.Empty:
+                return
+
+
+def _payload_member_wanted(rel_path: str) -> bool:
+    """Only the parts of the repository the installer reads are extracted."""
+    wanted = (ENGINE_DIR, AGENT_DIR, ADAPTER_BUNDLES_DIR, "installers/adapters.json")
+    return any(rel_path == w or rel_path.startswith(w + "/") for w in wanted)
+
+
+def _strip_archive_root(name: str) -> str:
+    # GitHub archives wrap everything in a single root dir like magic-spec-1.1.0/
+    name = name.replace("\\", "/")
+    if name.startswith("./"):
+        name = name[2:]
+    parts = name.split("/", 1)
+    return parts[1] if len(parts) == 2 else ""
+
+
+def _write_payload_member(
+    extract_dir: pathlib.Path, name: str, mode: int, data: bytes
+) -> str:
+    target = extract_dir / name
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_bytes(data)
+    if mode & 0o111:
+        os.chmod(target, 0o755)
+    return _sha256_bytes(data)
+
+
+async def _run_payload_pipeline(
+    open_source,
+    extract_dir: pathlib.Path,
+    on_member=None,
+) -> tuple[str, dict[str, str]]:
+    """
+    Streams a .tar.gz payload through three overlapping stages linked by
+    bounded queues:
+
+      network reader (thread) -> gunzip + tar parser (thread) -> writers (asyncio)
+
+    Writers store each wanted member under `extract_dir` and hash it while
+    later bytes are still being downloaded. `on_member(rel_path, data)` is
+    called for every extracted member, e.g. to render adapters early.
+    Returns (sha256 of the raw archive, {path relative to the archive root: sha256}).
+    """
+    loop = asyncio.get_running_loop()
+    chunks: queue.Queue = queue.Queue(maxsize=_PIPELINE_QUEUE_SIZE)
+    members: asyncio.Queue = asyncio.Queue(maxsize=_PIPELINE_QUEUE_SIZE)
+    resolved_base = extract_dir.resolve()
+    digests: dict[str, str] = {}
+
+    archive_hash = hashlib.sha256()
+    # Set when extraction failed: the rest of the body is not downloaded.
+    abandoned = threading.Event()
+
+    def read_network() -> None:
+        try:
+            with open_source() as source:
+                while not abandoned.is_set():
+                    chunk = source.read(_NETWORK_CHUNK)
+                    if not chunk:
+                        break
+                    archive_hash.update(chunk)
+                    _TRACE.count("bytes_read", len(chunk))
+                    chunks.put(chunk)
+        except BaseException as e:
+            chunks.put(e)
+        finally:
+            chunks.put(None)
+
+    def decompress() -> None:
+        stream = _ChunkStream(chunks)
+        extracted_all = False
+        try:
+            with tarfile.open(fileobj=stream, mode="r|gz") as tar:
+                for member in tar:
+                    member_path = (resolved_base / member.name).resolve()
+                    if not _is_within_directory(resolved_base, member_path):
+                        raise RuntimeError(
+                            f"Unsafe tar entry detected outside target directory: {member.name}"
+                        )
+                    if not member.isfile():
+                        continue
+                    if not _payload_member_wanted(_strip_archive_root(member.name)):
+                        continue
+                    extracted = tar.extractfile(member)
+                    data = extracted.read() if extracted else b""
+                    asyncio.run_coroutine_threadsafe(
+                        members.put((member.name, member.mode, data)), loop
+                    ).result()
+            extracted_all = True
+        finally:
+            if extracted_all:
+                stream.drain()  # The archive hash covers the trailing bytes too.
+            else:
+                abandoned.set()
+                stream.discard()
+            asyncio.run_coroutine_threadsafe(members.put(None), loop).result()
+
+    def write_member(name: str, mode: int, data: bytes) -> str:
+        return _write_payload_member(extract_dir, name, mode, data)
+
+    errors: list[BaseException] = []
+
+    async def writer() -> None:
+        while True:
+            item = await members.get()
+            if item is None:
+                members.put_nowait(None)  # Let the other writers stop too.
+                return
+            if errors:
+                continue  # Keep draining so the extractor thread never blocks.
+            name, mode, data = item
+            try:
+                digest = await loop.run_in_executor(
+                    None, write_member, name, mode, data
+                )
+                rel_path = _strip_archive_root(name)
+                digests[rel_path] = digest
+                if on_member is not None:
+                    on_member(rel_path, data)
+            except Exception as e:
+                errors.append(e)
+
+    network = loop.run_in_executor(None, read_network)
+    extractor = loop.run_in_executor(None, decompress)
+    writers = [asyncio.ensure_future(writer()) for _ in range(_PIPELINE_WORKERS)]
+    try:
+        await extractor
+        await asyncio.gather(*writers)
+    finally:
+        for task in writers:
+            task.cancel()
+        await network
+    if errors:
+        raise errors[0]
+    return archive_hash.hexdigest(), digests
+
+
+def _open_url(url: str, headers: dict | None = None):
+    req = urllib.request.Request(
+        url, headers={"User-Agent": PYTHON_USER_AGENT, **(headers or {})}
+    )
+    return urllib.request.urlopen(req, timeout=DOWNLOAD_TIMEOUT_SECONDS)
+
+
+def _payload_part_path(url: str) -> pathlib.Path:
+    """Where an in-progress download of `url` is kept between runs."""
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+    return _user_cache_dir() / "payloads" / f"{key}.part"
+
+
+def _discard_partial(part_path: pathlib.Path) -> None:
+    for path in (part_path, part_path.with_name(part_path.name + ".json")):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _is_transient(error: BaseException) -> bool:
+    """
+    Network failures worth retrying: dropped connections, timeouts, 5xx/429.
+    Local OSErrors (disk full, permissions, read-only cache) are not.
+    """
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(
+        error,
+        (
+            urllib.error.URLError,
+            ConnectionError,
+            TimeoutError,
+            socket.timeout,
+            http.client.HTTPException,
+        ),
+    )
+
+
+def _backoff_delay(attempt: int) -> float:
+    # Exponential backoff with full jitter, capped at 30 seconds.
+    return random.uniform(0, min(30.0, DOWNLOAD_BACKOFF_SECONDS * (2**attempt)))
+
+
+def _with_retries(action, what: str):
+    """Runs `action()`, retrying transient network errors DOWNLOAD_RETRIES times."""
+    attempt = 0
+    while True:
+        try:
+            return action()
+        except Exception as e:
+            if not _is_transient(e) or attempt >= DOWNLOAD_RETRIES:
+                raise
+            delay = _backoff_delay(attempt)
+            attempt += 1
+            print(
+                f"   {what} failed ({e}); retry {attempt}/{DOWNLOAD_RETRIES} in {delay:.1f}s"
+            )
+            time.sleep(delay)
+
+
+def _read_part_meta(part_path: pathlib.Path) -> dict:
+    try:
+        meta = json.loads(
+            part_path.with_name(part_path.name + ".json").read_text(encoding="utf-8")
+        )
+    except (OSError, ValueError):
+        return {}
+    return meta if isinstance(meta, dict) else {}
+
+
+def _write_part_meta(part_path: pathlib.Path, meta: dict) -> None:
+    part_path.with_name(part_path.name + ".json").write_text(
+        json.dumps(meta), encoding="utf-8"
+    )
+
+
+def _content_total(response, start: int) -> int | None:
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get("Content-Length")
+    return start + int(length) if length and length.isdigit() else None
+
+
+class _ResumableDownload(io.RawIOBase):
+    """
+    Streams `url` while appending every byte to `part_path`. A dropped
+    connection is resumed with a Range request after an exponential backoff,
+    and a part file left by an earlier run is replayed from disk first so
+    only the missing tail is fetched. `If-Range` carries the stored ETag (or
+    Last-Modified), so a server whose archive changed in the meantime sends
+    the full body again; without either, a resumed range is only accepted
+    when its Content-Range matches the stored size and total. A part file
+    that is already complete is replayed without a request.
+    """
+
+    def __init__(self, url: str, part_path: pathlib.Path) -> None:
+        super().__init__()
+        self.url = url
+        self.part_path = part_path
+        self.total: int | None = None
+        self.resumed_from = 0
+        self._failures = 0
+        self._response = None
+        self._replay = None
+        part_path.parent.mkdir(parents=True, exist_ok=True)
+
+        meta = _read_part_meta(part_path)
+        resumable = (
+            part_path.exists()
+            and meta.get("url") == url
+            and bool(meta.get("etag") or meta.get("lastModified") or meta.get("total"))
+        )
+        self.etag: str | None = meta.get("etag") if resumable else None
+        self.last_modified: str | None = meta.get("lastModified") if resumable else None
+        self.expected_total: int | None = meta.get("total") if resumable else None
+        self.stored = part_path.stat().st_size if resumable else 0
+        self._sink = open(part_path, "ab" if resumable else "wb")
+        if self.expected_total is not None and self.stored >= self.expected_total:
+            if self.stored == self.expected_total:
+                self._replay_complete()
+                return
+            self._restart()
+        self._connect_with_retries(initial=True)
+
+    def readable(self) -> bool:
+        return True
+
+    def _restart(self) -> None:
+        self._sink.seek(0)
+        self._sink.truncate()
+        self.stored = 0
+        self.etag = self.last_modified = self.expected_total = None
+
+    def _replay_complete(self) -> None:
+        # e.g. an earlier run was interrupted while extracting.
+        self.resumed_from = self.total = self.stored
+        print(f"Using cached download ({_format_bytes(self.stored)})...")
+        self._replay = open(self.part_path, "rb")
+
+    def _range_matches(self, response) -> bool:
+        match = re.match(
+            r"bytes (\d+)-\d+/(\d+|\*)", response.headers.get("Content-Range", "")
+        )
+        return bool(
+            match
+            and int(match.group(1)) == self.stored
+            and (
+                self.expected_total is None
+                or match.group(2) == str(self.expected_total)
+            )
+        )
+
+    def _connect(self, initial: bool) -> None:
+        headers = {}
+        if self.stored:
+            headers["Range"] = f"bytes={self.stored}-"
+            validator = self.etag or self.last_modified
+            if validator:
+                headers["If-Range"] = validator
+        try:
+            response = _open_url(self.url, headers)
+        except urllib.error.HTTPError as e:
+            if e.code != 416 or not self.stored:
+                raise
+            total = _content_total(e, 0)  # `bytes */<size>`
+            e.close()
+            if initial and total == self.stored:
+                self._replay_complete()
+                return
+            if not initial:
+                raise _PayloadDownloadError(
+                    "payload changed on the server while it was being downloaded"
+                ) from e
+            self._restart()
+            self._connect(initial)
+            return
+        if self.stored and (
+            response.status != 206 or not self._range_matches(response)
+        ):
+            if not initial:
+                response.close()
+                raise _PayloadDownloadError(
+                    "payload changed on the server while it was being downloaded"
+                )
+            if response.status == 206:
+                # Ranges cannot be validated; fetch the whole body instead.
+                response.close()
+                self._restart()
+                self._connect(initial)
+                return
+            # The cached prefix is stale; start over from the first byte.
+            self._restart()
+        if initial and self.stored:
+            self.resumed_from = self.stored
+            print(f"Resuming download at {_format_bytes(self.stored)}...")
+            self._replay = open(self.part_path, "rb")
+        self._response = response
+        self.total = _content_total(response, self.stored)
+        if initial:
+            self.etag = response.headers.get("ETag")
+            self.last_modified = response.headers.get("Last-Modified")
+            self.expected_total = self.total
+            meta = {
+                "url": self.url,
+                "etag": self.etag,
+                "lastModified": self.last_modified,
+                "total": self.total,
+            }
+            if self.etag or self.last_modified or self.total is not None:
+                _write_part_meta(self.part_path, meta)
+
+    def _connect_with_retries(self, initial: bool) -> None:
+        while True:
+            try:
+                self._connect(initial)
+                return
+            except Exception as e:
+                self._backoff(e)
+
+    def _backoff(self, error: Exception) -> None:
+        if not _is_transient(error) or self._failures >= DOWNLOAD_RETRIES:
+            raise error
+        delay = _backoff_delay(self._failures)
+        self._failures += 1
+        print(
+            f"   Download interrupted at {_format_bytes(self.stored)} ({error}); "
+            f"retry {self._failures}/{DOWNLOAD_RETRIES} in {delay:.1f}s"
+        )
+        time.sleep(delay)
+
+    def readinto(self, b) -> int:
+        if self._replay is not None:
+            n = self._replay.readinto(b)
+            if n:
+                return n
+            self._replay.close()
+            self._replay = None
+        if self._response is None:
+            return 0
+        while True:
+            try:
+                data = self._response.read(len(b))
+                if not data and self.total is not None and self.stored < self.total:
+                    raise http.client.IncompleteRead(b"", self.total - self.stored)
+                break
+            except Exception as e:
+                self._response.close()
+                self._backoff(e)
+                self._connect_with_retries(initial=False)
+        self._sink.write(data)
+        self.stored += len(data)
+        self._failures = 0
+        n = len(data)
+        b[:n] = data
+        return n
+
+    def close(self) -> None:
+        for handle in (self._response, self._replay, getattr(self, "_sink", None)):
+            if handle is not None:
+                handle.close()
+        super().close()
+
+
+def _download_chunked(url: str, part_path: pathlib.Path, chunks: int) -> bool:
+    """
+    Fetches `url` into `part_path` as `chunks` concurrent ranged requests,
+    each retried and resumed on its own. Finished chunks are recorded next
+    to the part file so an interrupted run only refetches the rest. Returns
+    False when the server does not support ranges (or the file is small).
+    """
+    size, etag = _probe_range(url)
+    if size is None or size < _CHUNKED_MIN_BYTES:
+        return False
+
+    part_path.parent.mkdir(parents=True, exist_ok=True)
+    meta = _read_part_meta(part_path)
+    fresh = {"url": url, "etag": etag, "size": size}
+    if not etag or not part_path.exists() or {k: meta.get(k) for k in fresh} != fresh:
+        meta = dict(fresh, done=[])
+        with open(part_path, "wb") as f:
+            f.truncate(size)
+        _write_part_meta(part_path, meta)
+
+    step = -(-size // chunks)
+    pending = [
+        (start, min(size, start + step) - 1)
+        for start in range(0, size, step)
+        if start not in meta["done"]
+    ]
+    lock = threading.Lock()
+
+    def fetch(start: int, end: int) -> None:
+        pos = start
+
+        def attempt() -> None:
+            nonlocal pos
+            headers = {"Range": f"bytes={pos}-{end}"}
+            if etag:
+                headers["If-Range"] = etag
+            with _open_url(url, headers) as response:
+                if response.status != 206:
+                    raise _PayloadDownloadError(
+                        "server stopped honouring Range requests"
+                    )
+                with open(part_path, "r+b") as out:
+                    out.seek(pos)
+                    for block in iter(lambda: response.read(_NETWORK_CHUNK), b""):
+                        out.write(block)
+                        pos += len(block)
+            if pos <= end:
+                raise http.client.IncompleteRead(b"", end + 1 - pos)
+
+        _with_retries(attempt, f"Chunk {start}-{end}")
+        with lock:
+            meta["done"].append(start)
+            _write_part_meta(part_path, meta)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=chunks) as pool:
+        for future in [pool.submit(fetch, *r) for r in pending]:
+            future.result()
+    return True
+
+
+def _download_to_part(url: str, part_path: pathlib.Path, chunks: int) -> None:
+    """Completes the download of `url` into `part_path` (resuming if possible)."""
+    if chunks > 1 and _download_chunked(url, part_path, chunks):
+        return
+    with _ResumableDownload(url, part_path) as download:
+        while download.read(_COPY_CHUNK):
+            pass
+
+
+_RANGE_BLOCK = 256 * 1024
+
+
+_CHUNKED_MIN_BYTES = 4 * 1024 * 1024
+
+
+class _HttpRangeReader(io.RawIOBase):
+    """
+    Seekable read-only view of a remote file backed by HTTP Range requests,
+    so zipfile can read the central directory and only the wanted entries.
+    Reads are rounded up to _RANGE_BLOCK to keep the request count low.
+    """
+
+    def __init__(self, url: str, size: int) -> None:
+        super().__init__()
+        self.url = url
+        self.size = size
+        self.bytes_fetched = 0
+        self._pos = 0
+        self._block_start = 0
+        self._block = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def _fetch(self, start: int, length: int) -> bytes:
+        end = min(self.size, start + max(length, _RANGE_BLOCK)) - 1
+
+        def attempt() -> bytes:
+            with _open_url(self.url, {"Range": f"bytes={start}-{end}"}) as response:
+                if response.status != 206:
+                    raise _PayloadDownloadError("server ignored the Range header")
+                data = response.read()
+            if len(data) != end + 1 - start:
+                raise http.client.IncompleteRead(data, end + 1 - start - len(data))
+            return data
+
+        data = _with_retries(attempt, f"Range {start}-{end}")
+        self.bytes_fetched += len(data)
+        return data
+
+    def readinto(self, b) -> int:
+        if self._pos >= self.size:
+            return 0
+        wanted = min(len(b), self.size - self._pos)
+        offset = self._pos - self._block_start
+        if offset < 0 or offset + wanted > len(self._block):
+            self._block_start = self._pos
+            self._block = self._fetch(self._pos, wanted)
+            offset = 0
+        chunk = self._block[offset : offset + wanted]
+        b[: len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+
+def _probe_range(url: str) -> tuple[int | None, str | None]:
+    """
+    Returns (size, ETag) of the remote file; size is None when the server
+    does not honour Range requests.
+    """
+
+    def attempt() -> tuple[int | None, str | None]:
+        with _open_url(url, {"Range": "bytes=0-0"}) as response:
+            if response.status != 206:
+                return None, None
+            return _content_total(response, 0), response.headers.get("ETag")
+
+    try:
+        return _with_retries(attempt, "Range probe")
+    except urllib.error.HTTPError:
+        raise
+    except Exception:
+        return None, None
+
+
+def _extract_zip_payload(
+    fileobj, extract_dir: pathlib.Path, on_member=None
+) -> dict[str, str]:
+    """
+    Extracts only the installer's members from a zip archive, using the
+    central directory to skip everything else without decompressing it.
+    """
+    resolved_base = extract_dir.resolve()
+    digests: dict[str, str] = {}
+    with zipfile.ZipFile(fileobj) as zf:
+        for info in zf.infolist():
+            member_path = (resolved_base / info.filename).resolve()
+            if not _is_within_directory(resolved_base, member_path):
+                raise RuntimeError(
+                    f"Unsafe zip entry detected outside target directory: {info.filename}"
+                )
+            if info.is_dir():
+                continue
+            rel_path = _strip_archive_root(info.filename)
+            if not _payload_member_wanted(rel_path):
+                continue
+            data = zf.read(info)
+            mode = (info.external_attr >> 16) & 0o777
+            digests[rel_path] = _write_payload_member(
+                extract_dir, info.filename, mode, data
+            )
+            if on_member is not None:
+                on_member(rel_path, data)
+    return digests
+
+
+def _fetch_payload(
+    source: str,
+    payload_format: str,
+    extract_dir: pathlib.Path,
+    on_member=None,
+    need_archive_digest: bool = False,
+    chunks: int | None = None,
+) -> tuple[str | None, dict[str, str]]:
+    """
+    Extracts a payload from a URL or a local archive. Returns the archive
+    sha256 (None when a remote zip was read with Range requests, which never
+    sees the whole archive) and the member digests.
+
+    Remote archives are downloaded into a part file in the user cache, so an
+    interrupted install resumes where it stopped; `chunks` > 1 fetches large
+    archives as concurrent ranged requests before extracting.
+    """
+    chunks = DOWNLOAD_CHUNKS if chunks is None else chunks
+    is_local = not source.startswith(("http://", "https://"))
+    if is_local:
+        if zipfile.is_zipfile(source):
+            with open(source, "rb") as f:
+                archive_sha256 = hashlib.sha256()
+                for block in iter(lambda: f.read(_COPY_CHUNK), b""):
+                    archive_sha256.update(block)
+                f.seek(0)
+                digests = _extract_zip_payload(f, extract_dir, on_member)
+                return archive_sha256.hexdigest(), digests
+        return asyncio.run(
+            _run_payload_pipeline(lambda: open(source, "rb"), extract_dir, on_member)
+        )
+
+    part_path = _payload_part_path(source)
+    if payload_format != "zip":
+        if chunks > 1:
+            try:
+                chunked = _download_chunked(source, part_path, chunks)
+            except Exception as e:
+                raise _PayloadDownloadError(str(e)) from e
+        else:
+            chunked = False
+        if chunked:
+            open_source = lambda: open(part_path, "rb")  # noqa: E731
+        else:
+            open_source = lambda: _ResumableDownload(source, part_path)  # noqa: E731
+        cached = part_path.exists()
+        try:
+            result = asyncio.run(
+                _run_payload_pipeline(open_source, extract_dir, on_member)
+            )
+        except _PayloadDownloadError:
+            raise
+        except Exception:
+            # A corrupt part file must not break every later install.
+            _discard_partial(part_path)
+            if not cached:
+                raise
+            print("Cached download is corrupt; downloading it again...")
+            result = asyncio.run(
+                _run_payload_pipeline(
+                    lambda: _ResumableDownload(source, part_path),
+                    extract_dir,
+                    on_member,
+                )
+            )
+        _discard_partial(part_path)
+        return result
+
+    try:
+        size = None if need_archive_digest else _probe_range(source)[0]
+        if size:
+            reader = _HttpRangeReader(source, size)
+            digests = _extract_zip_payload(reader, extract_dir, on_member)
+            _TRACE.count("bytes_read", reader.bytes_fetched)
+            print(
+                f"Read {_format_bytes(reader.bytes_fetched)} of "
+                f"{_format_bytes(size)} zip archive via range requests."
+            )
+            return None, digests
+        _download_to_part(source, part_path, chunks)
+    except (urllib.error.URLError, OSError, http.client.HTTPException) as e:
+        raise _PayloadDownloadError(str(e)) from e
+    try:
+        with open(part_path, "rb") as f:
+            archive_sha256 = hashlib.sha256()
+            for block in iter(lambda: f.read(_COPY_CHUNK), b""):
+                archive_sha256.update(block)
+                _TRACE.count("bytes_read", len(block))
+            f.seek(0)
+            digests = _extract_zip_payload(f, extract_dir, on_member)
+    finally:
+        # A bad archive is fetched again next time rather than replayed.
+        _discard_partial(part_path)
+    return archive_sha256.hexdigest(), digests
+
+
+class PayloadIntegrityError(RuntimeError):
+    """The downloaded payload does not match its published digests."""
+
+
+def _verify_payload(
+    source_root: pathlib.Path, version: str, digests: dict[str, str]
+) -> int:
+    """
+    Checks the in-flight member digests against the payload section of the
+    release manifest. Only a manifest built for this exact version is
+    trusted (a branch checkout carries the previous release's manifest).
+    Returns the number of verified files.
+    """
+    manifest = _load_bundle_manifest(source_root)
+    if manifest is None or manifest.get("version") != version:
+        return 0
+    payload = manifest.get("payload")
+    if not isinstance(payload, dict):
+        return 0
+    for rel_path, expected in payload.items():
+        actual = digests.get(rel_path)
+        if actual is None:
+            raise PayloadIntegrityError(f"{rel_path} is missing from the payload")
+        if actual != expected:
+            raise PayloadIntegrityError(
+                f"{rel_path} does not match the release manifest"
+            )
+    return len(payload)
+
+
+def download_and_extract(
+    version: str,
+    target_dir: pathlib.Path,
+    on_member=None,
+    digests: dict[str, str] | None = None,
+    expected_sha256: str | None = None,
+    payload_format: str | None = None,
+    local_payload: pathlib.Path | None = None,
+    chunks: int | None = None,
+) -> pathlib.Path:
+    """
+    Downloads the GitHub release tarball for the version and extracts the
+    engine, workflows and adapter registry to a temporary directory while it
+    streams in (see _run_payload_pipeline). Returns the extracted project root.
+
+    The archive and every member are hashed during the copy: the archive is
+    checked against `expected_sha256` when given, members against the release
+    manifest, and the member digests are stored in `digests` for reuse.
+
+    `payload_format` selects the GitHub tarball ("tar.gz") or zipball ("zip");
+    `local_payload` installs from an archive on disk instead of downloading.
+    """
+    payload_format = payload_format or DEFAULT_PAYLOAD_FORMAT
+    if local_payload is not None:
+        source = str(local_payload)
+        print(f"Using local magic-spec payload: {local_payload}")
+    else:
+        source = get_download_url(version, payload_format)
+        version_label = "main branch" if version == "main" else f"v{version}"
+        print(
+            f"Downloading magic-spec payload ({version_label}, {payload_format}) from GitHub..."
+        )
+
+    extract_dir = (
+        target_dir / f"{INSTALLER_CONFIG['download']['tempPrefix']}extraction-{version}"
+    )
+    extract_dir.mkdir(parents=True, exist_ok=True)
+
+    try:
+        archive_sha256, member_digests = _fetch_payload(
+            source,
+            payload_format,
+            extract_dir,
+            on_member,
+            need_archive_digest=bool(expected_sha256),
+            chunks=chunks,
+        )
+    except _PayloadDownloadError as e:
+        cause = e.__cause__
+        if isinstance(cause, urllib.error.HTTPError):
+            if cause.code == 404:
+                _print_error(f"Error: Release {version} not found on GitHub.")
+                print("   (Use --fallback-main to pull from the main branch instead)")
+            else:
+                _print_error(f"HTTP error downloading payload: {cause}")
+        else:
+            _print_error(f"Error downloading payload: {e}")
+        sys.exit(1)
+    except Exception as e:
+        _print_error(f"Error extracting payload: {e}")
+        sys.exit(1)
+
+    if expected_sha256 and archive_sha256 != expected_sha256.strip().lower():
+        if local_payload is None:
+            _discard_partial(_payload_part_path(source))
+        _print_error("Error: Payload integrity check failed (archive sha256 mismatch).")
+        print(f"   expected {expected_sha256.strip().lower()}")
+        print(f"   got      {archive_sha256}")
+        sys.exit(1)
+
+    # Find the extracted root (github tarballs usually have a single root dir like magic-spec-1.1.0)
+    extracted_items = list(extract_dir.iterdir())
+    if len(extracted_items) == 1 and extracted_items[0].is_dir():
+        source_root = extracted_items[0]
+    else:
+        source_root = extract_dir
+
+    try:
+        verified = _verify_payload(source_root, version, member_digests)
+    except PayloadIntegrityError as e:
+        _print_error(f"Error: Payload integrity check failed: {e}")
+        sys.exit(1)
+    if verified:
+        print(f"Verified {verified} payload file(s) against the release manifest.")
+    if archive_sha256:
+        print(f"Payload sha256: {archive_sha256}")
+
+    _TRACE.count("files_extracted", len(member_digests))
+    if digests is not None:
+        digests.update(member_digests)
+    return source_root
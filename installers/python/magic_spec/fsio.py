@@ -0,0 +1,542 @@
+"""Bulk file writes, locks, atomic replacement and staged installs."""
+
+from __future__ import annotations
+
+import os
+import contextlib
+import pathlib
+import shutil
+import stat
+import sys
+import tempfile
+import time
+
+from .core import (
+    _TRACE,
+    _format_bytes,
+    _is_within_directory,
+    _print_warning,
+    _project_key,
+    _user_cache_dir,
+)
+
+_FICLONE = 0x40049409  # Linux ioctl: share extents between two files (reflink)
+
+
+_COPY_CHUNK = 1 << 20
+
+
+class BulkWriter:
+    """
+    Writes many files into a project tree with as few syscalls as possible.
+
+    - Each destination directory is created once per run (cached).
+    - File contents are copied in the kernel: reflink (FICLONE) where the
+      filesystem supports it, then os.copy_file_range, then os.sendfile,
+      with a plain buffered copy as the last resort.
+    - Only the permission bits are carried over; timestamps, xattrs and
+      flags are not copied (unlike shutil.copy2).
+    - A destination whose content already matches is left untouched.
+    - Existing destinations are unlinked before writing, so a file that is
+      hardlinked elsewhere (backups, staging clones) is never modified in place.
+    - link_file() places relative symlinks, and falls back to writing the
+      content once the platform refuses them (e.g. Windows without
+      Developer Mode).
+    """
+
+    _use_reflink = sys.platform.startswith("linux")
+    _use_symlink = hasattr(os, "symlink")
+    _use_copy_file_range = hasattr(os, "copy_file_range")
+    _use_sendfile = hasattr(os, "sendfile") and sys.platform.startswith("linux")
+
+    def __init__(self) -> None:
+        self._dirs: set[str] = set()
+        self.files_written = 0
+        self.files_skipped = 0
+        self.bytes_copied = 0
+        self.bytes_skipped = 0
+        self.written: list[pathlib.Path] = []
+        self._written_keys: set[str] = set()
+
+    def ensure_dir(self, directory: pathlib.Path) -> None:
+        key = str(directory)
+        if key in self._dirs:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        # Parents exist too now; remember them so siblings skip the mkdir.
+        current = directory
+        while str(current) not in self._dirs and current != current.parent:
+            self._dirs.add(str(current))
+            current = current.parent
+
+    @staticmethod
+    def _same_content(dst: pathlib.Path, size: int, read_src) -> bool:
+        try:
+            st = os.lstat(dst)
+            if stat.S_ISLNK(st.st_mode) or st.st_size != size:
+                return False
+            with open(dst, "rb") as f:
+                return f.read() == read_src()
+        except OSError:
+            return False
+
+    @staticmethod
+    def _open_for_write(dst: pathlib.Path, mode: int) -> int:
+        try:
+            os.unlink(dst)
+        except FileNotFoundError:
+            pass
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+        return os.open(dst, flags, mode)
+
+    def _record(self, dst: pathlib.Path, size: int) -> None:
+        self.files_written += 1
+        self.bytes_copied += size
+        _TRACE.count("files_written")
+        _TRACE.count("bytes_written", size)
+        if str(dst) not in self._written_keys:
+            self._written_keys.add(str(dst))
+            self.written.append(dst)
+
+    def _skip(self, size: int) -> None:
+        self.files_skipped += 1
+        self.bytes_skipped += size
+        _TRACE.count("files_skipped")
+
+    def _kernel_copy(self, src_fd: int, dst_fd: int, size: int) -> None:
+        if BulkWriter._use_reflink and size:
+            try:
+                import fcntl
+
+                fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+                return
+            except (ImportError, OSError):
+                BulkWriter._use_reflink = False
+
+        copied = 0
+        if BulkWriter._use_copy_file_range:
+            try:
+                while copied < size:
+                    sent = os.copy_file_range(src_fd, dst_fd, size - copied)
+                    if sent == 0:
+                        break
+                    copied += sent
+                if copied >= size:
+                    return
+            except OSError:
+                BulkWriter._use_copy_file_range = False
+
+        if BulkWriter._use_sendfile:
+            try:
+                while copied < size:
+                    sent = os.sendfile(dst_fd, src_fd, copied, size - copied)
+                    if sent == 0:
+                        break
+                    copied += sent
+                if copied >= size:
+                    return
+            except OSError:
+                BulkWriter._use_sendfile = False
+
+        os.lseek(src_fd, copied, os.SEEK_SET)
+        os.lseek(dst_fd, copied, os.SEEK_SET)
+        while True:
+            chunk = os.read(src_fd, _COPY_CHUNK)
+            if not chunk:
+                break
+            os.write(dst_fd, chunk)
+
+    def copy_file(self, src: pathlib.Path, dst: pathlib.Path) -> bool:
+        """Copies `src` to `dst`. Returns False when `dst` was already identical."""
+        src_stat = os.stat(src)
+        size = src_stat.st_size
+        if self._same_content(dst, size, src.read_bytes):
+            self._skip(size)
+            return False
+
+        self.ensure_dir(dst.parent)
+        src_fd = os.open(src, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            dst_fd = self._open_for_write(dst, src_stat.st_mode & 0o777)
+            try:
+                self._kernel_copy(src_fd, dst_fd, size)
+            finally:
+                os.close(dst_fd)
+        finally:
+            os.close(src_fd)
+        self._record(dst, size)
+        return True
+
+    def write_bytes(self, dst: pathlib.Path, data: bytes) -> bool:
+        """Writes `data` to `dst`. Returns False when `dst` was already identical."""
+        if self._same_content(dst, len(data), lambda: data):
+            self._skip(len(data))
+            return False
+
+        self.ensure_dir(dst.parent)
+        dst_fd = self._open_for_write(dst, 0o644)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(dst_fd, view) :]
+        finally:
+            os.close(dst_fd)
+        self._record(dst, len(data))
+        return True
+
+    def link_file(self, dst: pathlib.Path, link: str, data: bytes) -> bool:
+        """
+        Makes `dst` a symlink to `link` (relative to `dst`'s directory), or
+        writes `data` to it where symlinks are unavailable. Returns False when
+        `dst` was already that link.
+        """
+        if not BulkWriter._use_symlink:
+            return self.write_bytes(dst, data)
+        try:
+            if os.readlink(dst) == link:
+                self._skip(len(data))
+                return False
+        except OSError:
+            pass
+
+        self.ensure_dir(dst.parent)
+        try:
+            os.unlink(dst)
+        except FileNotFoundError:
+            pass
+        try:
+            os.symlink(link, dst)
+        except (OSError, NotImplementedError):
+            BulkWriter._use_symlink = False
+            return self.write_bytes(dst, data)
+        self._record(dst, 0)
+        return True
+
+    def copy_tree(self, src: pathlib.Path, dst: pathlib.Path) -> None:
+        """Copies a directory tree file by file (see copy_file)."""
+        if not src.exists():
+            _print_warning(f"Warning: source not found: {src}")
+            return
+        with os.scandir(src) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    self.copy_tree(src / entry.name, dst / entry.name)
+                else:
+                    self.copy_file(src / entry.name, dst / entry.name)
+
+    def summary(self) -> str:
+        return (
+            f"{self.files_written} file(s) written ({_format_bytes(self.bytes_copied)}), "
+            f"{self.files_skipped} unchanged ({_format_bytes(self.bytes_skipped)} skipped)"
+        )
+
+
+_RENAME_EXCHANGE = 2  # renameat2(2) flag: swap two paths in one atomic step
+
+
+_AT_FDCWD = -100
+
+
+_PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+
+
+_ERROR_INVALID_PARAMETER = 87  # OpenProcess on a pid that does not exist
+
+
+_STILL_ACTIVE = 259
+
+
+def _windows_pid_alive(pid: int, kernel32=None) -> bool:
+    """
+    OpenProcess + GetExitCodeProcess: os.kill(pid, 0) would send
+    CTRL_C_EVENT on Windows. Anything inconclusive counts as alive.
+    """
+    import ctypes
+
+    if kernel32 is None:
+        kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(_PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        return kernel32.GetLastError() != _ERROR_INVALID_PARAMETER
+    try:
+        code = ctypes.c_ulong()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+            return True
+        return code.value == _STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        try:
+            return _windows_pid_alive(pid)
+        except (OSError, AttributeError):
+            return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+@contextlib.contextmanager
+def _file_lock(path: pathlib.Path, timeout: float = 10.0):
+    """
+    Exclusive advisory lock on `path` (created if missing) for the `with`
+    block: flock on POSIX, msvcrt.locking on Windows. Raises TimeoutError
+    when another process holds it for longer than `timeout` seconds.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if os.name == "nt":
+                    import msvcrt
+
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                else:
+                    import fcntl
+
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"timed out waiting for {path.name}")
+                time.sleep(0.005)
+        yield
+    finally:
+        os.close(fd)  # Closing the descriptor releases the lock.
+
+
+def _project_lock(dest: pathlib.Path, name: str, timeout: float = 30.0):
+    """
+    Lock `name` for one project. Lock files live in the user cache
+    (locks/<project key>/), which executor.js shares for its regenerations.
+    """
+    lock_dir = _user_cache_dir() / "locks" / _project_key(dest)
+    return _file_lock(lock_dir / f"{name}.lock", timeout)
+
+
+def _atomic_write(path: pathlib.Path, data: bytes | str) -> None:
+    """
+    Replaces `path` with one rename, so readers see either the old or the
+    new content, never a partial write. `str` data is written in text mode,
+    like Path.write_text(). Keeps the permission bits of an existing file.
+    """
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except OSError:
+        mode = 0o644
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with (
+            os.fdopen(fd, "w", encoding="utf-8")
+            if isinstance(data, str)
+            else os.fdopen(fd, "wb")
+        ) as f:
+            f.write(data)
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+def _fsync_path(path: pathlib.Path, directory: bool = False) -> None:
+    flags = os.O_RDONLY if directory else os.O_RDWR
+    try:
+        fd = os.open(path, flags | getattr(os, "O_BINARY", 0))
+    except OSError:
+        return  # Directories cannot be opened on Windows; nothing to sync.
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _clone_tree(
+    src: pathlib.Path, dst: pathlib.Path, skip: frozenset[str] = frozenset()
+) -> None:
+    """
+    Mirrors `src` into `dst` with hardlinks (copying where links are
+    unsupported). Paths in `skip` are left out.
+    """
+    dst.mkdir(parents=True, exist_ok=True)
+    with os.scandir(src) as entries:
+        for entry in entries:
+            target = dst / entry.name
+            if entry.path in skip:
+                continue
+            if entry.is_symlink():
+                os.symlink(os.readlink(entry.path), target)
+            elif entry.is_dir():
+                _clone_tree(pathlib.Path(entry.path), target, skip)
+            else:
+                try:
+                    os.link(entry.path, target)
+                except OSError:
+                    shutil.copy2(entry.path, target)
+
+
+def _swap_directories(staging: pathlib.Path, target: pathlib.Path) -> None:
+    """
+    Puts `staging` in place of `target`. On Linux the two paths are exchanged
+    with renameat2(RENAME_EXCHANGE) so readers always see a complete tree;
+    elsewhere the old tree is renamed aside first (a window of microseconds
+    where `target` is absent). The previous tree is deleted afterwards.
+    """
+    if not target.exists():
+        os.rename(staging, target)
+        return
+
+    if sys.platform.startswith("linux"):
+        try:
+            import ctypes
+
+            libc = ctypes.CDLL(None, use_errno=True)
+            renameat2 = libc.renameat2
+            renameat2.argtypes = [
+                ctypes.c_int,
+                ctypes.c_char_p,
+                ctypes.c_int,
+                ctypes.c_char_p,
+                ctypes.c_uint,
+            ]
+            if (
+                renameat2(
+                    _AT_FDCWD,
+                    os.fsencode(staging),
+                    _AT_FDCWD,
+                    os.fsencode(target),
+                    _RENAME_EXCHANGE,
+                )
+                == 0
+            ):
+                shutil.rmtree(staging, ignore_errors=True)
+                return
+        except (AttributeError, OSError):
+            pass
+
+    retired = target.with_name(f"{target.name}.old-{os.getpid()}")
+    os.rename(target, retired)
+    try:
+        os.rename(staging, target)
+    except OSError:
+        os.rename(retired, target)
+        raise
+    shutil.rmtree(retired, ignore_errors=True)
+
+
+class StagedInstall:
+    """
+    Collects every write of an install/update into staging directories that
+    sit next to their targets (`.magic.staging-<pid>`, ...). Each staging
+    tree starts as a hardlink clone of the current target, so files the
+    installer does not manage are preserved. Nothing in the project changes
+    until commit(): written files are fsynced as one batch and each tree is
+    swapped in with a single rename. Leaving the `with` block without
+    committing (error, Ctrl-C) deletes the staging trees.
+    """
+
+    def __init__(self, writer: BulkWriter) -> None:
+        self.writer = writer
+        self._trees: dict[pathlib.Path, pathlib.Path] = {}
+        self._committed = False
+
+    def __enter__(self) -> StagedInstall:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if not self._committed:
+            self.abort()
+
+    @staticmethod
+    def _cleanup_stale(target: pathlib.Path) -> None:
+        prefix = f"{target.name}.staging-"
+        if not target.parent.exists():
+            return
+        for sibling in target.parent.iterdir():
+            if not sibling.name.startswith(prefix):
+                continue
+            pid = sibling.name[len(prefix) :]
+            if pid.isdigit() and not _pid_alive(int(pid)):
+                shutil.rmtree(sibling, ignore_errors=True)
+
+    def path_for(self, target: pathlib.Path, clone: bool = True) -> pathlib.Path:
+        """
+        Returns the staging location that will replace `target` on commit.
+        With clone=False the staging tree starts empty instead of mirroring
+        the current target (used by rollback to restore an exact snapshot).
+        """
+        for staged_target, staging in self._trees.items():
+            if target == staged_target or _is_within_directory(staged_target, target):
+                return staging / target.relative_to(staged_target)
+
+        staging = target.with_name(f"{target.name}.staging-{os.getpid()}")
+        self._cleanup_stale(target)
+        if staging.exists():
+            shutil.rmtree(staging)
+        # Trees already staged below `target` move into the new staging tree
+        # as they are; cloning them (and their staging siblings) from the
+        # live target would bring back the old content.
+        nested = {
+            t: st for t, st in self._trees.items() if _is_within_directory(target, t)
+        }
+        if clone and target.is_dir():
+            skip = {str(p) for pair in nested.items() for p in pair}
+            _clone_tree(target, staging, frozenset(skip))
+        else:
+            staging.mkdir(parents=True)
+        for nested_target, nested_staging in nested.items():
+            moved = staging / nested_target.relative_to(target)
+            moved.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(nested_staging, moved)
+            del self._trees[nested_target]
+            self.writer.written = [
+                (
+                    moved / w.relative_to(nested_staging)
+                    if w == nested_staging or _is_within_directory(nested_staging, w)
+                    else w
+                )
+                for w in self.writer.written
+            ]
+        self.writer.ensure_dir(staging)
+        self._trees[target] = staging
+        return staging
+
+    def final_path(self, path: pathlib.Path) -> pathlib.Path:
+        """Maps a path inside a staging tree to where it lands after commit."""
+        for target, staging in self._trees.items():
+            if path == staging or _is_within_directory(staging, path):
+                return target / path.relative_to(staging)
+        return path
+
+    def commit(self, order: list[pathlib.Path] | None = None) -> None:
+        """fsyncs the staged files in one batch, then swaps each tree into place."""
+        for written in self.writer.written:
+            _fsync_path(written)
+        for staging in self._trees.values():
+            for root, _dirs, _files in os.walk(staging):
+                _fsync_path(pathlib.Path(root), directory=True)
+
+        targets = list(self._trees)
+        if order:
+            # Swap the listed targets last (e.g. the engine dir as the commit point).
+            targets.sort(key=lambda t: order.index(t) if t in order else -1)
+        for target in targets:
+            _swap_directories(self._trees[target], target)
+            _fsync_path(target.parent, directory=True)
+        self._committed = True
+
+    def abort(self) -> None:
+        for staging in self._trees.values():
+            shutil.rmtree(staging, ignore_errors=True)
+        self._trees.clear()
@@ -0,0 +1,102 @@
+"""Markdown heading and numbered-item offsets."""
+
+from __future__ import annotations
+
+import re
+
+_MD_HEADING = re.compile(rb"^(#{1,6})[ \t]+(.+?)[ \t#]*$")
+
+
+_MD_FENCE = re.compile(rb"^[ \t]{0,3}(```|~~~)")
+
+
+_MD_LIST_ITEM = re.compile(rb"^(\d+)[.)][ \t]+(.+)$")
+
+
+# Level given to numbered list items, below every heading level.
+LIST_ITEM_LEVEL = 7
+
+
+def _heading_anchor(title: str) -> str:
+    """GitHub-style anchor: lowercase, punctuation dropped, spaces to hyphens."""
+    return re.sub(r"[^\w\- ]", "", title.strip().lower()).replace(" ", "-")
+
+
+def _list_item_title(number: str, text: str) -> str:
+    """`N. <bold lead>` or `N. <first words>` of a numbered list item."""
+    lead = re.match(r"\*\*(.+?)\*\*", text)
+    words = lead.group(1) if lead else re.sub(r"[*_`]", "", text)
+    if len(words) > 60:
+        words = words[:60].rsplit(" ", 1)[0] + "…"
+    return f"{number}. {words.strip()}"
+
+
+def markdown_sections(data: bytes, list_items: bool = False) -> list[dict]:
+    """
+    Headings of a Markdown document with byte offsets. `start` is the heading
+    line, `body_end` the next heading of any level and `end` the next heading
+    at the same or a higher level (so it includes subsections). Headings in
+    fenced code blocks are ignored; repeated anchors get -1, -2 suffixes.
+
+    With `list_items`, unindented numbered list items (`57. ...`) are
+    sections too, at LIST_ITEM_LEVEL, anchored `<heading anchor>-<number>`.
+    An item ends at the next item, heading, or unindented paragraph.
+    """
+    sections: list[dict] = []
+    seen: dict[str, int] = {}
+    in_fence = False
+    offset = 0
+    parent = ""
+    open_item: dict | None = None
+    after_blank = False
+    for line in data.splitlines(keepends=True):
+        stripped = line.rstrip(b"\r\n")
+        if offset == 0 and stripped.startswith(b"\xef\xbb\xbf"):
+            stripped = stripped[3:]
+        section = None
+        if _MD_FENCE.match(stripped):
+            in_fence = not in_fence
+        elif not in_fence:
+            match = _MD_HEADING.match(stripped)
+            item = _MD_LIST_ITEM.match(stripped) if list_items else None
+            if match:
+                title = match.group(2).decode("utf-8", errors="replace").strip()
+                anchor = _heading_anchor(title)
+                section = {"title": title, "level": len(match.group(1))}
+            elif item:
+                number = item.group(1).decode("ascii")
+                text = item.group(2).decode("utf-8", errors="replace")
+                anchor = f"{parent}-{number}" if parent else number
+                section = {
+                    "title": _list_item_title(number, text),
+                    "level": LIST_ITEM_LEVEL,
+                }
+            elif open_item and after_blank and stripped and not stripped[:1].isspace():
+                open_item["end"] = offset
+                open_item = None
+        if section is not None:
+            if open_item:
+                open_item["end"] = offset
+            if anchor in seen:
+                seen[anchor] += 1
+                anchor = f"{anchor}-{seen[anchor]}"
+            else:
+                seen[anchor] = 0
+            section.update(anchor=anchor, start=offset)
+            sections.append(section)
+            if section["level"] < LIST_ITEM_LEVEL:
+                parent = anchor
+            open_item = section if section["level"] == LIST_ITEM_LEVEL else None
+        after_blank = not stripped.strip()
+        offset += len(line)
+    for i, section in enumerate(sections):
+        later = sections[i + 1 :]
+        if section["level"] == LIST_ITEM_LEVEL:
+            section.setdefault("end", later[0]["start"] if later else offset)
+            section["body_end"] = section["end"]
+            continue
+        section["body_end"] = later[0]["start"] if later else offset
+        section["end"] = next(
+            (s["start"] for s in later if s["level"] <= section["level"]), offset
+        )
+    return sections
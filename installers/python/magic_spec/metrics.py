@@ -0,0 +1,170 @@
+"""Per-project run log and `stats` summaries."""
+
+from __future__ import annotations
+
+import json
+import os
+import datetime
+import pathlib
+import time
+
+from .core import (
+    PACKAGE_NAME,
+    _REPORT,
+    _TRACE,
+    _project_key,
+    _user_cache_dir,
+)
+
+METRICS_SCHEMA_VERSION = 2
+
+
+# Paths kept per run record; `filesWrittenCount` has the full number.
+METRICS_FILES_CAP = 50
+
+
+def _metrics_path(dest: pathlib.Path) -> pathlib.Path:
+    """
+    Run log of one project: <cache>/metrics/<sha256(project path)[:16]>.jsonl.
+    executor.js derives the same key from its own location.
+    """
+    return _user_cache_dir() / "metrics" / f"{_project_key(dest)}.jsonl"
+
+
+def record_run(dest: pathlib.Path, record: dict) -> None:
+    """
+    Appends one run record as a single JSON line. Lines are written with one
+    append call so concurrent CLI and executor runs do not interleave.
+    MAGIC_SPEC_NO_METRICS=1 disables recording.
+    """
+    if os.environ.get("MAGIC_SPEC_NO_METRICS"):
+        return
+    path = _metrics_path(dest)
+    line = json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n"
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+    except OSError:
+        pass
+
+
+def cli_run_record(exit_code: int) -> dict:
+    """The run record of the current CLI command, from its trace and report."""
+    return {
+        "v": METRICS_SCHEMA_VERSION,
+        "ts": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "source": "cli",
+        "command": _REPORT.command,
+        "exitCode": exit_code,
+        "durationMs": round((time.perf_counter() - _TRACE._t0) * 1000, 3),
+        "phases": _TRACE.phases(),
+        "filesWritten": _REPORT.files_written[:METRICS_FILES_CAP],
+        "filesWrittenCount": len(_REPORT.files_written),
+    }
+
+
+def load_runs(dest: pathlib.Path) -> list[dict]:
+    """Reads the project's run log, skipping torn or foreign lines."""
+    try:
+        text = _metrics_path(dest).read_text(encoding="utf-8")
+    except OSError:
+        return []
+    runs = []
+    for line in text.splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict) and isinstance(
+            record.get("durationMs"), (int, float)
+        ):
+            runs.append(record)
+    return runs
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize_runs(runs: list[dict], window: int = 10) -> dict[str, dict]:
+    """
+    Per command: run count, failures, p50/p95 duration, p50 per phase and
+    the trend of the median of the last `window` runs against the runs
+    before them (None until there are enough runs to compare).
+    """
+    by_command: dict[str, list[dict]] = {}
+    for record in runs:
+        by_command.setdefault(str(record.get("command", "unknown")), []).append(record)
+
+    summary: dict[str, dict] = {}
+    for command, records in sorted(by_command.items()):
+        durations = [r["durationMs"] for r in records]
+        phases: dict[str, list[float]] = {}
+        for record in records:
+            for name, ms in (record.get("phases") or {}).items():
+                phases.setdefault(name, []).append(ms)
+        recent, earlier = durations[-window:], durations[:-window]
+        trend = None
+        if len(recent) >= 3 and len(earlier) >= 3:
+            before = _percentile(earlier, 50)
+            if before:
+                trend = round((_percentile(recent, 50) - before) / before * 100, 1)
+        summary[command] = {
+            "runs": len(records),
+            "failures": sum(1 for r in records if r.get("exitCode")),
+            "p50Ms": round(_percentile(durations, 50), 3),
+            "p95Ms": round(_percentile(durations, 95), 3),
+            "lastMs": round(durations[-1], 3),
+            "last": records[-1].get("ts"),
+            "trendPct": trend,
+            "phasesP50Ms": {
+                name: round(_percentile(values, 50), 3)
+                for name, values in sorted(
+                    phases.items(), key=lambda item: -_percentile(item[1], 50)
+                )
+            },
+        }
+    return summary
+
+
+def _format_ms(ms: float) -> str:
+    return f"{ms / 1000:.2f}s" if ms >= 1000 else f"{ms:.0f}ms"
+
+
+def run_stats(dest: pathlib.Path, command: str | None = None) -> int:
+    runs = load_runs(dest)
+    if command:
+        runs = [r for r in runs if r.get("command") == command]
+    summary = summarize_runs(runs)
+    _REPORT.result = {"project": str(dest.resolve()), "commands": summary}
+    if not summary:
+        print("No runs recorded for this project yet.")
+        print(f"   (log: {_metrics_path(dest)})")
+        return 0
+
+    print(f"{PACKAGE_NAME} run statistics ({len(runs)} runs)")
+    print("────────────────────────────────")
+    print(f"{'command':<28}{'runs':>6}{'p50':>10}{'p95':>10}  trend")
+    for name, item in summary.items():
+        trend = item["trendPct"]
+        if trend is None:
+            trend_text = "-"
+        elif abs(trend) < 5:
+            trend_text = f"→ {trend:+.0f}%"
+        else:
+            trend_text = f"{'↑' if trend > 0 else '↓'} {trend:+.0f}%"
+        print(
+            f"{name:<28}{item['runs']:>6}{_format_ms(item['p50Ms']):>10}"
+            f"{_format_ms(item['p95Ms']):>10}  {trend_text}"
+        )
+        slowest = list(item["phasesP50Ms"].items())[:3]
+        if slowest:
+            phases = ", ".join(f"{n} {_format_ms(ms)}" for n, ms in slowest)
+            print(f"{'':<4}slowest phases (p50): {phases}")
+    print("────────────────────────────────")
+    print(f"Log: {_metrics_path(dest)}")
+    return 0
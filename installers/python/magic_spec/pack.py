@@ -0,0 +1,293 @@
+"""Context pack (.design/PACK.md) for agent sessions."""
+
+from __future__ import annotations
+
+import json
+import datetime
+import pathlib
+import re
+
+from .core import (
+    DESIGN_DIR,
+    _REPORT,
+    _format_bytes,
+    _print_error,
+    _print_warning,
+    _sha256_bytes,
+)
+from .fsio import (
+    _atomic_write,
+    _project_lock,
+)
+from .markdown import (
+    _MD_FENCE,
+    markdown_sections,
+)
+from .tasks import (
+    parse_task_document,
+)
+from .registry import (
+    _REGISTRY_HEADER,
+    _REGISTRY_SEPARATOR,
+    _registry_shards,
+    load_registry,
+)
+from .search import (
+    get_section,
+)
+
+PACK_SCHEMA_VERSION = 1
+
+
+PACK_FILE = "PACK.md"
+
+
+DEFAULT_PACK_PINS = ("RULES.md",)
+
+
+_PACK_HEADER = re.compile(r"^<!-- magic-spec:pack (\{.*\}) -->$")
+
+
+_BUDGET = re.compile(r"^(\d+)(k?)(t|b)?$")
+
+
+_BYTES_PER_TOKEN = 4
+
+
+def _parse_budget(raw: str) -> int:
+    """`12000`, `12k` or `12kb` are bytes; `3000t` / `3kt` are tokens (~4 bytes)."""
+    match = _BUDGET.match(raw.strip().lower())
+    if not match:
+        raise ValueError(f"invalid budget: {raw}")
+    value = int(match.group(1)) * (1000 if match.group(2) else 1)
+    return value * _BYTES_PER_TOKEN if match.group(3) == "t" else value
+
+
+def _pack_inputs(dest: pathlib.Path) -> dict[str, str]:
+    """sha256 of every workspace file a pack can draw from."""
+    design = dest / DESIGN_DIR
+    paths = [design / name for name in ("RULES.md", "INDEX.md", "TASKS.md")]
+    paths += [design / "CONTEXT.md"] + _registry_shards(dest)
+    paths += sorted((design / "tasks").glob("*.md"))
+    paths += sorted((design / "specifications").rglob("*.md"))
+    return {
+        p.relative_to(dest).as_posix(): _sha256_bytes(p.read_bytes())
+        for p in paths
+        if p.is_file()
+    }
+
+
+def read_pack_header(path: pathlib.Path) -> dict | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            match = _PACK_HEADER.match(f.readline().strip())
+        return json.loads(match.group(1)) if match else None
+    except (OSError, ValueError):
+        return None
+
+
+def _demote_headings(text: str, levels: int) -> str:
+    out = []
+    in_fence = False
+    for line in text.splitlines():
+        if _MD_FENCE.match(line.encode("utf-8")):
+            in_fence = not in_fence
+        elif not in_fence and re.match(r"^#{1,6}\s", line):
+            hashes = len(line) - len(line.lstrip("#"))
+            line = "#" * min(hashes + levels, 6) + line[hashes:]
+        out.append(line)
+    return "\n".join(out)
+
+
+def _dedupe_sections(text: str, seen: set[str]) -> str:
+    """Drops sections whose whitespace-normalized body was already packed."""
+    data = text.encode("utf-8")
+    sections = markdown_sections(data)
+    if not sections:
+        return text
+    kept = [data[: sections[0]["start"]]]
+    for section in sections:
+        body = data[section["start"] : section["body_end"]]
+        key = _sha256_bytes(b" ".join(body.split()[1:]))
+        if len(body.split()) > 3 and key in seen:
+            continue
+        seen.add(key)
+        kept.append(body)
+    return b"".join(kept).decode("utf-8")
+
+
+def _active_tasks(dest: pathlib.Path) -> list[dict]:
+    design = dest / DESIGN_DIR
+    tasks: dict[str, dict] = {}
+    sources = sorted((design / "tasks").glob("*.md")) + [design / "TASKS.md"]
+    for path in sources:
+        if path.is_file():
+            for task in parse_task_document(path.read_text(encoding="utf-8"))["tasks"]:
+                tasks[task["id"]] = task
+    return [t for t in tasks.values() if t["status"] != "Done"]
+
+
+def build_context_pack(
+    dest: pathlib.Path,
+    budget: int | None = None,
+    pins: tuple[str, ...] | list[str] = DEFAULT_PACK_PINS,
+    previous: dict | None = None,
+) -> dict:
+    """
+    Assembles the pack in priority order (pinned sections, registry, active
+    tasks, specs changed since the previous pack, CONTEXT.md) until `budget`
+    bytes are used. Sections that do not fit are listed with a `get` pointer.
+    Without a previous pack, the spec delta is every spec not yet Stable.
+    """
+    inputs = _pack_inputs(dest)
+    blocks: list[tuple[str, str, str]] = []
+
+    for pin in pins:
+        try:
+            found = get_section(dest, pin)
+        except LookupError as e:
+            _print_warning(f"⚠️  Pin skipped: {e}")
+            continue
+        if "text" in found:
+            text, source = found["text"], f"{found['file']}#{found['anchor']}"
+        else:
+            source = found["file"]
+            text = (dest / source).read_text(encoding="utf-8-sig")
+        blocks.append((f"Pinned: {source}", source, _demote_headings(text, 2)))
+
+    registry = load_registry(dest)
+    if registry["rows"]:
+        lines = [_REGISTRY_HEADER, _REGISTRY_SEPARATOR] + [
+            f"| {r['file']} | {r['description']} | {r['status']} | "
+            f"{r['layer']} | {r['version']} |"
+            for r in registry["rows"]
+        ]
+        blocks.append(("Registry", f"{DESIGN_DIR}/INDEX.md", "\n".join(lines)))
+
+    tasks = _active_tasks(dest)
+    if tasks:
+        lines = ["| ID | Title | Status | Assignee |", "| :--- | :--- | :--- | :--- |"]
+        lines += [
+            f"| {t['id']} | {t['title']} | {t['status']} | {t.get('assignee') or ''} |"
+            for t in tasks
+        ]
+        blocks.append(("Active Tasks", f"{DESIGN_DIR}/TASKS.md", "\n".join(lines)))
+
+    before = (previous or {}).get("inputs")
+    stable = {r["file"] for r in registry["rows"] if r["status"] == "Stable"}
+    for rel, digest in inputs.items():
+        if not rel.startswith(f"{DESIGN_DIR}/specifications/"):
+            continue
+        if before is not None:
+            if before.get(rel) == digest:
+                continue
+        elif pathlib.PurePosixPath(rel).name in stable:
+            continue
+        text = (dest / rel).read_text(encoding="utf-8-sig")
+        blocks.append((f"Changed: {rel}", rel, _demote_headings(text, 2)))
+
+    context = dest / DESIGN_DIR / "CONTEXT.md"
+    if context.is_file():
+        text = context.read_text(encoding="utf-8-sig")
+        source = f"{DESIGN_DIR}/CONTEXT.md"
+        blocks.append(("Project Context", source, _demote_headings(text, 2)))
+
+    seen: set[str] = set()
+    body: list[str] = []
+    report: list[dict] = []
+    used = 0
+    for title, source, text in blocks:
+        chunk = f"## {title}\n\n{_dedupe_sections(text, seen).strip()}\n"
+        size = len(chunk.encode("utf-8"))
+        included = budget is None or used + size <= budget
+        if included:
+            body.append(chunk)
+            used += size
+        report.append(
+            {"section": title, "source": source, "bytes": size, "included": included}
+        )
+
+    options = {"budget": budget, "pins": list(pins)}
+    header = {"v": PACK_SCHEMA_VERSION, "options": options, "inputs": inputs}
+    lines = [
+        f"<!-- magic-spec:pack {json.dumps(header, separators=(',', ':'))} -->",
+        "# Context Pack",
+        "",
+        f"**Generated:** {datetime.date.today().isoformat()}  ",
+        f"**Size:** {used} bytes (~{used // _BYTES_PER_TOKEN} tokens)"
+        + (f" of a {budget} byte budget" if budget is not None else ""),
+        "",
+        "| Section | Source | Bytes |",
+        "| :--- | :--- | :--- |",
+    ]
+    lines += [
+        f"| {r['section']} | `{r['source']}` | {r['bytes']} |"
+        for r in report
+        if r["included"]
+    ]
+    omitted = [r for r in report if not r["included"]]
+    if omitted:
+        lines += ["", "**Omitted (over budget):**", ""]
+        lines += [
+            f"- `magic-spec get {r['source']}` ({r['bytes']} bytes)" for r in omitted
+        ]
+    text = "\n".join(lines) + "\n\n" + "\n".join(body)
+    return {"text": text, "sections": report, "bytes": used, "inputs": inputs}
+
+
+def pack_is_stale(dest: pathlib.Path, path: pathlib.Path, options: dict) -> bool:
+    header = read_pack_header(path)
+    return (
+        header is None
+        or header.get("v") != PACK_SCHEMA_VERSION
+        or header.get("options") != options
+        or header.get("inputs") != _pack_inputs(dest)
+    )
+
+
+def run_pack(
+    dest: pathlib.Path,
+    budget: int | None = None,
+    pins: list[str] | None = None,
+    check: bool = False,
+    force: bool = False,
+) -> int:
+    if not (dest / DESIGN_DIR).is_dir():
+        _print_error(f"Error: no {DESIGN_DIR}/ workspace in {dest}.")
+        return 1
+    pins = list(pins or DEFAULT_PACK_PINS)
+    path = dest / DESIGN_DIR / PACK_FILE
+    rel = f"{DESIGN_DIR}/{PACK_FILE}"
+    options = {"budget": budget, "pins": pins}
+    if check:
+        stale = pack_is_stale(dest, path, options)
+        _REPORT.result = {"path": rel, "stale": stale}
+        if stale:
+            print(f"⚠️  {rel} is stale; run magic-spec pack to regenerate it.")
+        else:
+            print(f"✅ {rel} is current.")
+        return 1 if stale else 0
+
+    # Concurrent requests queue on the lock; once one has written the pack,
+    # the others find it current and return without rebuilding.
+    with _project_lock(dest, PACK_FILE):
+        if not force and not pack_is_stale(dest, path, options):
+            _REPORT.result = {"path": rel, "stale": False, "written": False}
+            print(f"✅ {rel} is current; inputs unchanged.")
+            return 0
+        pack = build_context_pack(dest, budget, pins, read_pack_header(path))
+        _atomic_write(path, pack["text"])
+    _REPORT.files_written.append(rel)
+    _REPORT.result = {
+        "path": rel,
+        "stale": False,
+        "written": True,
+        "bytes": pack["bytes"],
+        "budget": budget,
+        "sections": pack["sections"],
+    }
+    for item in pack["sections"]:
+        mark = " " if item["included"] else "✗"
+        print(f"  {mark} {item['bytes']:>7}  {item['section']}")
+    print(f"📦 Wrote {rel} ({_format_bytes(pack['bytes'])}).")
+    return 0
@@ -0,0 +1,297 @@
+"""Specification registry (INDEX.md) and its domain shards."""
+
+from __future__ import annotations
+
+import pathlib
+import re
+
+from .core import (
+    DESIGN_DIR,
+    _REPORT,
+    _print_error,
+    _print_warning,
+)
+from .fsio import (
+    _atomic_write,
+    _project_lock,
+)
+
+INDEX_SHARDS_DIR = "INDEX.d"
+
+
+REGISTRY_SHARD_KEYS = ("prefix", "layer")
+
+
+_REGISTRY_HEADER = "| File | Description | Status | Layer | Version |"
+
+
+_REGISTRY_SEPARATOR = "| :--- | :--- | :--- | :--- | :--- |"
+
+
+_REGISTRY_ROW = re.compile(
+    r"^\|\s*\[([^\]]+)\]\((?:\.\./)?specifications/([^)]+)\)\s*\|(.*)\|\s*$"
+)
+
+
+_SHARD_POINTER = (
+    "Specifications are registered in domain shards under "
+    f"[{INDEX_SHARDS_DIR}/]({INDEX_SHARDS_DIR}/), one file per domain."
+)
+
+
+def _registry_shards(dest: pathlib.Path) -> list[pathlib.Path]:
+    shards_dir = dest / DESIGN_DIR / INDEX_SHARDS_DIR
+    if not shards_dir.is_dir():
+        return []
+    return sorted(p for p in shards_dir.glob("*.md") if p.is_file())
+
+
+def _parse_registry_row(line: str) -> dict | None:
+    match = _REGISTRY_ROW.match(line.strip())
+    if not match:
+        return None
+    cells = [c.strip() for c in match.group(3).split("|")]
+    cells += [""] * (4 - len(cells))
+    return {
+        "file": match.group(2),
+        "description": cells[0],
+        "status": cells[1],
+        "layer": cells[2],
+        "version": cells[3],
+    }
+
+
+def load_registry(dest: pathlib.Path) -> dict:
+    """
+    Merged view of INDEX.md and its INDEX.d/*.md shards, in that order.
+    A spec registered twice keeps its first row and is reported as a duplicate.
+    """
+    design = dest / DESIGN_DIR
+    sources = [design / "INDEX.md"] + _registry_shards(dest)
+    rows: dict[str, dict] = {}
+    duplicates: list[dict] = []
+    for path in sources:
+        try:
+            text = path.read_text(encoding="utf-8")
+        except OSError:
+            continue
+        source = path.relative_to(design).as_posix()
+        for line in text.splitlines():
+            row = _parse_registry_row(line)
+            if row is None:
+                continue
+            row["source"] = source
+            if row["file"] in rows:
+                duplicates.append(
+                    {
+                        "file": row["file"],
+                        "sources": [rows[row["file"]]["source"], source],
+                    }
+                )
+                continue
+            rows[row["file"]] = row
+    return {
+        "rows": list(rows.values()),
+        "duplicates": duplicates,
+        "shards": len(sources) - 1,
+    }
+
+
+def _registry_table_span(lines: list[str]) -> tuple[int, int] | None:
+    """Line range of the Domain Specifications table (header through last row)."""
+    for start, line in enumerate(lines):
+        if line.strip().startswith("| File |"):
+            end = start + 1
+            while end < len(lines) and lines[end].strip().startswith(("|", "<!--")):
+                end += 1
+            return start, end
+    return None
+
+
+def _shard_key(row: dict, by: str) -> str:
+    raw = (
+        row["layer"] if by == "layer" else pathlib.Path(row["file"]).stem.split("-")[0]
+    )
+    key = re.sub(r"[^a-z0-9]+", "-", raw.lower()).strip("-")
+    return key or "general"
+
+
+def _write_shard(path: pathlib.Path, key: str, rows: list[str]) -> None:
+    _atomic_write(
+        path,
+        "\n".join(
+            [
+                f"# Specifications Registry — {key}",
+                "",
+                _REGISTRY_HEADER,
+                _REGISTRY_SEPARATOR,
+            ]
+            + rows
+        )
+        + "\n",
+    )
+
+
+def split_registry(dest: pathlib.Path, by: str = "prefix") -> dict[str, int]:
+    """
+    Moves the INDEX.md table rows into INDEX.d/<key>.md shards and leaves a
+    pointer in INDEX.md. Returns the number of rows moved into each shard.
+    """
+    with _project_lock(dest, "INDEX.md"):
+        return _split_registry(dest, by)
+
+
+def _split_registry(dest: pathlib.Path, by: str) -> dict[str, int]:
+    index_path = dest / DESIGN_DIR / "INDEX.md"
+    lines = index_path.read_text(encoding="utf-8").splitlines()
+    span = _registry_table_span(lines)
+    if span is None:
+        raise ValueError("INDEX.md has no specifications table to split")
+
+    groups: dict[str, list[str]] = {}
+    for line in lines[span[0] : span[1]]:
+        row = _parse_registry_row(line)
+        if row is not None:
+            shard_row = line.strip().replace(
+                "](specifications/", "](../specifications/"
+            )
+            groups.setdefault(_shard_key(row, by), []).append(shard_row)
+
+    shards_dir = dest / DESIGN_DIR / INDEX_SHARDS_DIR
+    shards_dir.mkdir(parents=True, exist_ok=True)
+    moved: dict[str, int] = {}
+    for key, new_rows in sorted(groups.items()):
+        shard = shards_dir / f"{key}.md"
+        existing: list[str] = []
+        if shard.exists():
+            existing = [
+                line.strip()
+                for line in shard.read_text(encoding="utf-8").splitlines()
+                if _parse_registry_row(line)
+            ]
+        known = {_parse_registry_row(line)["file"] for line in existing}
+        added = [r for r in new_rows if _parse_registry_row(r)["file"] not in known]
+        _write_shard(shard, key, existing + added)
+        moved[key] = len(added)
+
+    lines[span[0] : span[1]] = [_SHARD_POINTER]
+    _atomic_write(index_path, "\n".join(lines) + "\n")
+    return moved
+
+
+def join_registry(dest: pathlib.Path) -> int:
+    """
+    Merges every INDEX.d shard back into the INDEX.md table and removes the
+    shards. Returns the number of rows merged.
+    """
+    with _project_lock(dest, "INDEX.md"):
+        return _join_registry(dest)
+
+
+def _join_registry(dest: pathlib.Path) -> int:
+    index_path = dest / DESIGN_DIR / "INDEX.md"
+    lines = index_path.read_text(encoding="utf-8").splitlines()
+    span = _registry_table_span(lines)
+    known = set()
+    if span is not None:
+        known = {
+            row["file"]
+            for row in map(_parse_registry_row, lines[span[0] : span[1]])
+            if row is not None
+        }
+
+    shards = _registry_shards(dest)
+    merged: list[str] = []
+    for shard in shards:
+        for line in shard.read_text(encoding="utf-8").splitlines():
+            row = _parse_registry_row(line)
+            if row is None:
+                continue
+            if row["file"] in known:
+                _print_warning(
+                    f"⚠️  {row['file']} is registered more than once; "
+                    f"dropping the row from {shard.name}"
+                )
+                continue
+            known.add(row["file"])
+            merged.append(
+                line.strip().replace("](../specifications/", "](specifications/")
+            )
+
+    if span is not None:
+        end = span[1]
+        while end > span[0] + 2 and lines[end - 1].strip().startswith("<!--"):
+            end -= 1
+        lines[end:end] = merged
+    else:
+        table = [_REGISTRY_HEADER, _REGISTRY_SEPARATOR] + merged
+        pointer = next((i for i, l in enumerate(lines) if "(INDEX.d/)" in l), None)
+        if pointer is not None:
+            lines[pointer : pointer + 1] = table
+        else:
+            heading = next(
+                (
+                    i
+                    for i, l in enumerate(lines)
+                    if l.strip() == "## Domain Specifications"
+                ),
+                None,
+            )
+            if heading is None:
+                lines += ["", "## Domain Specifications"]
+                heading = len(lines) - 1
+            lines[heading + 1 : heading + 1] = table
+    _atomic_write(index_path, "\n".join(lines) + "\n")
+
+    for shard in shards:
+        shard.unlink()
+    shards_dir = dest / DESIGN_DIR / INDEX_SHARDS_DIR
+    if shards_dir.is_dir() and not any(shards_dir.iterdir()):
+        shards_dir.rmdir()
+    return len(merged)
+
+
+def run_index(dest: pathlib.Path, action: str | None, by: str = "prefix") -> int:
+    index_path = dest / DESIGN_DIR / "INDEX.md"
+    if not index_path.exists():
+        _print_error(f"Error: {DESIGN_DIR}/INDEX.md not found in {dest}.")
+        return 1
+
+    if action == "split":
+        if by not in REGISTRY_SHARD_KEYS:
+            _print_error(
+                f"Error: --by must be one of {', '.join(REGISTRY_SHARD_KEYS)}."
+            )
+            return 1
+        try:
+            moved = split_registry(dest, by)
+        except ValueError as e:
+            _print_error(f"Error: {e}.")
+            return 1
+        _REPORT.result = {"action": "split", "by": by, "shards": moved}
+        for key, count in moved.items():
+            print(f"  {INDEX_SHARDS_DIR}/{key}.md  +{count}")
+        print(f"✅ Split {sum(moved.values())} row(s) into {len(moved)} shard(s).")
+        return 0
+
+    if action == "join":
+        if not _registry_shards(dest):
+            print(f"No shards in {DESIGN_DIR}/{INDEX_SHARDS_DIR}/; nothing to join.")
+            _REPORT.result = {"action": "join", "rows": 0}
+            return 0
+        count = join_registry(dest)
+        _REPORT.result = {"action": "join", "rows": count}
+        print(f"✅ Joined {count} row(s) back into {DESIGN_DIR}/INDEX.md.")
+        return 0
+
+    registry = load_registry(dest)
+    _REPORT.result = registry
+    print(
+        f"{len(registry['rows'])} specification(s) registered, "
+        f"{registry['shards']} shard(s) in {DESIGN_DIR}/{INDEX_SHARDS_DIR}/"
+    )
+    for dup in registry["duplicates"]:
+        _print_warning(
+            f"⚠️  {dup['file']} is registered in both {' and '.join(dup['sources'])}"
+        )
+    return 0
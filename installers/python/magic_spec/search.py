@@ -0,0 +1,542 @@
+"""Spec search index and section retrieval (`search`, `get`)."""
+
+from __future__ import annotations
+
+import json
+import hashlib
+import math
+import pathlib
+import re
+import shutil
+
+from .core import (
+    DESIGN_DIR,
+    ENGINE_DIR,
+    _REPORT,
+    _format_bytes,
+    _is_within_directory,
+    _print_error,
+    _print_warning,
+    _project_key,
+    _sha256_bytes,
+    _user_cache_dir,
+)
+from .fsio import (
+    _atomic_write,
+    _project_lock,
+)
+from .markdown import (
+    LIST_ITEM_LEVEL,
+    _heading_anchor,
+    markdown_sections,
+)
+from .registry import (
+    load_registry,
+)
+
+SEARCH_SCHEMA_VERSION = 2
+
+
+SEARCH_FIELDS = ("status", "layer", "version", "implements")
+
+
+_SEARCH_BUCKETS = 64
+
+
+_SEARCH_MAX_SEGMENTS = 8
+
+
+_SEARCH_K1 = 1.2
+
+
+_SEARCH_B = 0.75
+
+
+_SEARCH_WORD = re.compile(r"[a-z0-9][a-z0-9_]*")
+
+
+_SPEC_FIELD = re.compile(
+    rb"^\*\*(Status|Layer|Version|Implements):\*\*[ \t]*(.+?)[ \t]*$", re.MULTILINE
+)
+
+
+def _search_tokens(text: str) -> list[str]:
+    return [t for t in _SEARCH_WORD.findall(text.lower()) if len(t) > 1]
+
+
+def _search_index_dir(dest: pathlib.Path) -> pathlib.Path:
+    return _user_cache_dir() / "search" / _project_key(dest)
+
+
+def _search_bucket(term: str) -> str:
+    digest = hashlib.md5(term.encode("utf-8")).digest()
+    return f"{digest[0] % _SEARCH_BUCKETS:02x}.json"
+
+
+def _spec_fields(data: bytes) -> dict:
+    fields: dict[str, str] = {}
+    for match in _SPEC_FIELD.finditer(data[:4096]):
+        key = match.group(1).decode("ascii").lower()
+        value = re.sub(r"<!--.*?-->", "", match.group(2).decode("utf-8", "replace"))
+        if key == "implements":
+            found = re.search(r"[\w./-]+\.md", value)
+            value = pathlib.PurePosixPath(found.group(0)).name if found else ""
+        if value.strip() and key not in fields:
+            fields[key] = value.strip()
+    return fields
+
+
+def _index_spec(data: bytes) -> tuple[dict, list[dict[str, int]]]:
+    """Per-file index entry plus one term-frequency map per section."""
+    spans = [
+        (s["anchor"], s["title"], s["start"], s["body_end"])
+        for s in markdown_sections(data)
+    ]
+    if not spans or spans[0][2] > 0:
+        spans.insert(0, ("", "", 0, spans[0][2] if spans else len(data)))
+    entries = []
+    term_maps = []
+    for anchor, title, start, end in spans:
+        tokens = _search_tokens(data[start:end].decode("utf-8", errors="replace"))
+        tokens += _search_tokens(title)
+        counts: dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        entries.append([anchor, title, len(tokens)])
+        term_maps.append(counts)
+    return {"fields": _spec_fields(data), "sections": entries}, term_maps
+
+
+def update_search_index(dest: pathlib.Path) -> dict:
+    """
+    Brings the on-disk inverted index in line with .design/specifications.
+    Files are re-hashed only when their size or mtime moved and re-indexed
+    only when the hash changed.
+    """
+    return _sync_search_index(dest)[1]
+
+
+def _read_postings(path: pathlib.Path) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_segment(segment_dir: pathlib.Path, buckets: dict[str, dict]) -> None:
+    segment_dir.mkdir(parents=True, exist_ok=True)
+    for name, postings in buckets.items():
+        (segment_dir / name).write_text(
+            json.dumps(postings, separators=(",", ":")), encoding="utf-8"
+        )
+
+
+def _sync_search_index(dest: pathlib.Path) -> tuple[dict, dict]:
+    # Segment names come from the manifest; one writer at a time per project.
+    with _project_lock(dest, "search-index"):
+        return _apply_search_changes(dest)
+
+
+def _apply_search_changes(dest: pathlib.Path) -> tuple[dict, dict]:
+    """
+    Postings live in append-only segments, each split into buckets by term
+    hash so a query reads only the buckets of its own terms. Changed files
+    get a fresh id and their postings go into a new segment; postings of ids
+    no longer in the manifest are ignored and dropped when segments are
+    compacted.
+    """
+    index_dir = _search_index_dir(dest)
+    manifest_path = index_dir / "manifest.json"
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if manifest.get("schemaVersion") != SEARCH_SCHEMA_VERSION:
+            raise ValueError("schema changed")
+    except (OSError, ValueError, AttributeError):
+        manifest = {
+            "schemaVersion": SEARCH_SCHEMA_VERSION,
+            "files": {},
+            "nextId": 0,
+            "segments": [],
+            "nextSegment": 0,
+        }
+        shutil.rmtree(index_dir / "segments", ignore_errors=True)
+    files: dict[str, dict] = manifest["files"]
+
+    specs_dir = dest / DESIGN_DIR / "specifications"
+    current: dict[str, pathlib.Path] = {}
+    if specs_dir.is_dir():
+        for path in sorted(specs_dir.rglob("*.md")):
+            current[path.relative_to(dest).as_posix()] = path
+
+    removed = [rel for rel in files if rel not in current]
+    changed: dict[str, tuple[dict, list[dict[str, int]]]] = {}
+    touched = False
+    for rel, path in current.items():
+        st = path.stat()
+        entry = files.get(rel)
+        if entry and entry["mtime"] == st.st_mtime_ns and entry["size"] == st.st_size:
+            continue
+        data = path.read_bytes()
+        digest = _sha256_bytes(data)
+        if entry and entry["sha256"] == digest:
+            entry.update(mtime=st.st_mtime_ns, size=st.st_size)
+            touched = True
+            continue
+        meta, term_maps = _index_spec(data)
+        meta.update(sha256=digest, mtime=st.st_mtime_ns, size=st.st_size)
+        changed[rel] = (meta, term_maps)
+
+    stats = {"files": len(current), "updated": len(changed), "removed": len(removed)}
+    if not (changed or removed or touched) and manifest_path.exists():
+        return manifest, stats
+
+    for rel in removed:
+        del files[rel]
+    buckets: dict[str, dict] = {}
+    for rel, (meta, term_maps) in changed.items():
+        meta["id"] = manifest["nextId"]
+        manifest["nextId"] += 1
+        for idx, counts in enumerate(term_maps):
+            for term, tf in counts.items():
+                postings = buckets.setdefault(_search_bucket(term), {})
+                postings.setdefault(term, []).append([meta["id"], idx, tf])
+        files[rel] = meta
+
+    segments_dir = index_dir / "segments"
+    obsolete: list[str] = []
+    try:
+        if buckets:
+            name = f"{manifest['nextSegment']:06d}"
+            manifest["nextSegment"] += 1
+            _write_segment(segments_dir / name, buckets)
+            manifest["segments"].append(name)
+        if len(manifest["segments"]) > _SEARCH_MAX_SEGMENTS:
+            live = {entry["id"] for entry in files.values()}
+            merged: dict[str, dict] = {}
+            for segment in manifest["segments"]:
+                for bucket_path in (segments_dir / segment).glob("*.json"):
+                    target = merged.setdefault(bucket_path.name, {})
+                    for term, postings in _read_postings(bucket_path).items():
+                        kept = [p for p in postings if p[0] in live]
+                        if kept:
+                            target.setdefault(term, []).extend(kept)
+            name = f"{manifest['nextSegment']:06d}"
+            manifest["nextSegment"] += 1
+            _write_segment(segments_dir / name, merged)
+            obsolete = manifest["segments"]
+            manifest["segments"] = [name]
+
+        lengths = [s[2] for entry in files.values() for s in entry["sections"]]
+        manifest["sections"] = len(lengths)
+        manifest["avgLength"] = (sum(lengths) / len(lengths)) if lengths else 0.0
+        # The manifest goes last: it is what makes new segments visible.
+        _atomic_write(manifest_path, json.dumps(manifest))
+    except OSError:
+        pass
+    for segment in obsolete:
+        shutil.rmtree(segments_dir / segment, ignore_errors=True)
+    return manifest, stats
+
+
+def _parse_search_query(query: str) -> tuple[list[str], dict[str, str]]:
+    terms: list[str] = []
+    filters: dict[str, str] = {}
+    for part in query.split():
+        key, sep, value = part.partition(":")
+        if sep and key.lower() in SEARCH_FIELDS and value:
+            filters[key.lower()] = value.lower()
+        else:
+            terms.extend(_search_tokens(part))
+    return terms, filters
+
+
+def _fields_match(fields: dict, filters: dict[str, str]) -> bool:
+    for key, wanted in filters.items():
+        value = fields.get(key, "").lower()
+        if key == "version":
+            if not (value == wanted or value.startswith(wanted + ".")):
+                return False
+        elif key == "implements":
+            if value not in (wanted, f"{wanted}.md"):
+                return False
+        elif value != wanted:
+            return False
+    return True
+
+
+def search_specs(dest: pathlib.Path, query: str, limit: int = 10) -> dict:
+    """
+    BM25-ranked section hits for the free-text part of `query`, narrowed by
+    field filters such as `status:stable layer:implementation version:1.2
+    implements:architecture.md`. Registry rows fill fields a spec header lacks.
+    """
+    manifest, stats = _sync_search_index(dest)
+    index_dir = _search_index_dir(dest)
+    files = manifest["files"]
+    by_id = {entry["id"]: rel for rel, entry in files.items()}
+    terms, filters = _parse_search_query(query)
+
+    registry = load_registry(dest)["rows"] if filters else []
+    by_name = {pathlib.PurePosixPath(r["file"]).name: r for r in registry}
+    fields_by_file = {}
+    for rel, entry in files.items():
+        fields = dict(entry["fields"])
+        row = by_name.get(pathlib.PurePosixPath(rel).name)
+        for key in ("status", "layer", "version"):
+            if row and row.get(key) and key not in fields:
+                fields[key] = row[key]
+        fields_by_file[rel] = fields
+    allowed = {rel for rel, f in fields_by_file.items() if _fields_match(f, filters)}
+
+    scores: dict[tuple[str, int], float] = {}
+    if terms:
+        total = max(manifest.get("sections", 0), 1)
+        avg = manifest.get("avgLength") or 1.0
+        buckets: dict[str, list[dict]] = {}
+        for term in set(terms):
+            name = _search_bucket(term)
+            if name not in buckets:
+                buckets[name] = [
+                    _read_postings(index_dir / "segments" / segment / name)
+                    for segment in manifest.get("segments", [])
+                ]
+            postings = [
+                (by_id[p[0]], p[1], p[2])
+                for segment in buckets[name]
+                for p in segment.get(term, [])
+                if p[0] in by_id
+            ]
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for rel, idx, tf in postings:
+                if rel not in allowed or idx >= len(files[rel]["sections"]):
+                    continue
+                length = files[rel]["sections"][idx][2]
+                norm = tf + _SEARCH_K1 * (1 - _SEARCH_B + _SEARCH_B * length / avg)
+                key = (rel, idx)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (_SEARCH_K1 + 1) / norm
+    elif filters:
+        scores = {(rel, 0): 0.0 for rel in allowed}
+
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    hits = []
+    for (rel, idx), score in ranked:
+        anchor, title, _ = files[rel]["sections"][idx]
+        hits.append(
+            {
+                "file": rel,
+                "anchor": anchor,
+                "title": title,
+                "score": round(score, 4),
+                "fields": fields_by_file[rel],
+            }
+        )
+    return {"query": query, "hits": hits, "index": stats}
+
+
+def run_search(dest: pathlib.Path, query: str, limit: int = 10) -> int:
+    if not query.strip():
+        _print_error("Error: search needs a query, e.g. magic-spec search rollback")
+        return 1
+    if not (dest / DESIGN_DIR / "specifications").is_dir():
+        _print_error(f"Error: no {DESIGN_DIR}/specifications/ in {dest}.")
+        return 1
+    result = search_specs(dest, query, limit)
+    _REPORT.result = result
+    if not result["hits"]:
+        print(f"No matches for '{query}'.")
+        return 0
+    for hit in result["hits"]:
+        target = f"{hit['file']}#{hit['anchor']}" if hit["anchor"] else hit["file"]
+        status = hit["fields"].get("status", "")
+        print(f"{hit['score']:>8.2f}  {target}  {hit['title']}  {status}".rstrip())
+    return 0
+
+
+SECTIONS_SCHEMA_VERSION = 3
+
+
+SECTION_ROOTS = (ENGINE_DIR, DESIGN_DIR)
+
+
+def _sections_cache_path(dest: pathlib.Path) -> pathlib.Path:
+    return _user_cache_dir() / "sections" / f"{_project_key(dest)}.json"
+
+
+def _load_sections_cache(dest: pathlib.Path) -> dict:
+    try:
+        cache = json.loads(_sections_cache_path(dest).read_text(encoding="utf-8"))
+        if cache.get("schemaVersion") == SECTIONS_SCHEMA_VERSION:
+            return cache
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {"schemaVersion": SECTIONS_SCHEMA_VERSION, "files": {}}
+
+
+def _save_sections_cache(dest: pathlib.Path, cache: dict) -> None:
+    path = _sections_cache_path(dest)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _atomic_write(path, json.dumps(cache))
+    except OSError:
+        pass
+
+
+def _refresh_sections(path: pathlib.Path, entry: dict | None) -> tuple[dict, bool]:
+    """Returns the file's section entry and whether it had to be re-parsed."""
+    st = path.stat()
+    if entry and entry["mtime"] == st.st_mtime_ns and entry["size"] == st.st_size:
+        return entry, False
+    data = path.read_bytes()
+    digest = _sha256_bytes(data)
+    if entry and entry["sha256"] == digest:
+        return dict(entry, mtime=st.st_mtime_ns, size=st.st_size), False
+    sections = [
+        [s["anchor"], s["title"], s["level"], s["start"], s["end"]]
+        for s in markdown_sections(data, list_items=True)
+    ]
+    entry = {
+        "sha256": digest,
+        "mtime": st.st_mtime_ns,
+        "size": st.st_size,
+        "sections": sections,
+    }
+    return entry, True
+
+
+def _resolve_section_file(dest: pathlib.Path, name: str) -> pathlib.Path | None:
+    """A project-relative path, or a bare name looked up in the usual places."""
+    candidates = [dest / name]
+    if "/" not in name and "\\" not in name:
+        candidates += [
+            dest / ENGINE_DIR / name,
+            dest / DESIGN_DIR / name,
+            dest / DESIGN_DIR / "specifications" / name,
+        ]
+    roots = [(dest / root).resolve() for root in SECTION_ROOTS]
+    for candidate in candidates:
+        if candidate.suffix != ".md":
+            candidate = candidate.with_suffix(candidate.suffix + ".md")
+        resolved = candidate.resolve()
+        if resolved.is_file() and any(
+            _is_within_directory(root, resolved) for root in roots
+        ):
+            return resolved
+    return None
+
+
+_ITEM_QUERY = re.compile(r"^(?:(.+)/|(?:rule|item|step)[ -]?)?(\d+)$", re.I)
+
+
+def _match_section(sections: list[list], wanted: str) -> list[list]:
+    """
+    Exact anchor first, then anchors that start or contain it as words.
+    `Rule 57`, `57` or `<section>/57` look up numbered list items by number,
+    the last form only inside that section.
+    """
+    item = _ITEM_QUERY.match(wanted.strip())
+    if item:
+        scope = sections
+        if item.group(1):
+            parents = _match_section(sections, item.group(1))
+            if not parents:
+                return []
+            _, _, _, start, end = parents[0]
+            scope = [s for s in sections if start <= s[3] < end]
+        found = [
+            s
+            for s in scope
+            if s[2] == LIST_ITEM_LEVEL and s[1].split(".", 1)[0] == item.group(2)
+        ]
+        if found or item.group(1):
+            return found
+    anchor = _heading_anchor(wanted)
+    for test in (
+        lambda a: a == anchor,
+        lambda a: a.startswith(anchor + "-"),
+        lambda a: f"-{anchor}-" in f"-{a}-",
+    ):
+        found = [s for s in sections if test(s[0])]
+        if found:
+            return found
+    return []
+
+
+def get_section(dest: pathlib.Path, target: str) -> dict:
+    """
+    Returns one section of a Markdown file addressed as `<file>#<section>`,
+    read by seeking to its byte offsets. Without `#<section>` the result is
+    the file's outline. Raises LookupError when the file or section is
+    unknown.
+    """
+    name, _, wanted = target.partition("#")
+    path = _resolve_section_file(dest, name)
+    if path is None:
+        raise LookupError(f"no Markdown file '{name}' under {', '.join(SECTION_ROOTS)}")
+    rel = path.relative_to(dest.resolve()).as_posix()
+
+    cache = _load_sections_cache(dest)
+    entry, reparsed = _refresh_sections(path, cache["files"].get(rel))
+    if reparsed or cache["files"].get(rel) != entry:
+        # Entries of deleted files are dropped whenever the cache is written.
+        cache["files"] = {
+            name: item
+            for name, item in cache["files"].items()
+            if (dest / name).is_file()
+        }
+        cache["files"][rel] = entry
+        _save_sections_cache(dest, cache)
+    sections = entry["sections"]
+    outline = [
+        {"anchor": s[0], "title": s[1], "level": s[2], "bytes": s[4] - s[3]}
+        for s in sections
+    ]
+    if not wanted:
+        return {"file": rel, "outline": outline}
+
+    matches = _match_section(sections, wanted)
+    if not matches:
+        raise LookupError(f"no section '{wanted}' in {rel}")
+    anchor, title, level, start, end = matches[0]
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8", errors="replace").lstrip("\ufeff")
+    return {
+        "file": rel,
+        "anchor": anchor,
+        "title": title,
+        "level": level,
+        "offset": start,
+        "bytes": end - start,
+        "fileBytes": entry["size"],
+        "text": text,
+        "otherMatches": [m[0] for m in matches[1:]],
+    }
+
+
+def run_get(dest: pathlib.Path, target: str | None) -> int:
+    if not target:
+        _print_error("Error: get needs a target, e.g. magic-spec get spec.md#triggers")
+        return 1
+    try:
+        result = get_section(dest, target)
+    except LookupError as e:
+        _print_error(f"Error: {e}.")
+        return 1
+    _REPORT.result = result
+    if "outline" in result:
+        depth = 0
+        for item in result["outline"]:
+            if item["level"] < LIST_ITEM_LEVEL:
+                depth = item["level"] - 1
+            indent = "  " * (depth + (item["level"] == LIST_ITEM_LEVEL))
+            print(f"{indent}#{item['anchor']}  ({_format_bytes(item['bytes'])})")
+        return 0
+    print(result["text"].rstrip("\n"))
+    if result["otherMatches"]:
+        _print_warning(
+            f"⚠️  '{target}' also matches: "
+            + ", ".join(f"#{a}" for a in result["otherMatches"])
+        )
+    return 0
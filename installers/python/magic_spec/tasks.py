@@ -0,0 +1,593 @@
+"""TASKS.md analytics and task status updates."""
+
+from __future__ import annotations
+
+import json
+import pathlib
+import re
+
+from .core import (
+    DESIGN_DIR,
+    PACKAGE_NAME,
+    _REPORT,
+    _print_error,
+    _print_warning,
+    _project_key,
+    _sha256_bytes,
+    _user_cache_dir,
+)
+from .fsio import (
+    _atomic_write,
+    _project_lock,
+)
+
+ANALYTICS_SCHEMA_VERSION = 2
+
+
+TASK_STATUSES = ("Todo", "In Progress", "Done", "Blocked", "Cancelled")
+
+
+# Checklist notation from task.md, accepted wherever a status is expected.
+_STATUS_MARKERS = {
+    "[ ]": "Todo",
+    "[/]": "In Progress",
+    "[x]": "Done",
+    "[!]": "Blocked",
+    "[~]": "Cancelled",
+}
+
+
+_TASK_ID = r"T-(\d+)([A-Z]+)(\d+)"
+
+
+_PHASE_HEADING = re.compile(r"^#{1,3}\s+Phase\s+(\d+)\s*[—–-]\s*(.+?)\s*$")
+
+
+_TRACK_HEADING = re.compile(r"^(?:#{2,4}\s+)?\**Track\s+([A-Z]+):?\**:?\s*(.*?)\**\s*$")
+
+
+_TASK_HEADING = re.compile(r"^#{2,4}\s+\[(" + _TASK_ID + r")\]\s*(.*?)\s*$")
+
+
+_TASK_FIELD = re.compile(r"^\s*-\s+\*\*([A-Za-z][A-Za-z ]*):\*\*\s*(.*?)\s*$")
+
+
+_TASK_ROW = re.compile(r"^\|\s*\[(" + _TASK_ID + r")\]\s*\|(.*)\|\s*$")
+
+
+_STATUS_LINE = re.compile(r"^\*\*Status:\*\*\s*(.+?)\s*$")
+
+
+def _normalize_status(value: str) -> str:
+    cleaned = value.strip().strip("*`").strip()
+    if cleaned.lower() in _STATUS_MARKERS:
+        return _STATUS_MARKERS[cleaned.lower()]
+    for status in TASK_STATUSES:
+        if cleaned.lower() == status.lower():
+            return status
+    return cleaned or "Todo"
+
+
+def parse_task_document(text: str) -> dict:
+    """
+    Parses TASKS.md or an archived phase file. Both the heading layout of
+    phase files (`### [T-1A01] Title` + `- **Status:** Done` bullets) and the
+    table layout of TASKS.md (`| [T-1A01] | Title | Done | Agent |`) are
+    recognised. Returns {"phases": {n: {...}}, "tracks": {...}, "tasks": [...]}.
+    """
+    phases: dict[str, dict] = {}
+    tracks: dict[str, str] = {}
+    tasks: list[dict] = []
+    phase = None
+    task = None
+
+    for line in text.splitlines():
+        heading = _PHASE_HEADING.match(line)
+        if heading:
+            phase = heading.group(1)
+            phases.setdefault(phase, {"name": heading.group(2), "status": None})
+            task = None
+            continue
+        track = _TRACK_HEADING.match(line)
+        if track and phase is not None:
+            tracks[f"{phase}{track.group(1)}"] = track.group(2)
+            task = None
+            continue
+        status = _STATUS_LINE.match(line)
+        if status and task is None and phase is not None:
+            phases[phase]["status"] = status.group(1)
+            continue
+        match = _TASK_HEADING.match(line)
+        if match:
+            task = {
+                "id": match.group(1),
+                "phase": match.group(2),
+                "track": match.group(2) + match.group(3),
+                "title": match.group(5),
+                "status": "Todo",
+            }
+            tasks.append(task)
+            continue
+        row = _TASK_ROW.match(line)
+        if row:
+            cells = [c.strip() for c in row.group(5).split("|")]
+            tasks.append(
+                {
+                    "id": row.group(1),
+                    "phase": row.group(2),
+                    "track": row.group(2) + row.group(3),
+                    "title": cells[0] if cells else "",
+                    "status": _normalize_status(cells[1] if len(cells) > 1 else ""),
+                    "assignee": cells[2] if len(cells) > 2 else None,
+                }
+            )
+            task = None
+            continue
+        field = _TASK_FIELD.match(line)
+        if field and task is not None:
+            key = field.group(1).strip().lower()
+            if key == "status":
+                task["status"] = _normalize_status(field.group(2))
+            elif key in ("spec", "assignee", "notes"):
+                task[key] = field.group(2)
+    return {"phases": phases, "tracks": tracks, "tasks": tasks}
+
+
+def _analytics_cache_path(dest: pathlib.Path) -> pathlib.Path:
+    return _user_cache_dir() / "analytics" / f"{_project_key(dest)}.json"
+
+
+def _load_task_documents(dest: pathlib.Path) -> tuple[dict[str, dict], int]:
+    """
+    Parses TASKS.md and every archived phase file, reusing the cached parse
+    of files whose sha256 is unchanged. Returns ({rel path: parse}, cache hits).
+    """
+    design = dest / DESIGN_DIR
+    files = sorted((design / "archives" / "tasks").glob("phase-*.md"))
+    if (design / "TASKS.md").exists():
+        files.append(design / "TASKS.md")
+
+    cache_path = _analytics_cache_path(dest)
+    try:
+        cache = json.loads(cache_path.read_text(encoding="utf-8"))
+        if cache.get("schemaVersion") != ANALYTICS_SCHEMA_VERSION:
+            cache = {}
+    except (OSError, ValueError, AttributeError):
+        cache = {}
+    cached_files = cache.get("files", {})
+
+    parsed: dict[str, dict] = {}
+    hits = 0
+    for path in files:
+        rel = path.relative_to(dest).as_posix()
+        data = path.read_bytes()
+        digest = _sha256_bytes(data)
+        entry = cached_files.get(rel)
+        if entry and entry.get("sha256") == digest:
+            parsed[rel] = entry["parse"]
+            hits += 1
+        else:
+            parsed[rel] = parse_task_document(data.decode("utf-8", errors="replace"))
+        cached_files[rel] = {"sha256": digest, "parse": parsed[rel]}
+
+    if hits != len(files) or set(cached_files) != set(parsed):
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            _atomic_write(
+                cache_path,
+                json.dumps(
+                    {
+                        "schemaVersion": ANALYTICS_SCHEMA_VERSION,
+                        "files": {rel: cached_files[rel] for rel in parsed},
+                    }
+                ),
+            )
+        except OSError:
+            pass
+    return parsed, hits
+
+
+def _status_counts(tasks: list[dict]) -> dict:
+    counts = {status: 0 for status in TASK_STATUSES}
+    for task in tasks:
+        counts[task["status"]] = counts.get(task["status"], 0) + 1
+    # Cancelled tasks are listed but no longer part of the work to finish.
+    total = len(tasks) - counts["Cancelled"]
+    return {
+        "tasks": len(tasks),
+        "byStatus": counts,
+        "completionRate": round(counts["Done"] / total, 4) if total else None,
+        "blockedRatio": round(counts["Blocked"] / total, 4) if total else None,
+    }
+
+
+def compute_task_analytics(dest: pathlib.Path) -> dict:
+    """
+    Task throughput across the archived phase files and TASKS.md. TASKS.md is
+    the master list, so its status wins when a task appears in both; such
+    disagreements are reported as `statusMismatches`.
+    """
+    documents, hits = _load_task_documents(dest)
+    tasks: dict[str, dict] = {}
+    phase_info: dict[str, dict] = {}
+    track_names: dict[str, str] = {}
+    mismatches = []
+    master = f"{DESIGN_DIR}/TASKS.md"
+
+    # Archives first, then TASKS.md on top.
+    for rel in sorted(documents, key=lambda r: r == master):
+        doc = documents[rel]
+        for number, info in doc["phases"].items():
+            merged = phase_info.setdefault(number, {"name": info["name"]})
+            if info.get("status"):
+                merged["status"] = info["status"]
+            merged.setdefault("sources", []).append(rel)
+        track_names.update(doc["tracks"])
+        for task in doc["tasks"]:
+            previous = tasks.get(task["id"])
+            if previous and rel == master and previous["status"] != task["status"]:
+                mismatches.append(
+                    {
+                        "id": task["id"],
+                        "archive": previous["status"],
+                        "tasks": task["status"],
+                    }
+                )
+            tasks[task["id"]] = {**(previous or {}), **task}
+
+    all_tasks = list(tasks.values())
+    phases = []
+    for number in sorted({t["phase"] for t in all_tasks} | set(phase_info), key=int):
+        phase_tasks = [t for t in all_tasks if t["phase"] == number]
+        tracks = {}
+        for key in sorted({t["track"] for t in phase_tasks}):
+            track_tasks = [t for t in phase_tasks if t["track"] == key]
+            tracks[key] = {"name": track_names.get(key), **_status_counts(track_tasks)}
+        info = phase_info.get(number, {})
+        phases.append(
+            {
+                "phase": int(number),
+                "name": info.get("name"),
+                "status": info.get("status"),
+                "archived": f"{DESIGN_DIR}/archives/tasks/phase-{number}.md"
+                in info.get("sources", []),
+                **_status_counts(phase_tasks),
+                "tracks": tracks,
+            }
+        )
+
+    assignees: dict[str, int] = {}
+    for task in all_tasks:
+        if task.get("assignee"):
+            assignees[task["assignee"]] = assignees.get(task["assignee"], 0) + 1
+    return {
+        "schemaVersion": ANALYTICS_SCHEMA_VERSION,
+        "totals": _status_counts(all_tasks),
+        "throughput": [
+            {"phase": p["phase"], "done": p["byStatus"]["Done"]} for p in phases
+        ],
+        "phases": phases,
+        "assignees": assignees,
+        "blocked": [
+            {"id": t["id"], "title": t["title"], "notes": t.get("notes")}
+            for t in all_tasks
+            if t["status"] == "Blocked"
+        ],
+        "statusMismatches": mismatches,
+        "sources": {"files": sorted(documents), "cached": hits},
+    }
+
+
+def run_analytics(dest: pathlib.Path) -> int:
+    if not (dest / DESIGN_DIR).exists():
+        _print_error(f"Error: no {DESIGN_DIR}/ workspace in {dest}.")
+        return 1
+    analytics = compute_task_analytics(dest)
+    _REPORT.result = analytics
+    totals = analytics["totals"]
+    print(f"{PACKAGE_NAME} task analytics")
+    print("────────────────────────────────")
+    print(f"{'phase':<8}{'tasks':>7}{'done':>7}{'blocked':>9}{'complete':>10}")
+    for phase in analytics["phases"]:
+        rate = phase["completionRate"]
+        print(
+            f"{phase['phase']:<8}{phase['tasks']:>7}{phase['byStatus']['Done']:>7}"
+            f"{phase['byStatus']['Blocked']:>9}"
+            f"{'-' if rate is None else f'{rate:.0%}':>10}"
+        )
+    print("────────────────────────────────")
+    rate = totals["completionRate"]
+    print(
+        f"Total: {totals['tasks']} tasks, "
+        f"{'-' if rate is None else f'{rate:.0%}'} done, "
+        f"{totals['byStatus']['Blocked']} blocked"
+    )
+    for mismatch in analytics["statusMismatches"]:
+        _print_warning(
+            f"⚠️  {mismatch['id']}: archive says {mismatch['archive']}, "
+            f"TASKS.md says {mismatch['tasks']}"
+        )
+    sources = analytics["sources"]
+    print(f"Parsed {len(sources['files'])} file(s), {sources['cached']} from cache.")
+    return 0
+
+
+TASK_INDEX_SCHEMA_VERSION = 2
+
+
+_SUMMARY_HEADER = re.compile(r"^\|\s*Phase\s*\|\s*Total\s*\|")
+
+
+_SUMMARY_ROW = re.compile(r"^\|\s*Phase\s+(\d+)\s*\|")
+
+
+def _task_index_path(dest: pathlib.Path) -> pathlib.Path:
+    return _user_cache_dir() / "tasks" / f"{_project_key(dest)}.json"
+
+
+def build_task_index(data: bytes) -> dict:
+    """
+    Byte offsets of every task and phase summary row in TASKS.md:
+    {"rows": {id: [offset, length, phase, status, layout, assignee]},
+    "summary": {phase: [offset, length]}, "columns": [summary header cells]}.
+    A task in the table layout points at its row (layout "row"); one in the
+    heading layout of templates/tasks.md (`## [T-1A01] Title` plus
+    `- **Status:**` bullets) points at its Status bullet (layout "heading"),
+    with `assignee` the [offset, length] of its Assignee bullet, if any.
+    Lengths exclude the line break.
+    """
+    rows: dict[str, list] = {}
+    summary: dict[str, list] = {}
+    columns: list[str] = []
+    phase = None
+    task_id = None
+    assignee_span = None
+    offset = 0
+    for raw in data.splitlines(keepends=True):
+        line = raw.rstrip(b"\r\n").decode("utf-8", errors="replace")
+        length = len(raw.rstrip(b"\r\n"))
+        heading = _PHASE_HEADING.match(line)
+        task_heading = _TASK_HEADING.match(line)
+        field = _TASK_FIELD.match(line)
+        if heading:
+            phase, task_id = heading.group(1), None
+        elif task_heading:
+            task_id, assignee_span = task_heading.group(1), None
+        elif field and task_id is not None:
+            key = field.group(1).strip().lower()
+            if key == "status":
+                status = _normalize_status(field.group(2))
+                rows[task_id] = [
+                    offset,
+                    length,
+                    phase,
+                    status,
+                    "heading",
+                    assignee_span,
+                ]
+            elif key == "assignee":
+                assignee_span = [offset, length]
+                if task_id in rows:
+                    rows[task_id][5] = assignee_span
+        elif _SUMMARY_HEADER.match(line):
+            columns = [c.strip() for c in line.strip().strip("|").split("|")]
+        else:
+            row = _TASK_ROW.match(line)
+            if row:
+                cells = row.group(5).split("|")
+                status = _normalize_status(cells[1] if len(cells) > 1 else "")
+                rows[row.group(1)] = [offset, length, phase, status, "row", None]
+                task_id = None
+            elif columns and _SUMMARY_ROW.match(line):
+                summary[_SUMMARY_ROW.match(line).group(1)] = [offset, length]
+        offset += len(raw)
+    return {"rows": rows, "summary": summary, "columns": columns}
+
+
+def _load_task_index(dest: pathlib.Path, path: pathlib.Path) -> tuple[dict, bool]:
+    """The cached index when TASKS.md's size and mtime still match it."""
+    st = path.stat()
+    try:
+        cache = json.loads(_task_index_path(dest).read_text(encoding="utf-8"))
+        if (
+            cache.get("schemaVersion") == TASK_INDEX_SCHEMA_VERSION
+            and cache.get("mtime") == st.st_mtime_ns
+            and cache.get("size") == st.st_size
+        ):
+            return cache, True
+    except (OSError, ValueError, AttributeError):
+        pass
+    index = build_task_index(path.read_bytes())
+    index.update(schemaVersion=TASK_INDEX_SCHEMA_VERSION)
+    return index, False
+
+
+def _save_task_index(dest: pathlib.Path, path: pathlib.Path, index: dict) -> None:
+    st = path.stat()
+    index.update(mtime=st.st_mtime_ns, size=st.st_size)
+    try:
+        cache_path = _task_index_path(dest)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        _atomic_write(cache_path, json.dumps(index))
+    except OSError:
+        pass
+
+
+def _summary_row(old: str, columns: list[str], phase: str, statuses: list[str]):
+    cells = [c.strip() for c in old.strip().strip("|").split("|")]
+    for i, column in enumerate(columns):
+        if i >= len(cells):
+            cells.append("")
+        if column == "Phase":
+            cells[i] = f"Phase {phase}"
+        elif column == "Total":
+            # Cancelled tasks only count where the table has a column for them.
+            counted = [
+                st for st in statuses if st != "Cancelled" or "Cancelled" in columns
+            ]
+            cells[i] = str(len(counted))
+        elif column in TASK_STATUSES:
+            cells[i] = str(statuses.count(column))
+    return "| " + " | ".join(cells) + " |"
+
+
+def _set_field_value(line: str, value: str) -> str:
+    """Replaces the value of a `- **Field:** value` bullet, keeping its prefix."""
+    field = _TASK_FIELD.match(line)
+    return line[: field.start(2)].rstrip() + f" {value}"
+
+
+def _set_phase_file_status(path: pathlib.Path, task_id: str, status: str) -> bool:
+    """Updates the `- **Status:**` bullet under `[task_id]` in a phase file."""
+    if not path.is_file():
+        return False
+    lines = path.read_text(encoding="utf-8").splitlines(keepends=True)
+    inside = False
+    for i, line in enumerate(lines):
+        heading = _TASK_HEADING.match(line.rstrip("\r\n"))
+        if heading:
+            inside = heading.group(1) == task_id
+            continue
+        field = _TASK_FIELD.match(line.rstrip("\r\n"))
+        if inside and field and field.group(1).strip().lower() == "status":
+            ending = line[len(line.rstrip("\r\n")) :]
+            lines[i] = _set_field_value(line.rstrip("\r\n"), status) + ending
+            _atomic_write(path, "".join(lines))
+            return True
+    return False
+
+
+def set_task_status(
+    dest: pathlib.Path, task_id: str, status: str, assignee: str | None = None
+) -> dict:
+    """
+    Rewrites one task of .design/TASKS.md (its table row, or its Status and
+    Assignee bullets in the heading layout) and its phase's summary row,
+    locating both through a cached byte-offset index instead of re-parsing
+    the file. Runs under _project_lock(dest, "TASKS.md"), a lock file in
+    the user cache (locks/<project key>/TASKS.md.lock), so concurrent
+    workers serialize, and swaps the new file in atomically. The matching
+    `.design/tasks/phase-N.md` bullet is updated too. Raises LookupError
+    for an unknown task and ValueError for an unknown status.
+    """
+    new_status = _normalize_status(status)
+    if new_status not in TASK_STATUSES:
+        raise ValueError(
+            f"unknown status '{status}' (use one of: {', '.join(TASK_STATUSES)})"
+        )
+    path = dest / DESIGN_DIR / "TASKS.md"
+    if not path.is_file():
+        raise LookupError(f"no {DESIGN_DIR}/TASKS.md")
+
+    with _project_lock(dest, "TASKS.md"):
+        index, cached = _load_task_index(dest, path)
+        with open(path, "rb") as f:
+
+            def read_span(offset: int, length: int) -> str:
+                f.seek(offset)
+                return f.read(length).decode("utf-8")
+
+            def entry_matches(entry: list) -> bool:
+                text = read_span(*entry[:2])
+                if entry[4] == "row":
+                    return text.startswith(f"| [{task_id}]")
+                field = _TASK_FIELD.match(text)
+                return bool(field) and field.group(1).strip().lower() == "status"
+
+            entry = index["rows"].get(task_id)
+            if cached and entry and not entry_matches(entry):
+                # Someone rewrote the file within the same mtime tick.
+                index = build_task_index(path.read_bytes())
+                index.update(schemaVersion=TASK_INDEX_SCHEMA_VERSION)
+                entry, cached = index["rows"].get(task_id), False
+            if not entry:
+                raise LookupError(f"no task {task_id} in {DESIGN_DIR}/TASKS.md")
+
+            offset, length, phase, old_status, layout, assignee_span = entry
+            if layout == "row":
+                parts = read_span(offset, length).split("|")
+                parts[3] = f" {new_status} "
+                if assignee is not None and len(parts) > 5:
+                    parts[4] = f" {assignee} "
+                edits = [(offset, length, "|".join(parts))]
+            else:
+                text = _set_field_value(read_span(offset, length), new_status)
+                edits = [(offset, length, text)]
+                if assignee is not None and assignee_span:
+                    text = _set_field_value(read_span(*assignee_span), assignee)
+                    edits.append((*assignee_span, text))
+            entry[3] = new_status
+
+            summary = index["summary"].get(phase)
+            if summary:
+                statuses = [r[3] for r in index["rows"].values() if r[2] == phase]
+                old_row = read_span(*summary)
+                edits.append(
+                    (
+                        summary[0],
+                        summary[1],
+                        _summary_row(old_row, index["columns"], phase, statuses),
+                    )
+                )
+
+            # Splice the edits in; everything before the first one is kept as is.
+            edits.sort()
+            start = edits[0][0]
+            f.seek(0)
+            head = f.read(start)
+            tail = f.read()
+            out = bytearray(head)
+            cursor = start
+            shifts: list[tuple[int, int]] = []
+            for edit_offset, edit_length, text in edits:
+                encoded = text.encode("utf-8")
+                out += tail[cursor - start : edit_offset - start] + encoded
+                cursor = edit_offset + edit_length
+                shifts.append((edit_offset, len(encoded) - edit_length))
+            out += tail[cursor - start :]
+        _atomic_write(path, bytes(out))
+
+        # Move the offsets of everything after each edit by its size change.
+        spans = list(index["rows"].values()) + list(index["summary"].values())
+        spans += [r[5] for r in index["rows"].values() if r[5]]
+        for span in {id(span): span for span in spans}.values():
+            delta = sum(d for at, d in shifts if span[0] > at)
+            length_delta = sum(d for at, d in shifts if span[0] == at)
+            span[0] += delta
+            span[1] += length_delta
+        _save_task_index(dest, path, index)
+
+        phase_file = dest / DESIGN_DIR / "tasks" / f"phase-{phase}.md"
+        phase_updated = bool(phase) and _set_phase_file_status(
+            phase_file, task_id, new_status
+        )
+
+    return {
+        "id": task_id,
+        "phase": int(phase) if phase else None,
+        "previous": old_status,
+        "status": new_status,
+        "summaryUpdated": bool(summary),
+        "phaseFileUpdated": phase_updated,
+        "indexCached": cached,
+    }
+
+
+def run_tasks(
+    dest: pathlib.Path, positionals: list[str], assignee: str | None = None
+) -> int:
+    if not positionals or positionals[0] != "set" or len(positionals) < 3:
+        _print_error('Usage: magic-spec tasks set <ID> <Status> (e.g. T-1A01 "Done")')
+        return 1
+    task_id = positionals[1].strip("[]").upper()
+    try:
+        result = set_task_status(dest, task_id, " ".join(positionals[2:]), assignee)
+    except (LookupError, ValueError, TimeoutError) as e:
+        _print_error(f"Error: {e}.")
+        return 1
+    _REPORT.result = result
+    _REPORT.files_written.append(f"{DESIGN_DIR}/TASKS.md")
+    if result["phaseFileUpdated"]:
+        _REPORT.files_written.append(f"{DESIGN_DIR}/tasks/phase-{result['phase']}.md")
+    print(f"✅ {task_id}: {result['previous']} → {result['status']}")
+    return 0
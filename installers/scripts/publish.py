@@ -6,26 +6,32 @@ Bumps versions in:
 - installers/python/magic_spec/__init__.py
 - package.json
 
-Then commits, tags, and publishes.
+Compiles the .design/CHANGELOG.md draft into a CHANGELOG.md release block,
+renders every adapter into a pre-built bundle (installers/bundles/ plus a
+versioned tarball in dist/), then commits, tags, and publishes.
 """
 
 from __future__ import annotations
 
 import argparse
+import importlib
+import json
 import os
 import re
+import shutil
 import subprocess
+import sys
+import tarfile
 from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).parent.parent.parent
+INSTALLER_PYTHON_DIR = PROJECT_ROOT / "installers" / "python"
 
 
 def load_config() -> dict:
     config_path = PROJECT_ROOT / "installers" / "config.json"
     if not config_path.exists():
         return {}
-    import json
-
     return json.loads(config_path.read_text(encoding="utf-8"))
 
 
@@ -174,6 +180,62 @@ def update_docs_versions(old_version: str, new_version: str) -> list[str]:
     return modified_files
 
 
+def load_installer_module(name: str):
+    """Imports magic_spec.<name> from this checkout's installer sources."""
+    if str(INSTALLER_PYTHON_DIR) not in sys.path:
+        sys.path.insert(0, str(INSTALLER_PYTHON_DIR))
+    return importlib.import_module(f"magic_spec.{name}")
+
+
+def compile_changelog(version: str, dry_run: bool) -> list[str]:
+    """Turns the .design/CHANGELOG.md draft into the release's CHANGELOG.md block."""
+    print("\nCompiling changelog...")
+    changelog = load_installer_module("changelog")
+    result = changelog.compile_changelog_release(PROJECT_ROOT, version, dry_run=dry_run)
+    if result.get("reason") == "released":
+        print(f"CHANGELOG.md already has [{version}]")
+        return []
+    if result.get("reason") == "empty":
+        print("No draft entries to compile")
+        return []
+    if dry_run:
+        print(f"  [Dry Run] prepend to CHANGELOG.md:\n{result['text']}")
+        return []
+    print(f"Added [{version}] to CHANGELOG.md ({result['entries']} entries)")
+    return ["CHANGELOG.md", ".design/CHANGELOG.md"]
+
+
+def build_adapter_bundles(version: str, dist_dir: Path, dry_run: bool) -> list[str]:
+    """Pre-renders every adapter so installers copy files instead of converting them."""
+    print("\nRendering adapter bundles...")
+    bundles_rel = CONFIG.get("adapterBundlesDir", "installers/bundles")
+    bundles_dir = PROJECT_ROOT / bundles_rel
+    archive_path = dist_dir / f"magic-spec-adapters-v{version}.tar.gz"
+    adapters = json.loads(
+        (PROJECT_ROOT / "installers" / "adapters.json").read_text(encoding="utf-8")
+    )
+
+    if dry_run:
+        print(f"  [Dry Run] render {len(adapters)} adapters into {bundles_rel}/")
+        print(f"  [Dry Run] pack {archive_path.relative_to(PROJECT_ROOT)}")
+        return []
+
+    if bundles_dir.exists():
+        shutil.rmtree(bundles_dir)
+    manifest = load_installer_module("adapters").build_adapter_bundle(
+        PROJECT_ROOT, adapters, bundles_dir, version
+    )
+    file_count = sum(len(a["files"]) for a in manifest["adapters"].values())
+    print(f"Rendered {file_count} files for {len(manifest['adapters'])} adapters")
+
+    dist_dir.mkdir(exist_ok=True)
+    with tarfile.open(archive_path, "w:gz") as tar:
+        tar.add(bundles_dir, arcname=f"magic-spec-adapters-v{version}")
+    print(f"Packed {archive_path.name}")
+
+    return [bundles_rel]
+
+
 def commit_and_tag(version: str, docs_files: list[str], dry_run: bool) -> None:
     tag = f"v{version}"
     print(f"\nCommitting changes and creating tag {tag}...")
@@ -302,8 +364,6 @@ def main() -> None:
         version = get_magic_version_target().lstrip("v")
         old_version = get_current_old_version().lstrip("v")
         if not version or not old_version:
-            import sys
-
             print(
                 "Error: Could not autodetect versions from .magic/.version and pyproject.toml."
             )
@@ -331,6 +391,10 @@ def main() -> None:
         update_magic_version(version)
         docs_files = update_docs_versions(old_version, version)
 
+    docs_files.extend(compile_changelog(version, args.dry_run))
+
+    docs_files.extend(build_adapter_bundles(version, dist_dir, args.dry_run))
+
     commit_and_tag(version, docs_files, args.dry_run)
 
     if args.skip_publish:
@@ -0,0 +1,966 @@
+import asyncio
+import contextlib
+import errno
+import http.client
+import io
+import json
+import os
+import shutil
+import socket
+import sys
+import tarfile
+import tempfile
+import threading
+import unittest
+import urllib.error
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "installers" / "python"))
+import magic_spec.__main__ as mp  # noqa: E402
+from magic_spec import adapters, backups, core, download, fsio  # noqa: E402
+
+
+class TestBulkWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.src = self.tmp_dir / "src"
+        self.dst = self.tmp_dir / "dst"
+        (self.src / "scripts").mkdir(parents=True)
+        (self.src / "spec.md").write_bytes(b"# Spec\n" * 100)
+        (self.src / "scripts" / "init.sh").write_bytes(b"#!/bin/bash\necho ok\n")
+        os.chmod(self.src / "scripts" / "init.sh", 0o755)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_copies_then_skips_identical_content(self):
+        writer = fsio.BulkWriter()
+        writer.copy_tree(self.src, self.dst)
+        self.assertEqual(writer.files_written, 2)
+        self.assertEqual(
+            (self.dst / "spec.md").read_bytes(), (self.src / "spec.md").read_bytes()
+        )
+        if os.name != "nt":
+            self.assertTrue(os.access(self.dst / "scripts" / "init.sh", os.X_OK))
+
+        second = fsio.BulkWriter()
+        second.copy_tree(self.src, self.dst)
+        self.assertEqual(second.files_written, 0)
+        self.assertEqual(second.files_skipped, 2)
+        self.assertEqual(second.bytes_skipped, writer.bytes_copied)
+
+    def test_rewrite_breaks_hardlinks(self):
+        target = self.dst / "spec.md"
+        self.dst.mkdir()
+        target.write_bytes(b"old")
+        linked = self.tmp_dir / "linked.md"
+        os.link(target, linked)
+
+        writer = fsio.BulkWriter()
+        self.assertTrue(writer.write_bytes(target, b"new content"))
+        self.assertEqual(target.read_bytes(), b"new content")
+        self.assertEqual(linked.read_bytes(), b"old")
+        self.assertEqual(writer.bytes_copied, len(b"new content"))
+
+
+class TestAtomicWrite(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_replaces_content_and_keeps_mode(self):
+        target = self.tmp_dir / "CONTEXT.md"
+        target.write_text("old", encoding="utf-8")
+        os.chmod(target, 0o640)
+        fsio._atomic_write(target, "new\n")
+        self.assertEqual(target.read_text(encoding="utf-8"), "new\n")
+        if os.name != "nt":
+            self.assertEqual(target.stat().st_mode & 0o777, 0o640)
+        self.assertEqual(os.listdir(self.tmp_dir), ["CONTEXT.md"])
+
+    def test_failed_write_leaves_target_intact(self):
+        target = self.tmp_dir / ".checksums"
+        target.write_bytes(b"{}")
+        with patch.object(os, "replace", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                fsio._atomic_write(target, b'{"a": 1}')
+        self.assertEqual(target.read_bytes(), b"{}")
+        self.assertEqual(os.listdir(self.tmp_dir), [".checksums"])
+
+
+def make_source_tree(root: Path, spec_text: str = "# Spec v1") -> Path:
+    """Creates a minimal extracted payload with engine files and one workflow."""
+    (root / ".magic" / "scripts").mkdir(parents=True)
+    (root / ".magic" / "spec.md").write_text(spec_text, encoding="utf-8")
+    (root / ".magic" / "task.md").write_text("# Task", encoding="utf-8")
+    (root / ".magic" / ".version").write_text("1.3.2", encoding="utf-8")
+    workflows = root / ".agent" / "workflows"
+    workflows.mkdir(parents=True)
+    (workflows / "magic.spec.md").write_text("# Spec workflow", encoding="utf-8")
+    return root
+
+
+def run_main(dest: Path, source: Path, args: list) -> None:
+    """Runs main() in `dest` with the download replaced by a local source tree."""
+    old_cwd = os.getcwd()
+    os.chdir(dest)
+    try:
+        with patch.object(sys, "argv", ["magic-spec"] + args), patch.object(
+            mp, "download_and_extract", return_value=source
+        ), patch.object(mp, "run_init"), patch.dict(
+            os.environ, {"MAGIC_SPEC_CACHE_DIR": str(dest.parent / "cache")}
+        ):
+            mp.main()
+    finally:
+        os.chdir(old_cwd)
+
+
+class TestInstallerConfig(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.config = json.loads(
+            (PROJECT_ROOT / "installers" / "config.json").read_text(encoding="utf-8")
+        )
+
+    def load(self, section: str, key: str, value) -> dict:
+        config = json.loads(json.dumps(self.config))
+        config.setdefault(section, {})[key] = value
+        path = self.tmp_dir / "config.json"
+        path.write_text(json.dumps(config), encoding="utf-8")
+        with patch.object(core, "_find_installer_config_path", return_value=path):
+            return core._load_installer_config()
+
+    def test_rejects_invalid_download_backup_and_release_settings(self):
+        for section, key, value in [
+            ("download", "chunks", "4"),
+            ("download", "chunks", 0),
+            ("download", "retries", -1),
+            ("download", "backoffMs", 1.5),
+            ("download", "format", "rar"),
+            ("backup", "keep", "5"),
+            ("backup", "keep", 0),
+            ("backup", "maxBytes", 0),
+            ("backup", "dir", ""),
+            ("releases", "timeoutMs", 0),
+            ("releases", "cacheTtlSeconds", None),
+            ("releases", "endpoint", 42),
+        ]:
+            with self.subTest(field=f"{section}.{key}", value=value):
+                with self.assertRaisesRegex(RuntimeError, f"'{section}.{key}'"):
+                    self.load(section, key, value)
+
+    def test_accepts_zero_retries_and_backoff(self):
+        config = self.load("download", "retries", 0)
+        self.assertEqual(config["download"]["retries"], 0)
+        config = self.load("download", "backoffMs", 0)
+        self.assertEqual(config["download"]["backoffMs"], 0)
+
+
+class TestStagedInstall(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.dest = self.tmp_dir / "project"
+        self.dest.mkdir()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_install_and_update_swap_complete_trees(self):
+        source = make_source_tree(self.tmp_dir / "v1")
+        run_main(self.dest, source, ["--yes"])
+
+        magic = self.dest / ".magic"
+        self.assertEqual((magic / "spec.md").read_text(encoding="utf-8"), "# Spec v1")
+        checksums = json.loads((magic / ".checksums").read_text(encoding="utf-8"))
+        self.assertIn("spec.md", checksums)
+        self.assertTrue((self.dest / ".agent" / "workflows" / "magic.spec.md").exists())
+
+        # Files the installer does not manage survive the swap.
+        (magic / "local-notes.md").write_text("keep me", encoding="utf-8")
+        source_v2 = make_source_tree(self.tmp_dir / "v2", spec_text="# Spec v2")
+        run_main(self.dest, source_v2, ["--update", "--yes"])
+
+        self.assertEqual((magic / "spec.md").read_text(encoding="utf-8"), "# Spec v2")
+        self.assertEqual(
+            (magic / "local-notes.md").read_text(encoding="utf-8"), "keep me"
+        )
+        leftovers = [p.name for p in self.dest.iterdir() if ".staging-" in p.name]
+        self.assertEqual(leftovers, [])
+
+    def test_failure_before_commit_leaves_target_untouched(self):
+        target = self.dest / ".magic"
+        target.mkdir()
+        (target / "spec.md").write_text("original", encoding="utf-8")
+
+        writer = fsio.BulkWriter()
+        with self.assertRaises(KeyboardInterrupt):
+            with fsio.StagedInstall(writer) as stage:
+                staged = stage.path_for(target)
+                writer.write_bytes(staged / "spec.md", b"half-written")
+                raise KeyboardInterrupt
+
+        self.assertEqual((target / "spec.md").read_text(encoding="utf-8"), "original")
+        self.assertEqual(sorted(p.name for p in self.dest.iterdir()), [".magic"])
+
+    def test_stale_staging_of_a_dead_owner_is_removed(self):
+        target = self.dest / ".magic"
+        target.mkdir()
+        dead = self.dest / ".magic.staging-4000001"
+        live = self.dest / ".magic.staging-4000002"
+        dead.mkdir()
+        live.mkdir()
+
+        with patch.object(fsio, "_pid_alive", lambda pid: pid == 4000002):
+            with fsio.StagedInstall(fsio.BulkWriter()) as stage:
+                stage.path_for(target)
+                self.assertFalse(dead.exists())
+                self.assertTrue(live.exists())
+
+    def test_windows_liveness_uses_the_process_handle(self):
+        class FakeKernel32:
+            def __init__(self, handle, error=0, exit_code=0):
+                self.handle, self.error, self.exit_code = handle, error, exit_code
+                self.closed = []
+
+            def OpenProcess(self, access, inherit, pid):
+                return self.handle
+
+            def GetLastError(self):
+                return self.error
+
+            def GetExitCodeProcess(self, handle, code):
+                code._obj.value = self.exit_code
+                return 1
+
+            def CloseHandle(self, handle):
+                self.closed.append(handle)
+
+        # No such process, exited process, running process, access denied.
+        self.assertFalse(fsio._windows_pid_alive(1, FakeKernel32(0, error=87)))
+        exited = FakeKernel32(7, exit_code=0)
+        self.assertFalse(fsio._windows_pid_alive(1, exited))
+        self.assertEqual(exited.closed, [7])
+        self.assertTrue(fsio._windows_pid_alive(1, FakeKernel32(7, exit_code=259)))
+        self.assertTrue(fsio._windows_pid_alive(1, FakeKernel32(0, error=5)))
+
+    def test_staging_a_parent_adopts_nested_staged_tree(self):
+        agent = self.dest / ".agent"
+        (agent / "workflows").mkdir(parents=True)
+        (agent / "workflows" / "magic.spec.md").write_text("old", encoding="utf-8")
+        (agent / "notes.md").write_text("keep me", encoding="utf-8")
+
+        writer = fsio.BulkWriter()
+        with fsio.StagedInstall(writer) as stage:
+            workflows = stage.path_for(agent / "workflows")
+            writer.write_bytes(workflows / "magic.spec.md", b"new")
+            # e.g. `--env antigravity,bogus`: the fallback stages .agent itself.
+            staged_agent = stage.path_for(agent)
+            self.assertEqual(
+                stage.path_for(agent / "workflows"), staged_agent / "workflows"
+            )
+            writer.write_bytes(staged_agent / "workflows" / "magic.run.md", b"run")
+            stage.commit()
+
+        self.assertEqual(
+            (agent / "workflows" / "magic.spec.md").read_text(encoding="utf-8"), "new"
+        )
+        self.assertTrue((agent / "workflows" / "magic.run.md").exists())
+        self.assertEqual((agent / "notes.md").read_text(encoding="utf-8"), "keep me")
+        self.assertEqual(
+            sorted(p.name for p in agent.iterdir()), ["notes.md", "workflows"]
+        )
+        self.assertEqual(sorted(p.name for p in self.dest.iterdir()), [".agent"])
+
+
+class TestAdapterStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.dest = self.tmp_dir / "project"
+        self.dest.mkdir()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "symlinks unsupported")
+    def test_adapters_share_one_copy_per_format(self):
+        source = make_source_tree(self.tmp_dir / "v1")
+        run_main(
+            self.dest, source, ["--yes", "--link-adapters", "--cursor", "--claude"]
+        )
+
+        store = self.dest / ".magic" / "rendered" / "md" / "spec.md"
+        cursor = self.dest / ".cursor" / "commands" / "spec.md"
+        claude = self.dest / ".claude" / "commands" / "spec.md"
+        self.assertEqual(store.read_text(encoding="utf-8"), "# Spec workflow")
+        for linked in (cursor, claude):
+            self.assertTrue(linked.is_symlink())
+            self.assertEqual(linked.resolve(), store.resolve())
+        rc = json.loads((self.dest / ".magicrc").read_text(encoding="utf-8"))
+        self.assertTrue(rc["linkAdapters"])
+
+        # --update rewrites the store once and both adapters follow it.
+        source_v2 = make_source_tree(self.tmp_dir / "v2")
+        (source_v2 / ".agent" / "workflows" / "magic.spec.md").write_text(
+            "# Spec workflow v2", encoding="utf-8"
+        )
+        run_main(self.dest, source_v2, ["--update", "--yes"])
+        self.assertTrue(cursor.is_symlink())
+        self.assertEqual(claude.read_text(encoding="utf-8"), "# Spec workflow v2")
+
+        with self.assertRaises(SystemExit):
+            run_main(self.dest, source_v2, ["--eject", "--yes"])
+        self.assertFalse(claude.is_symlink())
+        self.assertEqual(claude.read_text(encoding="utf-8"), "# Spec workflow v2")
+
+    def test_update_refreshes_only_changed_unedited_adapter_files(self):
+        run_main(
+            self.dest,
+            make_source_tree(self.tmp_dir / "v1"),
+            ["--yes", "--cursor", "--claude"],
+        )
+        manifest = adapters.load_adapter_manifest(self.dest)
+        self.assertEqual(set(manifest["adapters"]["cursor"]["files"]), {"spec.md"})
+        cursor = self.dest / ".cursor" / "commands" / "spec.md"
+        claude = self.dest / ".claude" / "commands" / "spec.md"
+        claude.write_text("# My spec workflow", encoding="utf-8")
+
+        source_v2 = make_source_tree(self.tmp_dir / "v2")
+        (source_v2 / ".agent" / "workflows" / "magic.spec.md").write_text(
+            "# Spec workflow v2", encoding="utf-8"
+        )
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+            run_main(self.dest, source_v2, ["--update", "--yes", "--json"])
+        refresh = json.loads(out.getvalue())["result"]["adapterRefresh"]
+        self.assertEqual(refresh["updated"], [".cursor/commands/spec.md"])
+        self.assertEqual(refresh["kept"], [".claude/commands/spec.md"])
+        self.assertEqual(cursor.read_text(encoding="utf-8"), "# Spec workflow v2")
+        self.assertEqual(claude.read_text(encoding="utf-8"), "# My spec workflow")
+
+        # Nothing changed upstream since: no adapter file is rewritten.
+        mtime = cursor.stat().st_mtime_ns
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+            run_main(self.dest, source_v2, ["--update", "--yes", "--json"])
+        refresh = json.loads(out.getvalue())["result"]["adapterRefresh"]
+        self.assertEqual(refresh["updated"], [])
+        self.assertEqual(refresh["unchanged"], 1)
+        self.assertEqual(cursor.stat().st_mtime_ns, mtime)
+
+    def test_copy_fallback_without_symlinks(self):
+        writer = fsio.BulkWriter()
+        dst = self.dest / "adapter" / "spec.md"
+        with patch.object(
+            os, "symlink", side_effect=OSError("not permitted")
+        ), patch.object(fsio.BulkWriter, "_use_symlink", True):
+            self.assertTrue(writer.link_file(dst, "../store/spec.md", b"# Spec"))
+            self.assertFalse(fsio.BulkWriter._use_symlink)
+        self.assertFalse(dst.is_symlink())
+        self.assertEqual(dst.read_bytes(), b"# Spec")
+
+
+class TestProfile(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.dest = self.tmp_dir / "project"
+        self.dest.mkdir()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_profile_writes_phase_trace(self):
+        source = make_source_tree(self.tmp_dir / "v1")
+        trace_path = self.tmp_dir / "trace.json"
+        run_main(self.dest, source, ["--yes", f"--profile={trace_path}", "--cprofile"])
+
+        trace = json.loads(trace_path.read_text(encoding="utf-8"))
+        self.assertEqual(trace["schemaVersion"], core.TRACE_SCHEMA_VERSION)
+        self.assertEqual(trace["exit_code"], 0)
+        for phase in ("download", "copy-engine", "adapters", "checksums", "commit"):
+            self.assertIn(phase, trace["phases"])
+        spans = {span["name"]: span for span in trace["spans"]}
+        self.assertGreater(spans["copy-engine"]["attrs"]["files_written"], 0)
+        self.assertTrue(trace["cprofile"])
+        self.assertTrue(trace_path.with_suffix(".prof").exists())
+
+    def test_profile_env_var_covers_command_modes(self):
+        trace_path = self.tmp_dir / "check.json"
+        with patch.dict(os.environ, {"MAGIC_SPEC_PROFILE": str(trace_path)}):
+            with self.assertRaises(SystemExit):
+                run_main(self.dest, self.tmp_dir, ["--check", "--offline"])
+        trace = json.loads(trace_path.read_text(encoding="utf-8"))
+        self.assertEqual(list(trace["phases"]), ["check"])
+
+
+class TestJsonOutput(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.dest = self.tmp_dir / "project"
+        self.dest.mkdir()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def run_json(self, args: list) -> dict:
+        shutil.rmtree(self.tmp_dir / "src", ignore_errors=True)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+            try:
+                run_main(self.dest, make_source_tree(self.tmp_dir / "src"), args)
+            except SystemExit:
+                pass
+        return json.loads(out.getvalue())
+
+    def test_install_report(self):
+        report = self.run_json(["--yes", "--json"])
+        self.assertEqual(report["schemaVersion"], core.REPORT_SCHEMA_VERSION)
+        self.assertEqual(report["command"], "install")
+        self.assertTrue(report["ok"])
+        self.assertIn(".magic/spec.md", report["filesWritten"])
+        self.assertNotIn(".staging-", " ".join(report["filesWritten"]))
+        self.assertGreater(report["result"]["filesWritten"], 0)
+        self.assertIn("download", report["timings"]["phases"])
+
+    def test_minify_is_reported_and_remembered(self):
+        report = self.run_json(["--yes", "--minify", "--json"])
+        self.assertIn("default", report["result"]["minified"])
+        rc = json.loads((self.dest / ".magicrc").read_text(encoding="utf-8"))
+        self.assertEqual(rc["minify"], {"strip": []})
+
+    def test_command_reports(self):
+        report = self.run_json(["--list-envs", "--json"])
+        self.assertEqual(report["command"], "list-envs")
+        self.assertTrue(report["result"]["environments"])
+
+        report = self.run_json(["info", "--json"])
+        self.assertEqual(report["result"]["installedVersion"], None)
+        self.assertFalse(report["result"]["engine"])
+
+        report = self.run_json(["--rollback", "--json"])
+        self.assertFalse(report["ok"])
+        self.assertEqual(report["exitCode"], 1)
+        self.assertTrue(report["errors"][0].startswith("no backups found"))
+
+    @unittest.skipIf(sys.platform == "win32", "doctor runs the .ps1 script there")
+    def test_failing_doctor_script_is_reported(self):
+        scripts = self.dest / ".magic" / "scripts"
+        scripts.mkdir(parents=True)
+        (scripts / "check-prerequisites.sh").write_text(
+            "echo boom >&2\nexit 3\n", encoding="utf-8"
+        )
+        report = self.run_json(["--doctor", "--json"])
+        self.assertEqual(report["command"], "doctor")
+        self.assertFalse(report["ok"])
+        self.assertEqual(
+            report["errors"], ["doctor prerequisite script failed with code 3."]
+        )
+
+
+class TestBackupStore(unittest.TestCase):
+    def setUp(self):
+        self.dest = Path(tempfile.mkdtemp())
+        self.magic = self.dest / ".magic"
+        self.magic.mkdir()
+        (self.magic / ".version").write_text("1.0.0", encoding="utf-8")
+        (self.magic / "spec.md").write_text("spec v1", encoding="utf-8")
+        (self.magic / "task.md").write_text("task", encoding="utf-8")
+
+    def tearDown(self):
+        shutil.rmtree(self.dest)
+
+    def objects(self):
+        store = self.dest / core.BACKUP_DIR / "objects"
+        return sorted(p for p in store.rglob("*") if p.is_file())
+
+    def test_generations_share_unchanged_objects(self):
+        self.assertEqual(backups.create_backup(self.dest), 1)
+        self.assertEqual(len(self.objects()), 3)
+
+        # Nothing changed: no new generation, no new objects.
+        self.assertEqual(backups.create_backup(self.dest), 1)
+
+        (self.magic / "spec.md").unlink()
+        (self.magic / "spec.md").write_text("spec v2", encoding="utf-8")
+        self.assertEqual(backups.create_backup(self.dest), 2)
+        self.assertEqual(len(self.objects()), 4)
+
+    def test_rollback_restores_exact_generation(self):
+        backups.create_backup(self.dest)
+        (self.magic / "spec.md").unlink()
+        (self.magic / "spec.md").write_text("spec v2", encoding="utf-8")
+        (self.magic / "extra.md").write_text("new file", encoding="utf-8")
+
+        self.assertEqual(backups.run_rollback(self.dest, 1), 0)
+        self.assertEqual(
+            (self.magic / "spec.md").read_text(encoding="utf-8"), "spec v1"
+        )
+        self.assertFalse((self.magic / "extra.md").exists())
+        # The pre-rollback state was kept as generation 2.
+        self.assertEqual(backups._list_generations(self.dest / core.BACKUP_DIR), [1, 2])
+        self.assertEqual(backups.run_rollback(self.dest, 7), 1)
+
+    def test_in_place_edit_does_not_reach_backup(self):
+        backups.create_backup(self.dest)
+        # Editors truncate and rewrite the same inode.
+        with open(self.magic / "spec.md", "r+", encoding="utf-8") as f:
+            f.truncate(0)
+            f.write("v2 EDITED!!")
+        obj = backups._backup_object_path(
+            self.dest / core.BACKUP_DIR, core._sha256_bytes(b"spec v1")
+        )
+        self.assertEqual(obj.read_bytes(), b"spec v1")
+        self.assertFalse(os.stat(obj).st_mode & 0o222)
+
+        self.assertEqual(backups.run_rollback(self.dest, 1), 0)
+        restored = self.magic / "spec.md"
+        self.assertEqual(restored.read_text(encoding="utf-8"), "spec v1")
+        self.assertTrue(os.stat(restored).st_mode & 0o200)
+        self.assertFalse(os.path.samestat(os.stat(restored), os.stat(obj)))
+
+        # Editing the restored file leaves the object intact too.
+        with open(restored, "r+", encoding="utf-8") as f:
+            f.write("SPEC")
+        self.assertEqual(obj.read_bytes(), b"spec v1")
+
+    def test_rollback_to_oldest_kept_generation(self):
+        with patch.object(backups, "BACKUP_KEEP", 2):
+            for i in range(3):
+                (self.magic / "spec.md").unlink()
+                (self.magic / "spec.md").write_text(f"spec {i}", encoding="utf-8")
+                backups.create_backup(self.dest)
+            store = self.dest / core.BACKUP_DIR
+            self.assertEqual(backups._list_generations(store), [2, 3])
+            (self.magic / "spec.md").unlink()
+            (self.magic / "spec.md").write_text("edited", encoding="utf-8")
+
+            # The pre-rollback snapshot must not prune generation 2 first.
+            self.assertEqual(backups.run_rollback(self.dest, 2), 0)
+            self.assertEqual(
+                (self.magic / "spec.md").read_text(encoding="utf-8"), "spec 1"
+            )
+            self.assertEqual(backups._list_generations(store), [3, 4])
+            self.assertEqual(backups.run_rollback(self.dest, 4), 0)
+            self.assertEqual(
+                (self.magic / "spec.md").read_text(encoding="utf-8"), "edited"
+            )
+
+    def test_prune_keeps_newest_generations(self):
+        with patch.object(backups, "BACKUP_KEEP", 2):
+            for i in range(4):
+                (self.magic / "spec.md").unlink()
+                (self.magic / "spec.md").write_text(f"spec {i}", encoding="utf-8")
+                backups.create_backup(self.dest)
+        store = self.dest / core.BACKUP_DIR
+        self.assertEqual(backups._list_generations(store), [3, 4])
+        # Objects only referenced by pruned generations are collected.
+        self.assertEqual(len(self.objects()), 4)
+
+
+def make_payload_tarball(files: dict, root: str = "magic-spec-9.9.9") -> bytes:
+    """Builds an in-memory .tar.gz laid out like a GitHub archive."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(f"{root}/{name}" if root else name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+class FakeResponse(io.BytesIO):
+    status = 200
+    headers: dict = {}
+
+
+class TestPayloadPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        env = patch.dict(os.environ, {"MAGIC_SPEC_CACHE_DIR": str(self.tmp_dir)})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_streams_selected_members_and_hashes_them(self):
+        files = {
+            ".magic/spec.md": b"# Spec",
+            ".agent/workflows/magic.spec.md": b"# Workflow",
+            "installers/adapters.json": b"{}",
+            "docs/README.md": b"not needed by the installer",
+        }
+        seen = []
+        payload = make_payload_tarball(files)
+        archive_sha256, digests = asyncio.run(
+            download._run_payload_pipeline(
+                lambda: io.BytesIO(payload),
+                self.tmp_dir,
+                lambda rel, data: seen.append(rel),
+            )
+        )
+        self.assertEqual(archive_sha256, core._sha256_bytes(payload))
+        root = self.tmp_dir / "magic-spec-9.9.9"
+        self.assertEqual((root / ".magic" / "spec.md").read_bytes(), b"# Spec")
+        self.assertFalse((root / "docs").exists())
+        self.assertEqual(digests[".magic/spec.md"], core._sha256_bytes(b"# Spec"))
+        self.assertEqual(sorted(seen), sorted(digests))
+        self.assertNotIn("docs/README.md", digests)
+
+    def test_rejects_path_traversal(self):
+        payload = make_payload_tarball({"../evil.md": b"x"}, root="")
+        with self.assertRaises(RuntimeError):
+            asyncio.run(
+                download._run_payload_pipeline(
+                    lambda: io.BytesIO(payload), self.tmp_dir / "out"
+                )
+            )
+        self.assertFalse((self.tmp_dir / "evil.md").exists())
+
+    def test_failed_extraction_stops_the_download(self):
+        payload = make_payload_tarball(
+            {"../evil.md": b"x", ".magic/big.bin": os.urandom(8 * 1024 * 1024)},
+            root="",
+        )
+        read = []
+
+        class CountingSource(io.BytesIO):
+            def read(self, size=-1):
+                data = super().read(size)
+                read.append(len(data))
+                return data
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(
+                download._run_payload_pipeline(
+                    lambda: CountingSource(payload), self.tmp_dir / "out"
+                )
+            )
+        # Only what was already queued was read, not the rest of the body.
+        self.assertLess(sum(read), len(payload) // 2)
+
+    def test_only_network_errors_are_transient(self):
+        transient = [
+            urllib.error.URLError("unreachable"),
+            urllib.error.HTTPError("u", 503, "unavailable", {}, None),
+            ConnectionResetError(),
+            socket.timeout(),
+            http.client.IncompleteRead(b""),
+        ]
+        permanent = [
+            urllib.error.HTTPError("u", 404, "not found", {}, None),
+            OSError(errno.ENOSPC, "No space left on device"),
+            OSError(errno.EROFS, "Read-only file system"),
+            PermissionError(errno.EACCES, "Permission denied"),
+        ]
+        for error in transient:
+            self.assertTrue(download._is_transient(error), error)
+        for error in permanent:
+            self.assertFalse(download._is_transient(error), error)
+
+    def test_verify_payload_against_release_manifest(self):
+        root = self.tmp_dir / "src"
+        (root / ".magic").mkdir(parents=True)
+        (root / ".magic" / "spec.md").write_bytes(b"# Spec")
+        adapters.build_adapter_bundle(
+            root, {}, root / core.ADAPTER_BUNDLES_DIR, "9.9.9"
+        )
+        good = {".magic/spec.md": core._sha256_bytes(b"# Spec")}
+
+        self.assertEqual(download._verify_payload(root, "9.9.9", good), 1)
+        # A manifest from another release (e.g. on main) is not trusted.
+        self.assertEqual(download._verify_payload(root, "main", {}), 0)
+        with self.assertRaises(download.PayloadIntegrityError):
+            download._verify_payload(root, "9.9.9", {".magic/spec.md": "0" * 64})
+        with self.assertRaises(download.PayloadIntegrityError):
+            download._verify_payload(root, "9.9.9", {})
+
+    def test_download_checks_archive_digest(self):
+        payload = make_payload_tarball({".magic/spec.md": b"# Spec"})
+        fake_open = lambda url, headers=None: FakeResponse(payload)  # noqa: E731
+        with patch.object(download, "_open_url", fake_open):
+            digests = {}
+            root = download.download_and_extract(
+                "9.9.9",
+                self.tmp_dir / "ok",
+                digests=digests,
+                expected_sha256=core._sha256_bytes(payload),
+            )
+            self.assertEqual((root / ".magic" / "spec.md").read_bytes(), b"# Spec")
+            self.assertIn(".magic/spec.md", digests)
+
+            with self.assertRaises(SystemExit):
+                download.download_and_extract(
+                    "9.9.9", self.tmp_dir / "bad", expected_sha256="0" * 64
+                )
+
+    def test_network_failure_is_reported_as_download_error(self):
+        def broken_source():
+            raise OSError("connection reset")
+
+        with self.assertRaises(download._PayloadDownloadError):
+            asyncio.run(download._run_payload_pipeline(broken_source, self.tmp_dir))
+
+
+def make_payload_zip(files: dict, root: str = "magic-spec-9.9.9") -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in files.items():
+            zf.writestr(f"{root}/{name}" if root else name, data)
+    return buf.getvalue()
+
+
+class RangeServer(ThreadingHTTPServer):
+    """
+    Serves one in-memory file, honouring single `Range: bytes=a-b` headers
+    (416 past the end) and `If-Range`; `etag=None` sends no ETag. Each entry of `drop_after` cuts one response after that
+    many bytes, like a flaky network.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, body: bytes, etag: str = '"v1"'):
+        super().__init__(("127.0.0.1", 0), RangeHandler)
+        self.body = body
+        self.etag = etag
+        self.ranges = []
+        self.drop_after = []
+        self.url = f"http://127.0.0.1:{self.server_address[1]}/payload.zip"
+        threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        body = server.body
+        header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if header and (if_range is None or if_range == server.etag):
+            first, last = header.split("=", 1)[1].split("-")
+            start, end = int(first), min(int(last or len(body) - 1), len(body) - 1)
+            if start >= len(body):
+                server.ranges.append((start, None))
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            server.ranges.append((start, end))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+            chunk = body[start : end + 1]
+        else:
+            self.send_response(200)
+            chunk = body
+        if server.etag:
+            self.send_header("ETag", server.etag)
+        self.send_header("Content-Length", str(len(chunk)))
+        self.end_headers()
+        if server.drop_after and len(chunk) > 1:
+            self.wfile.write(chunk[: server.drop_after.pop(0)])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(chunk)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestZipPayload(unittest.TestCase):
+    files = {
+        ".magic/spec.md": b"# Spec",
+        ".agent/workflows/magic.spec.md": b"# Workflow",
+        "docs/big.bin": os.urandom(600 * 1024),
+    }
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        env = patch.dict(os.environ, {"MAGIC_SPEC_CACHE_DIR": str(self.tmp_dir)})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_local_zip_extracts_only_installer_members(self):
+        archive = self.tmp_dir / "bundle.zip"
+        archive.write_bytes(make_payload_zip(self.files))
+        digests = {}
+        root = download.download_and_extract(
+            "9.9.9", self.tmp_dir / "out", digests=digests, local_payload=archive
+        )
+        self.assertEqual((root / ".magic" / "spec.md").read_bytes(), b"# Spec")
+        self.assertFalse((root / "docs").exists())
+        self.assertEqual(
+            sorted(digests), [".agent/workflows/magic.spec.md", ".magic/spec.md"]
+        )
+
+    def test_rejects_zip_path_traversal(self):
+        archive = io.BytesIO(make_payload_zip({"../evil.md": b"x"}, root=""))
+        with self.assertRaises(RuntimeError):
+            download._extract_zip_payload(archive, self.tmp_dir / "out")
+
+    def test_remote_zip_uses_range_requests(self):
+        body = make_payload_zip(self.files)
+        server = RangeServer(body)
+        self.addCleanup(server.close)
+
+        digests = download._fetch_payload(server.url, "zip", self.tmp_dir)[1]
+        self.assertIn(".magic/spec.md", digests)
+        fetched = sum(end - start + 1 for start, end in server.ranges)
+        # The incompressible docs/big.bin entry is never transferred.
+        self.assertLess(fetched, len(body) // 2)
+
+    def test_remote_zip_downloads_whole_archive_when_digest_needed(self):
+        body = make_payload_zip(self.files)
+        server = RangeServer(body)
+        self.addCleanup(server.close)
+
+        archive_sha256, digests = download._fetch_payload(
+            server.url, "zip", self.tmp_dir, need_archive_digest=True
+        )
+        self.assertEqual(archive_sha256, core._sha256_bytes(body))
+        self.assertEqual(server.ranges, [])
+        self.assertIn(".magic/spec.md", digests)
+
+
+class TestResumableDownload(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        env = patch.dict(os.environ, {"MAGIC_SPEC_CACHE_DIR": str(self.tmp_dir)})
+        env.start()
+        self.addCleanup(env.stop)
+        no_sleep = patch.object(download, "DOWNLOAD_BACKOFF_SECONDS", 0)
+        no_sleep.start()
+        self.addCleanup(no_sleep.stop)
+        self.payload = make_payload_tarball(
+            {".magic/spec.md": b"# Spec", "docs/big.bin": os.urandom(300 * 1024)}
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def fetch(self, server, **kwargs):
+        return download._fetch_payload(
+            server.url, "tar.gz", self.tmp_dir / "out", **kwargs
+        )
+
+    def test_dropped_connection_resumes_with_range(self):
+        server = RangeServer(self.payload)
+        self.addCleanup(server.close)
+        server.drop_after = [100 * 1024, 50 * 1024]
+
+        archive_sha256, digests = self.fetch(server)
+        self.assertEqual(archive_sha256, core._sha256_bytes(self.payload))
+        self.assertIn(".magic/spec.md", digests)
+        self.assertEqual(
+            [start for start, _ in server.ranges], [100 * 1024, 150 * 1024]
+        )
+        self.assertFalse(download._payload_part_path(server.url).exists())
+
+    def test_gives_up_after_configured_retries(self):
+        server = RangeServer(self.payload)
+        self.addCleanup(server.close)
+        # Retries are counted per stall: progress resets the budget.
+        server.drop_after = [1024] + [0] * 10
+
+        with patch.object(download, "DOWNLOAD_RETRIES", 2):
+            with self.assertRaises(download._PayloadDownloadError):
+                self.fetch(server)
+        self.assertEqual(len(server.ranges), 2)
+        # The part file survives for the next run.
+        self.assertEqual(download._payload_part_path(server.url).stat().st_size, 1024)
+
+    def test_part_file_from_earlier_run_is_resumed(self):
+        server = RangeServer(self.payload)
+        self.addCleanup(server.close)
+        part = download._payload_part_path(server.url)
+        part.parent.mkdir(parents=True)
+        part.write_bytes(self.payload[:4096])
+        download._write_part_meta(part, {"url": server.url, "etag": server.etag})
+
+        archive_sha256, _ = self.fetch(server)
+        self.assertEqual(archive_sha256, core._sha256_bytes(self.payload))
+        self.assertEqual(server.ranges, [(4096, len(self.payload) - 1)])
+
+    def test_stale_part_file_is_replaced(self):
+        server = RangeServer(self.payload, etag='"v2"')
+        self.addCleanup(server.close)
+        part = download._payload_part_path(server.url)
+        part.parent.mkdir(parents=True)
+        part.write_bytes(b"x" * 4096)
+        download._write_part_meta(part, {"url": server.url, "etag": '"v1"'})
+
+        archive_sha256, _ = self.fetch(server)
+        self.assertEqual(archive_sha256, core._sha256_bytes(self.payload))
+
+    def test_complete_part_file_is_used_without_range_past_end(self):
+        server = RangeServer(self.payload)
+        self.addCleanup(server.close)
+        part = download._payload_part_path(server.url)
+        part.parent.mkdir(parents=True)
+        # Left by a run interrupted during extraction, with metadata from
+        # before the total was recorded: the server answers 416.
+        part.write_bytes(self.payload)
+        download._write_part_meta(part, {"url": server.url, "etag": server.etag})
+
+        archive_sha256, _ = self.fetch(server)
+        self.assertEqual(archive_sha256, core._sha256_bytes(self.payload))
+        self.assertEqual(server.ranges, [(len(self.payload), None)])
+        self.assertFalse(part.exists())
+
+        # With the total recorded, no request is made at all.
+        part.write_bytes(self.payload)
+        download._write_part_meta(part, {"url": server.url, "total": len(self.payload)})
+        self.fetch(server)
+        self.assertEqual(len(server.ranges), 1)
+
+    def test_corrupt_complete_part_file_is_downloaded_again(self):
+        server = RangeServer(self.payload)
+        self.addCleanup(server.close)
+        part = download._payload_part_path(server.url)
+        part.parent.mkdir(parents=True)
+        part.write_bytes(b"x" * len(self.payload))
+        download._write_part_meta(
+            part, {"url": server.url, "etag": server.etag, "total": len(self.payload)}
+        )
+
+        archive_sha256, digests = self.fetch(server)
+        self.assertEqual(archive_sha256, core._sha256_bytes(self.payload))
+        self.assertIn(".magic/spec.md", digests)
+        self.assertFalse(part.exists())
+
+    def test_resumes_without_etag_when_content_range_matches(self):
+        server = RangeServer(self.payload, etag=None)
+        self.addCleanup(server.close)
+        server.drop_after = [100 * 1024]
+
+        archive_sha256, _ = self.fetch(server)
+        self.assertEqual(archive_sha256, core._sha256_bytes(self.payload))
+        self.assertEqual(server.ranges, [(100 * 1024, len(self.payload) - 1)])
+
+    def test_concurrent_chunks(self):
+        server = RangeServer(self.payload)
+        self.addCleanup(server.close)
+        server.drop_after = [0, 10 * 1024]
+
+        with patch.object(download, "_CHUNKED_MIN_BYTES", 0):
+            archive_sha256, digests = self.fetch(server, chunks=4)
+        self.assertEqual(archive_sha256, core._sha256_bytes(self.payload))
+        self.assertIn(".magic/spec.md", digests)
+        self.assertGreaterEqual(len(server.ranges), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,6 +6,7 @@ import subprocess
 import sys
 import json
 from pathlib import Path
+from unittest.mock import patch
 
 PROJECT_ROOT = Path(__file__).parent.parent.parent.absolute()
 
@@ -24,6 +25,12 @@ class TestIntegration(unittest.TestCase):
         self.tmp_dir = Path(tempfile.mkdtemp())
         self.old_cwd = os.getcwd()
         os.chdir(self.tmp_dir)
+        # Keep run metrics and caches of the CLI runs out of the user cache.
+        env = patch.dict(
+            os.environ, {"MAGIC_SPEC_CACHE_DIR": str(self.tmp_dir / ".cache")}
+        )
+        env.start()
+        self.addCleanup(env.stop)
 
     def tearDown(self):
         os.chdir(self.old_cwd)
@@ -204,6 +211,49 @@ class TestIntegration(unittest.TestCase):
         self.assertCommand(result)
         self.assertIn("magic-spec", result.stdout)
 
+    def test_list_envs_python_runs_offline(self):
+        """--list-envs reads the bundled adapters.json without downloading a payload."""
+        installer = (
+            PROJECT_ROOT / "installers" / "python" / "magic_spec" / "__main__.py"
+        )
+        env = os.environ.copy()
+        env["PYTHONPATH"] = str(PROJECT_ROOT / "installers" / "python")
+        env["PYTHONIOENCODING"] = "utf-8"
+        env["PYTHONUTF8"] = "1"
+        # An unroutable proxy makes any network access fail loudly.
+        env["HTTPS_PROXY"] = "http://127.0.0.1:9"
+        result = subprocess.run(
+            [sys.executable, str(installer), "--list-envs"],
+            capture_output=True,
+            text=True,
+            env=env,
+            encoding="utf-8",
+        )
+        self.assertCommand(result)
+        self.assertNotIn("Downloading", result.stdout)
+        self.assertIn("cursor", result.stdout)
+        self.assertIn(".github/prompts/", result.stdout)
+
+    def test_detect_environments_ranks_all_matches(self):
+        """Every detected adapter is returned; an existing dest dir ranks first."""
+        if str(PROJECT_ROOT / "installers" / "python") not in sys.path:
+            sys.path.append(str(PROJECT_ROOT / "installers" / "python"))
+        import magic_spec.__main__ as mp
+
+        adapters = {
+            "cursor": {"marker": ".cursor", "dest": ".cursor/commands", "ext": ".md"},
+            "copilot": {"marker": ".github", "dest": ".github/prompts", "ext": ".md"},
+            "other": {"marker": ".github", "dest": ".github/other", "ext": ".md"},
+            "claude": {"marker": ".claude", "dest": ".claude/commands", "ext": ".md"},
+        }
+        (self.tmp_dir / ".cursor").mkdir()
+        (self.tmp_dir / ".github" / "prompts").mkdir(parents=True)
+
+        ranked = mp.detect_environments(self.tmp_dir, adapters)
+        self.assertEqual(ranked, [("copilot", 2), ("cursor", 1), ("other", 1)])
+        self.assertEqual(mp._detect_environment(self.tmp_dir, adapters), "copilot")
+        self.assertEqual(mp.detect_environments(self.tmp_dir / "missing", adapters), [])
+
     def test_toml_conversion_integration(self):
         """Test that installers correctly convert Markdown to TOML for Gemini adapter."""
         # Setup source structure
@@ -252,7 +302,7 @@ class TestIntegration(unittest.TestCase):
         import sys
 
         sys.path.append(str(PROJECT_ROOT / "installers" / "python"))
-        from magic_spec.__main__ import install_adapter
+        from magic_spec.adapters import install_adapter
 
         adapters = json.loads(adapters_json.read_text())
         install_adapter(source_dir, target_dir, "gemini", adapters)
@@ -315,7 +365,7 @@ class TestIntegration(unittest.TestCase):
 
         if str(PROJECT_ROOT / "installers" / "python") not in sys.path:
             sys.path.append(str(PROJECT_ROOT / "installers" / "python"))
-        from magic_spec.__main__ import install_adapter
+        from magic_spec.adapters import install_adapter
 
         adapters = json.loads(adapters_json.read_text())
         install_adapter(source_dir, target_dir, "windsurf", adapters)
@@ -328,6 +378,116 @@ class TestIntegration(unittest.TestCase):
         self.assertIn("globs: ", mdc_content)
         self.assertIn("# Test Workflow", mdc_content)
 
+    def test_prerendered_bundle_is_used_when_fresh(self):
+        """Installer copies release-rendered adapter files and ignores stale bundles."""
+        source_dir = self.tmp_dir / "source_bundle"
+        (source_dir / AGENT_DIR / WORKFLOWS_DIR).mkdir(parents=True)
+        wf_file = source_dir / AGENT_DIR / WORKFLOWS_DIR / f"magic.spec{DEFAULT_EXT}"
+        wf_file.write_text("# Bundled Workflow", encoding="utf-8")
+
+        if str(PROJECT_ROOT / "installers" / "python") not in sys.path:
+            sys.path.append(str(PROJECT_ROOT / "installers" / "python"))
+        import magic_spec.adapters as ma
+        import magic_spec.core as mc
+
+        adapters = {
+            "gemini": {
+                "marker": ".gemini",
+                "dest": ".gemini/commands",
+                "ext": ".toml",
+                "format": "toml",
+            }
+        }
+        bundle_dir = source_dir / mc.ADAPTER_BUNDLES_DIR
+        ma.build_adapter_bundle(source_dir, adapters, bundle_dir, "9.9.9")
+
+        # Mark the bundled copy so we can tell it apart from a local render.
+        bundled = bundle_dir / "gemini" / "spec.toml"
+        bundled.write_bytes(bundled.read_bytes() + b"# bundled\n")
+        manifest_path = bundle_dir / "manifest.json"
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        manifest["adapters"]["gemini"]["files"]["spec.toml"]["sha256"] = (
+            mc._sha256_bytes(bundled.read_bytes())
+        )
+        manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+
+        target_dir = self.tmp_dir / "target_bundle"
+        ma.install_adapter(source_dir, target_dir, "gemini", adapters)
+        out_file = target_dir / ".gemini" / "commands" / "spec.toml"
+        self.assertIn("# bundled", out_file.read_text(encoding="utf-8"))
+
+        # A changed source workflow makes the bundle stale.
+        wf_file.write_text("# Edited Workflow", encoding="utf-8")
+        ma.install_adapter(source_dir, target_dir, "gemini", adapters)
+        content = out_file.read_text(encoding="utf-8")
+        self.assertNotIn("# bundled", content)
+        self.assertIn("# Edited Workflow", content)
+
+    def test_minified_adapter_rendering(self):
+        """--minify compacts workflow Markdown but keeps front matter and code."""
+        if str(PROJECT_ROOT / "installers" / "python") not in sys.path:
+            sys.path.append(str(PROJECT_ROOT / "installers" / "python"))
+        import magic_spec.adapters as ma
+        import magic_spec.core as mc
+
+        source_dir = self.tmp_dir / "source_minify"
+        workflows = source_dir / AGENT_DIR / WORKFLOWS_DIR
+        workflows.mkdir(parents=True)
+        wf_file = workflows / f"magic.spec{DEFAULT_EXT}"
+        wf_file.write_text(
+            "---\ndescription: Spec\nhandoffs:\n  - label: x\n---\n\n"
+            "# Spec   \n\n\n<!-- maintainer note -->\n"
+            "| Name   | Role     |\n| :----- | -------: |\n| a      | b        |\n\n"
+            "---\n\n<!-- optional -->\nExample: long walkthrough\n<!-- /optional -->\n"
+            "## Internals <!-- tags: internal -->\n\nEngine notes.\n\n"
+            "### Deep\n\nMore notes.\n\n## Usage\n\n```bash\n<!-- kept -->\n\n\nrun\n```\n",
+            encoding="utf-8",
+        )
+
+        content = ma.minify_markdown(
+            wf_file.read_text(encoding="utf-8"), strip_tags=["internal"]
+        )
+        self.assertTrue(
+            content.startswith("---\ndescription: Spec\nhandoffs:\n  - label: x\n---\n")
+        )
+        self.assertIn("|Name|Role|\n|:-|-:|\n|a|b|", content)
+        for dropped in (
+            "maintainer note",
+            "walkthrough",
+            "Engine notes",
+            "More notes",
+        ):
+            self.assertNotIn(dropped, content)
+        self.assertIn("# Spec\n\n|Name|", content)
+        self.assertIn("```bash\n<!-- kept -->\n\n\nrun\n```", content)
+
+        adapters = {
+            "cursor": {
+                "marker": ".cursor",
+                "dest": ".cursor/rules",
+                "ext": ".mdc",
+                "format": "mdc",
+                "removePrefix": "magic.",
+            }
+        }
+        target_dir = self.tmp_dir / "target_minify"
+        with patch.object(ma, "render_adapter", wraps=ma.render_adapter) as render:
+            stats = ma.install_adapter(
+                source_dir,
+                target_dir,
+                "cursor",
+                adapters,
+                minify={"strip": ["internal"]},
+            )
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(stats["sourceBytes"], wf_file.stat().st_size)
+        self.assertGreater(stats["savedBytes"], 0)
+        out = (target_dir / ".cursor" / "rules" / "spec.mdc").read_text(
+            encoding="utf-8"
+        )
+        self.assertIn(f"source sha256:{mc._sha256_bytes(wf_file.read_bytes())}", out)
+        self.assertEqual(stats["bytes"], len(out.encode("utf-8")))
+
     def test_eject_command_python(self):
         installer = (
             PROJECT_ROOT / "installers" / "python" / "magic_spec" / "__main__.py"
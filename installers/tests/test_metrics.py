@@ -0,0 +1,519 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "installers" / "python"))
+import magic_spec.__main__ as mp  # noqa: E402
+from magic_spec import changelog, metrics, tasks  # noqa: E402
+
+
+class TestRunMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.project = self.tmp_dir / "project"
+        self.project.mkdir()
+        env = patch.dict(
+            os.environ, {"MAGIC_SPEC_CACHE_DIR": str(self.tmp_dir / "cache")}
+        )
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def run_cli(self, args: list) -> str:
+        out = io.StringIO()
+        old_cwd = os.getcwd()
+        os.chdir(self.project)
+        try:
+            with patch.object(sys, "argv", ["magic-spec"] + args):
+                with contextlib.redirect_stdout(out), self.assertRaises(SystemExit):
+                    mp.main()
+        finally:
+            os.chdir(old_cwd)
+        return out.getvalue()
+
+    def test_cli_runs_are_recorded_and_summarized(self):
+        self.run_cli(["info"])
+        self.run_cli(["--list-envs"])
+        runs = metrics.load_runs(self.project)
+        self.assertEqual([r["command"] for r in runs], ["info", "list-envs"])
+        self.assertEqual(runs[0]["source"], "cli")
+        self.assertIn("info", runs[0]["phases"])
+
+        report = json.loads(self.run_cli(["stats", "--json"]))
+        self.assertEqual(report["result"]["commands"]["info"]["runs"], 1)
+        # Querying stats is not itself recorded.
+        self.assertEqual(len(metrics.load_runs(self.project)), 2)
+
+    def test_records_list_the_files_written(self):
+        design = self.project / ".design"
+        design.mkdir()
+        for version, cap in (("1.0.0", 50), ("1.0.1", 1)):
+            (design / "CHANGELOG.md").write_text(
+                f"## Phase 1\n\n- Add {version}\n", encoding="utf-8"
+            )
+            with patch.object(metrics, "METRICS_FILES_CAP", cap):
+                self.run_cli(["changelog", "compile", f"--release={version}"])
+        runs = metrics.load_runs(self.project)
+        self.assertEqual(runs[0]["v"], metrics.METRICS_SCHEMA_VERSION)
+        self.assertEqual(
+            runs[0]["filesWritten"], ["CHANGELOG.md", ".design/CHANGELOG.md"]
+        )
+        self.assertEqual(runs[0]["filesWrittenCount"], 2)
+        # Past the cap only the count is complete.
+        self.assertEqual(runs[1]["filesWritten"], ["CHANGELOG.md"])
+        self.assertEqual(runs[1]["filesWrittenCount"], 2)
+
+    def test_summary_percentiles_and_trend(self):
+        runs = [{"command": "install", "durationMs": ms} for ms in range(1, 21)]
+        runs += [{"command": "install", "durationMs": 100.0, "exitCode": 1}] * 10
+        item = metrics.summarize_runs(runs)["install"]
+        self.assertEqual(item["runs"], 30)
+        self.assertEqual(item["failures"], 10)
+        self.assertEqual(item["p50Ms"], 15)
+        self.assertEqual(item["p95Ms"], 100.0)
+        self.assertGreater(item["trendPct"], 0)
+
+    def test_torn_lines_are_skipped(self):
+        metrics.record_run(self.project, {"command": "info", "durationMs": 5})
+        with open(metrics._metrics_path(self.project), "a", encoding="utf-8") as f:
+            f.write('{"command": "inf')
+        self.assertEqual(len(metrics.load_runs(self.project)), 1)
+
+    @unittest.skipUnless(shutil.which("node"), "node is not installed")
+    def test_executor_appends_to_the_same_log(self):
+        scripts = self.project / ".magic" / "scripts"
+        scripts.mkdir(parents=True)
+        shutil.copy(PROJECT_ROOT / ".magic" / "scripts" / "executor.js", scripts)
+        (scripts / "noop.js").write_text("process.exit(3);\n", encoding="utf-8")
+
+        result = subprocess.run(
+            ["node", str(scripts / "executor.js"), "noop"], check=False
+        )
+        self.assertEqual(result.returncode, 3)
+        runs = metrics.load_runs(self.project)
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(runs[0]["command"], "script:noop")
+        self.assertEqual(runs[0]["source"], "executor")
+        self.assertEqual(runs[0]["exitCode"], 3)
+        self.assertEqual(runs[0]["v"], metrics.METRICS_SCHEMA_VERSION)
+        self.assertEqual(runs[0]["filesWritten"], [])
+        self.assertEqual(runs[0]["filesWrittenCount"], 0)
+
+    @unittest.skipUnless(shutil.which("node"), "node is not installed")
+    def test_executor_coalesces_concurrent_regenerations(self):
+        scripts = self.project / ".magic" / "scripts"
+        scripts.mkdir(parents=True)
+        shutil.copy(PROJECT_ROOT / ".magic" / "scripts" / "executor.js", scripts)
+        counter = self.project / "runs.txt"
+        (self.project / ".design").mkdir()
+        (scripts / "generate-context.js").write_text(
+            "require('fs').appendFileSync(process.argv[2], 'run\\n');\n"
+            "require('fs').appendFileSync("
+            "require('path').join(__dirname, '../../.design/CONTEXT.md'), 'run\\n');\n"
+            "setTimeout(() => process.exit(0), 400);\n",
+            encoding="utf-8",
+        )
+
+        procs = [
+            subprocess.Popen(
+                [
+                    "node",
+                    str(scripts / "executor.js"),
+                    "generate-context",
+                    str(counter),
+                ],
+                stdout=subprocess.DEVNULL,
+            )
+            for _ in range(6)
+        ]
+        self.assertEqual([p.wait() for p in procs], [0] * 6)
+        self.assertLessEqual(len(counter.read_text(encoding="utf-8").split()), 2)
+        runs = metrics.load_runs(self.project)
+        self.assertEqual(len(runs), 6)
+        self.assertGreaterEqual(sum(1 for r in runs if r.get("coalesced")), 4)
+        for run in runs:
+            expected = [] if run.get("coalesced") else [".design/CONTEXT.md"]
+            self.assertEqual(run["filesWritten"], expected)
+
+
+PHASE_ARCHIVE = """# Phase 1 — Foundation
+
+**Status:** Completed
+
+## Track A: Installers
+
+### [T-1A01] Build the thing
+
+- **Spec:** a.md
+- **Status:** Done
+- **Assignee:** Agent
+
+### [T-1A02] Ship the thing
+
+- **Status:** Blocked
+- **Assignee:** User
+- **Notes:** Waiting on registry access
+"""
+
+TASKS_MD = """# Master Task List
+
+## Phase 1 — Foundation
+
+**Track A:** Installers
+
+| ID | Title | Status | Assignee |
+| :--- | :--- | :--- | :--- |
+| [T-1A01] | Build the thing | Done | Agent |
+| [T-1A02] | Ship the thing | Done | User |
+
+## Phase 2 — Growth
+
+**Track B:** Docs
+
+| ID | Title | Status | Assignee |
+| :--- | :--- | :--- | :--- |
+| [T-2B01] | Write docs | In Progress | Agent |
+| [T-2B02] | Review docs | Blocked | User |
+"""
+
+
+class TestTaskAnalytics(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.project = self.tmp_dir / "project"
+        archive = self.project / ".design" / "archives" / "tasks"
+        archive.mkdir(parents=True)
+        (archive / "phase-1.md").write_text(PHASE_ARCHIVE, encoding="utf-8")
+        (self.project / ".design" / "TASKS.md").write_text(TASKS_MD, encoding="utf-8")
+        env = patch.dict(
+            os.environ, {"MAGIC_SPEC_CACHE_DIR": str(self.tmp_dir / "cache")}
+        )
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_parses_both_layouts(self):
+        archive = tasks.parse_task_document(PHASE_ARCHIVE)
+        self.assertEqual(archive["phases"]["1"]["status"], "Completed")
+        self.assertEqual(archive["tracks"], {"1A": "Installers"})
+        self.assertEqual(archive["tasks"][1]["notes"], "Waiting on registry access")
+
+        master = tasks.parse_task_document(TASKS_MD)
+        self.assertEqual(
+            [(t["id"], t["status"]) for t in master["tasks"]],
+            [
+                ("T-1A01", "Done"),
+                ("T-1A02", "Done"),
+                ("T-2B01", "In Progress"),
+                ("T-2B02", "Blocked"),
+            ],
+        )
+
+    def test_analytics_merge_and_ratios(self):
+        result = tasks.compute_task_analytics(self.project)
+        self.assertEqual(result["totals"]["tasks"], 4)
+        self.assertEqual(result["totals"]["completionRate"], 0.5)
+        self.assertEqual(result["totals"]["blockedRatio"], 0.25)
+        phase1, phase2 = result["phases"]
+        self.assertTrue(phase1["archived"])
+        self.assertEqual(phase1["tracks"]["1A"]["byStatus"]["Done"], 2)
+        self.assertEqual(phase2["tracks"]["2B"]["name"], "Docs")
+        self.assertEqual(
+            result["statusMismatches"],
+            [{"id": "T-1A02", "archive": "Blocked", "tasks": "Done"}],
+        )
+        self.assertEqual([b["id"] for b in result["blocked"]], ["T-2B02"])
+
+    def test_unchanged_files_come_from_cache(self):
+        self.assertEqual(
+            tasks.compute_task_analytics(self.project)["sources"]["cached"], 0
+        )
+        self.assertEqual(
+            tasks.compute_task_analytics(self.project)["sources"]["cached"], 2
+        )
+
+        tasks_md = self.project / ".design" / "TASKS.md"
+        tasks_md.write_text(TASKS_MD.replace("In Progress", "Done"), encoding="utf-8")
+        result = tasks.compute_task_analytics(self.project)
+        self.assertEqual(result["sources"]["cached"], 1)
+        self.assertEqual(result["totals"]["byStatus"]["Done"], 3)
+
+
+SUMMARY_MD = """| Phase | Total | Todo | In Progress | Done | Blocked |
+| :--- | :--- | :--- | :--- | :--- | :--- |
+| Phase 1 | 2 | 0 | 0 | 2 | 0 |
+| Phase 2 | 2 | 0 | 1 | 0 | 1 |
+"""
+
+PHASE_FILE = """# Phase 2 — Growth
+
+### [T-2B01] Write docs
+
+- **Status:** In Progress
+"""
+
+HEADING_TASKS_MD = """# Task Index
+
+**Status:** Active
+
+## Summary
+
+| Phase | Total | Todo | In Progress | Done | Blocked | Cancelled |
+| :--- | :--- | :--- | :--- | :--- | :--- | :--- |
+| Phase 1 | 3 | 2 | 0 | 0 | 0 | 1 |
+
+## Phase 1 — Foundation
+
+**Status:** Active
+
+## [T-1A01] Build the thing
+
+- **Spec:** installer.md §1
+- **Status:** Todo
+- **Changes:**
+  - Created: installers/node/index.js
+- **Assignee:** Agent
+
+## [T-1A02] Old idea
+
+- **Status:** Cancelled
+
+## [T-1A03] Ship the thing
+
+- **Status:** Todo
+"""
+
+
+class TestTaskStatus(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.project = self.tmp_dir / "project"
+        (self.project / ".design" / "tasks").mkdir(parents=True)
+        self.tasks_md = self.project / ".design" / "TASKS.md"
+        self.tasks_md.write_text(
+            TASKS_MD.replace("\n\n## Phase 1", "\n\n" + SUMMARY_MD + "\n## Phase 1"),
+            encoding="utf-8",
+        )
+        (self.project / ".design" / "tasks" / "phase-2.md").write_text(
+            PHASE_FILE, encoding="utf-8"
+        )
+        env = patch.dict(
+            os.environ, {"MAGIC_SPEC_CACHE_DIR": str(self.tmp_dir / "cache")}
+        )
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_updates_row_summary_and_phase_file(self):
+        result = tasks.set_task_status(self.project, "T-2B01", "done", "User")
+        self.assertEqual(
+            (result["previous"], result["status"]), ("In Progress", "Done")
+        )
+        self.assertFalse(result["indexCached"])
+        text = self.tasks_md.read_text(encoding="utf-8")
+        self.assertIn("| [T-2B01] | Write docs | Done | User |", text)
+        self.assertIn("| Phase 2 | 2 | 0 | 0 | 1 | 1 |", text)
+        self.assertIn("| Phase 1 | 2 | 0 | 0 | 2 | 0 |", text)
+        phase_file = self.project / ".design" / "tasks" / "phase-2.md"
+        self.assertIn("- **Status:** Done\n", phase_file.read_text(encoding="utf-8"))
+
+        # The second update reuses the shifted offsets from the index.
+        result = tasks.set_task_status(self.project, "T-2B02", "Todo")
+        self.assertTrue(result["indexCached"])
+        text = self.tasks_md.read_text(encoding="utf-8")
+        self.assertIn("| [T-2B02] | Review docs | Todo | User |", text)
+        self.assertIn("| Phase 2 | 2 | 1 | 0 | 1 | 0 |", text)
+        cache = tasks._task_index_path(self.project).read_text(encoding="utf-8")
+        self.assertEqual(
+            json.loads(cache)["rows"],
+            tasks.build_task_index(text.encode("utf-8"))["rows"],
+        )
+
+    def test_rejects_unknown_task_and_status(self):
+        with self.assertRaises(LookupError):
+            tasks.set_task_status(self.project, "T-9Z99", "Done")
+        with self.assertRaises(ValueError):
+            tasks.set_task_status(self.project, "T-2B01", "Maybe")
+
+    def test_cancelled_is_accepted_and_left_out_of_the_total(self):
+        result = tasks.set_task_status(self.project, "T-2B02", "[~]")
+        self.assertEqual(result["status"], "Cancelled")
+        text = self.tasks_md.read_text(encoding="utf-8")
+        self.assertIn("| [T-2B02] | Review docs | Cancelled | User |", text)
+        # The summary has no Cancelled column, so the task leaves the total.
+        self.assertIn("| Phase 2 | 1 | 0 | 1 | 0 | 0 |", text)
+
+    def test_heading_layout_from_template(self):
+        self.tasks_md.write_text(HEADING_TASKS_MD, encoding="utf-8")
+        result = tasks.set_task_status(self.project, "T-1A01", "Done", "User")
+        self.assertEqual((result["previous"], result["status"]), ("Todo", "Done"))
+        text = self.tasks_md.read_text(encoding="utf-8")
+        self.assertIn("- **Status:** Done\n- **Changes:**", text)
+        self.assertIn("- **Assignee:** User\n", text)
+        self.assertIn("| Phase 1 | 3 | 1 | 0 | 1 | 0 | 1 |", text)
+
+        result = tasks.set_task_status(self.project, "T-1A03", "In Progress")
+        self.assertTrue(result["indexCached"])
+        text = self.tasks_md.read_text(encoding="utf-8")
+        self.assertEqual(text.count("- **Status:** In Progress"), 1)
+        self.assertIn("| Phase 1 | 3 | 0 | 1 | 1 | 0 | 1 |", text)
+        statuses = {
+            t["id"]: t["status"] for t in tasks.parse_task_document(text)["tasks"]
+        }
+        self.assertEqual(
+            statuses, {"T-1A01": "Done", "T-1A02": "Cancelled", "T-1A03": "In Progress"}
+        )
+
+    def test_concurrent_workers_do_not_clobber_each_other(self):
+        rows = "".join(
+            f"| [T-3C{n:02d}] | Task {n} | Todo | Agent |\n" for n in range(1, 13)
+        )
+        with open(self.tasks_md, "a", encoding="utf-8") as f:
+            f.write(
+                "\n## Phase 3 — Scale\n\n| ID | Title | Status | Assignee |\n"
+                "| :--- | :--- | :--- | :--- |\n" + rows
+            )
+        ids = [f"T-3C{n:02d}" for n in range(1, 13)]
+        procs = [
+            subprocess.Popen(
+                [sys.executable, "-m", "magic_spec", "tasks", "set", task_id, "Done"],
+                cwd=self.project,
+                env={
+                    **os.environ,
+                    "PYTHONPATH": str(PROJECT_ROOT / "installers" / "python"),
+                    "MAGIC_SPEC_NO_METRICS": "1",
+                },
+                stdout=subprocess.DEVNULL,
+            )
+            for task_id in ids
+        ]
+        self.assertEqual([p.wait() for p in procs], [0] * len(ids))
+        parsed = tasks.parse_task_document(self.tasks_md.read_text(encoding="utf-8"))
+        done = {t["id"] for t in parsed["tasks"] if t["status"] == "Done"}
+        self.assertTrue(set(ids) <= done)
+
+
+CHANGELOG_DRAFT = """# Changelog Accumulator (Unreleased)
+
+## Phase 1 — Core (2026-10-01)
+
+### Added
+- Search command for specifications
+
+### Changed
+- Faster adapter installs
+
+## Phase 2 — Polish (2026-10-10)
+
+- [T-2A01] Implement the `pack` command
+- Modified: installer (fix crash on empty TASKS.md)
+- Deleted: legacy bash installer
+- Decided: keep the registry in INDEX.md
+- search command for specifications.
+"""
+
+ROOT_CHANGELOG = """# Changelog
+
+All notable changes to this project will be documented in this file.
+
+## [Unreleased]
+
+## [1.0.0] — 2026-01-01
+
+### Added
+
+- Initial release
+"""
+
+
+class TestChangelogCompile(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.project = self.tmp_dir / "project"
+        (self.project / ".design").mkdir(parents=True)
+        (self.project / ".magic").mkdir()
+        (self.project / ".magic" / ".version").write_text("1.1.0", encoding="utf-8")
+        self.draft = self.project / ".design" / "CHANGELOG.md"
+        self.draft.write_text(CHANGELOG_DRAFT, encoding="utf-8")
+        self.root = self.project / "CHANGELOG.md"
+        self.root.write_text(ROOT_CHANGELOG, encoding="utf-8")
+        env = patch.dict(
+            os.environ, {"MAGIC_SPEC_CACHE_DIR": str(self.tmp_dir / "cache")}
+        )
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_parses_groups_and_dedupes_draft_entries(self):
+        draft = changelog.parse_changelog_draft(CHANGELOG_DRAFT)
+        self.assertEqual(len(draft["phases"]), 2)
+        block = changelog.compile_changelog(draft, "1.1.0", "2026-10-19")
+        self.assertEqual(
+            block["categories"],
+            {
+                "Added": [
+                    "Search command for specifications",
+                    "Implement the `pack` command",
+                ],
+                "Changed": ["Faster adapter installs"],
+                "Removed": ["Legacy bash installer"],
+                "Fixed": ["Installer (fix crash on empty TASKS.md)"],
+            },
+        )
+        self.assertEqual(block["duplicates"], 1)
+        self.assertNotIn("INDEX.md", block["text"])
+        self.assertTrue(block["text"].startswith("## [1.1.0] - 2026-10-19\n"))
+
+    def test_prepends_release_block_and_resets_draft(self):
+        result = changelog.compile_changelog_release(self.project, date="2026-10-19")
+        self.assertTrue(result["written"])
+        text = self.root.read_text(encoding="utf-8")
+        head, _, rest = text.partition("## [1.1.0] — 2026-10-19\n")
+        self.assertTrue(head.endswith("## [Unreleased]\n\n"))
+        # Everything from the previous release on is left untouched.
+        self.assertIn("\n\n## [1.0.0] — 2026-01-01\n", rest)
+        self.assertTrue(
+            text.endswith(ROOT_CHANGELOG.partition("## [Unreleased]\n\n")[2])
+        )
+        self.assertEqual(
+            self.draft.read_text(encoding="utf-8"), changelog.CHANGELOG_DRAFT_TEMPLATE
+        )
+
+        # The same version is never compiled twice.
+        self.draft.write_text(CHANGELOG_DRAFT, encoding="utf-8")
+        again = changelog.compile_changelog_release(self.project)
+        self.assertEqual((again["written"], again["reason"]), (False, "released"))
+        self.assertEqual(self.root.read_text(encoding="utf-8"), text)
+
+    def test_dry_run_and_empty_draft_write_nothing(self):
+        result = changelog.compile_changelog_release(
+            self.project, "1.2.0", dry_run=True
+        )
+        self.assertFalse(result["written"])
+        self.assertIn("### Removed", result["text"])
+        self.assertEqual(self.root.read_text(encoding="utf-8"), ROOT_CHANGELOG)
+
+        self.draft.write_text(changelog.CHANGELOG_DRAFT_TEMPLATE, encoding="utf-8")
+        result = changelog.compile_changelog_release(self.project, "1.2.0")
+        self.assertEqual((result["written"], result["reason"]), (False, "empty"))
+
+
+if __name__ == "__main__":
+    unittest.main()
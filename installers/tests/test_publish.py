@@ -1,3 +1,4 @@
+import json
 import sys
 import tempfile
 import unittest
@@ -50,6 +51,63 @@ class TestPublish(unittest.TestCase):
                 '"version": "1.2.4"', package_json_path.read_text(encoding="utf-8")
             )
 
+    def test_build_adapter_bundles_writes_manifest_and_archive(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "installers").mkdir()
+            (root / "installers" / "adapters.json").write_text(
+                '{"gemini": {"marker": ".gemini", "dest": ".gemini/commands",'
+                ' "ext": ".toml", "format": "toml"}}',
+                encoding="utf-8",
+            )
+            workflows = root / ".agent" / "workflows"
+            workflows.mkdir(parents=True)
+            (workflows / "magic.spec.md").write_text("# Spec", encoding="utf-8")
+
+            with patch.object(publish, "PROJECT_ROOT", root):
+                added = publish.build_adapter_bundles("9.9.9", root / "dist", False)
+
+            self.assertEqual(added, ["installers/bundles"])
+            manifest = json.loads(
+                (root / "installers" / "bundles" / "manifest.json").read_text(
+                    encoding="utf-8"
+                )
+            )
+            self.assertEqual(manifest["version"], "9.9.9")
+            self.assertIn("spec.toml", manifest["adapters"]["gemini"]["files"])
+            self.assertTrue(
+                (root / "installers" / "bundles" / "gemini" / "spec.toml").exists()
+            )
+            self.assertTrue(
+                (root / "dist" / "magic-spec-adapters-v9.9.9.tar.gz").exists()
+            )
+
+    def test_compile_changelog_prepends_release_and_stages_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / ".design").mkdir()
+            (root / ".design" / "CHANGELOG.md").write_text(
+                "## Phase 1 — Core\n\n### Added\n- New `pack` command\n",
+                encoding="utf-8",
+            )
+            (root / "CHANGELOG.md").write_text(
+                "# Changelog\n\n## [1.0.0] - 2026-01-01\n\n- Initial\n",
+                encoding="utf-8",
+            )
+
+            with patch.object(publish, "PROJECT_ROOT", root), patch.dict(
+                "os.environ", {"MAGIC_SPEC_CACHE_DIR": str(root / "cache")}
+            ):
+                added = publish.compile_changelog("1.1.0", False)
+                again = publish.compile_changelog("1.1.0", False)
+
+            self.assertEqual(added, ["CHANGELOG.md", ".design/CHANGELOG.md"])
+            self.assertEqual(again, [])
+            text = (root / "CHANGELOG.md").read_text(encoding="utf-8")
+            self.assertIn("## [1.1.0] - ", text)
+            self.assertLess(text.index("[1.1.0]"), text.index("[1.0.0]"))
+            self.assertIn("- New `pack` command", text)
+
 
 if __name__ == "__main__":
     unittest.main()
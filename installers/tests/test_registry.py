@@ -0,0 +1,406 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "installers" / "python"))
+from magic_spec import markdown, pack, registry, search  # noqa: E402
+
+INDEX_MD = """# Specifications Registry
+**Version:** 1.2.0
+**Status:** Active
+
+## Domain Specifications
+| File | Description | Status | Layer | Version |
+| :--- | :--- | :--- | :--- | :--- |
+| [api-auth.md](specifications/api-auth.md) | Auth API | Stable | concept | 1.0.0 |
+| [api-users.md](specifications/api-users.md) | Users API | Draft | concept | 0.1.0 |
+| [cli.md](specifications/cli.md) | CLI surface | Stable | implementation | 1.1.0 |
+<!-- Add your specifications here -->
+
+## Meta Information
+- **Maintainer**: Core Team
+"""
+
+
+class TestShardedRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.design = self.tmp_dir / ".design"
+        (self.design / "specifications").mkdir(parents=True)
+        (self.design / "INDEX.md").write_text(INDEX_MD, encoding="utf-8")
+        for name in ("api-auth.md", "api-users.md", "cli.md"):
+            (self.design / "specifications" / name).write_text(
+                f"# {name}\n", encoding="utf-8"
+            )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_split_then_join_round_trips(self):
+        before = registry.load_registry(self.tmp_dir)["rows"]
+        self.assertEqual(registry.split_registry(self.tmp_dir), {"api": 2, "cli": 1})
+
+        index = (self.design / "INDEX.md").read_text(encoding="utf-8")
+        self.assertNotIn("| File |", index)
+        self.assertIn("(INDEX.d/)", index)
+        api = (self.design / "INDEX.d" / "api.md").read_text(encoding="utf-8")
+        self.assertIn("](../specifications/api-users.md)", api)
+
+        loaded = registry.load_registry(self.tmp_dir)
+        self.assertEqual(loaded["shards"], 2)
+        self.assertEqual(
+            [(r["file"], r["status"]) for r in loaded["rows"]],
+            [(r["file"], r["status"]) for r in before],
+        )
+
+        self.assertEqual(registry.join_registry(self.tmp_dir), 3)
+        self.assertFalse((self.design / "INDEX.d").exists())
+        self.assertEqual(
+            (self.design / "INDEX.md")
+            .read_text(encoding="utf-8")
+            .count("](specifications/"),
+            3,
+        )
+        self.assertEqual(len(registry.load_registry(self.tmp_dir)["rows"]), 3)
+
+    def test_split_by_layer_and_duplicates(self):
+        registry.split_registry(self.tmp_dir, by="layer")
+        shards = sorted(p.name for p in (self.design / "INDEX.d").iterdir())
+        self.assertEqual(shards, ["concept.md", "implementation.md"])
+
+        with open(self.design / "INDEX.d" / "concept.md", "a", encoding="utf-8") as f:
+            f.write(
+                "| [cli.md](../specifications/cli.md) | Dup | Draft | concept | 0.1.0 |\n"
+            )
+        loaded = registry.load_registry(self.tmp_dir)
+        self.assertEqual(
+            loaded["duplicates"],
+            [
+                {
+                    "file": "cli.md",
+                    "sources": ["INDEX.d/concept.md", "INDEX.d/implementation.md"],
+                }
+            ],
+        )
+
+    @unittest.skipUnless(shutil.which("bash"), "bash is not installed")
+    def test_prerequisite_script_merges_shards(self):
+        registry.split_registry(self.tmp_dir)
+        (self.design / "RULES.md").write_text("# Rules\n", encoding="utf-8")
+        (self.design / "PLAN.md").write_text(
+            "**Based on:** INDEX.md v1.2.0\n- specifications/api-auth.md\n"
+            "- specifications/api-users.md\n- specifications/cli.md\n",
+            encoding="utf-8",
+        )
+        script = PROJECT_ROOT / ".magic" / "scripts" / "check-prerequisites.sh"
+        result = subprocess.run(
+            ["bash", str(script), "--json"],
+            cwd=self.tmp_dir,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        data = json.loads(result.stdout)
+        self.assertEqual(data["artifacts"]["INDEX.d"]["shards"], 2)
+        self.assertEqual(data["artifacts"]["specs"]["count"], 3)
+        self.assertEqual(data["artifacts"]["specs"]["stable"], 2)
+        self.assertFalse(
+            [w for w in data["warnings"] if "Orphaned" in w or "Mismatch" in w]
+        )
+
+
+SPEC_BACKUP = """# Backups
+
+**Version:** 1.2.0
+**Status:** Stable
+**Layer:** implementation
+**Implements:** [architecture.md](architecture.md)
+
+## Overview
+
+Generations of engine files are kept before every update.
+
+## Rollback
+
+A rollback restores a backup generation; rollback is atomic.
+
+```plaintext
+# Not a heading
+```
+
+## Rollback
+"""
+
+SPEC_ARCH = """# Architecture
+
+**Version:** 2.0.0
+**Status:** Draft
+**Layer:** concept
+
+## Overview
+
+Engine and adapters. Updates keep a backup.
+"""
+
+
+class TestSpecSearch(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.specs = self.tmp_dir / ".design" / "specifications"
+        self.specs.mkdir(parents=True)
+        (self.specs / "backups.md").write_text(SPEC_BACKUP, encoding="utf-8")
+        (self.specs / "architecture.md").write_text(SPEC_ARCH, encoding="utf-8")
+        env = patch.dict(
+            os.environ, {"MAGIC_SPEC_CACHE_DIR": str(self.tmp_dir / "cache")}
+        )
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_sections_skip_fences_and_dedupe_anchors(self):
+        sections = markdown.markdown_sections(SPEC_BACKUP.encode("utf-8"))
+        self.assertEqual(
+            [s["anchor"] for s in sections],
+            ["backups", "overview", "rollback", "rollback-1"],
+        )
+        self.assertEqual(sections[0]["end"], len(SPEC_BACKUP.encode("utf-8")))
+        self.assertEqual(sections[1]["body_end"], sections[2]["start"])
+
+    def test_ranked_hits_carry_anchors_and_fields(self):
+        result = search.search_specs(self.tmp_dir, "rollback generation")
+        top = result["hits"][0]
+        self.assertEqual(top["file"], ".design/specifications/backups.md")
+        self.assertEqual(top["anchor"], "rollback")
+        self.assertEqual(top["fields"]["implements"], "architecture.md")
+
+        hits = search.search_specs(self.tmp_dir, "backup status:draft")["hits"]
+        self.assertEqual(
+            {h["file"] for h in hits}, {".design/specifications/architecture.md"}
+        )
+        hits = search.search_specs(self.tmp_dir, "layer:implementation version:1")[
+            "hits"
+        ]
+        self.assertEqual([h["anchor"] for h in hits], ["backups"])
+
+    def test_index_updates_only_changed_files(self):
+        self.assertEqual(search.update_search_index(self.tmp_dir)["updated"], 2)
+        self.assertEqual(search.update_search_index(self.tmp_dir)["updated"], 0)
+
+        (self.specs / "architecture.md").write_text(
+            SPEC_ARCH + "\n## Telemetry\n\nOpt-in metrics.\n", encoding="utf-8"
+        )
+        (self.specs / "backups.md").unlink()
+        stats = search.update_search_index(self.tmp_dir)
+        self.assertEqual((stats["updated"], stats["removed"]), (1, 1))
+
+        self.assertEqual(search.search_specs(self.tmp_dir, "rollback")["hits"], [])
+        hits = search.search_specs(self.tmp_dir, "metrics")["hits"]
+        self.assertEqual(hits[0]["anchor"], "telemetry")
+
+    def test_compaction_drops_superseded_postings(self):
+        with patch.object(search, "_SEARCH_MAX_SEGMENTS", 1):
+            search.update_search_index(self.tmp_dir)
+            (self.specs / "backups.md").write_text(
+                SPEC_BACKUP.replace("atomic", "journaled"), encoding="utf-8"
+            )
+            manifest, _ = search._sync_search_index(self.tmp_dir)
+        self.assertEqual(len(manifest["segments"]), 1)
+        segments = list((search._search_index_dir(self.tmp_dir) / "segments").iterdir())
+        self.assertEqual(len(segments), 1)
+        self.assertEqual(search.search_specs(self.tmp_dir, "atomic")["hits"], [])
+        self.assertEqual(len(search.search_specs(self.tmp_dir, "journaled")["hits"]), 1)
+
+
+class TestSectionRetrieval(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.specs = self.tmp_dir / ".design" / "specifications"
+        self.specs.mkdir(parents=True)
+        (self.specs / "backups.md").write_text(SPEC_BACKUP, encoding="utf-8")
+        (self.tmp_dir / ".magic").mkdir()
+        (self.tmp_dir / ".magic" / "rules.md").write_text(
+            "# Rules\n\n## C1 — Engine Safety\n\nRead first.\n\n"
+            "### Details\n\nMore.\n\n## C2 — Minimalism\n\nKeep it small.\n",
+            encoding="utf-8",
+        )
+        (self.tmp_dir / "secret.md").write_text("# Secret\n", encoding="utf-8")
+        env = patch.dict(
+            os.environ, {"MAGIC_SPEC_CACHE_DIR": str(self.tmp_dir / "cache")}
+        )
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_section_includes_subsections_only(self):
+        result = search.get_section(self.tmp_dir, "rules.md#c1")
+        self.assertEqual(result["file"], ".magic/rules.md")
+        self.assertTrue(result["text"].startswith("## C1 — Engine Safety"))
+        self.assertIn("### Details", result["text"])
+        self.assertNotIn("C2", result["text"])
+
+        result = search.get_section(
+            self.tmp_dir, ".design/specifications/backups.md#rollback-1"
+        )
+        self.assertEqual(result["text"], "## Rollback\n")
+
+    def test_outline_and_lookup_errors(self):
+        outline = search.get_section(self.tmp_dir, "backups")["outline"]
+        self.assertEqual(
+            [o["anchor"] for o in outline],
+            ["backups", "overview", "rollback", "rollback-1"],
+        )
+        with self.assertRaises(LookupError):
+            search.get_section(self.tmp_dir, "rules.md#c9")
+        with self.assertRaises(LookupError):
+            search.get_section(self.tmp_dir, "secret.md")
+        with self.assertRaises(LookupError):
+            search.get_section(self.tmp_dir, ".design/../secret.md")
+
+    def test_offsets_are_reparsed_only_when_a_file_changed(self):
+        calls = []
+        parse = markdown.markdown_sections
+
+        def counting(data, list_items=False):
+            calls.append(data)
+            return parse(data, list_items)
+
+        with patch.object(search, "markdown_sections", counting):
+            search.get_section(self.tmp_dir, "backups.md#overview")
+            search.get_section(self.tmp_dir, "backups.md#rollback")
+            self.assertEqual(len(calls), 1)
+            with open(self.specs / "backups.md", "a", encoding="utf-8") as f:
+                f.write("\n## Retention\n\nKeep five.\n")
+            result = search.get_section(self.tmp_dir, "backups.md#retention")
+            self.assertEqual(len(calls), 2)
+        self.assertEqual(result["text"], "## Retention\n\nKeep five.\n")
+
+    def test_numbered_list_items_are_addressable(self):
+        (self.tmp_dir / ".design" / "RULES.md").write_text(
+            "# Rules\n\n## 7. Conventions\n\n### C1 — Safety\n\n"
+            "1. **Read first** — open every file.\n"
+            "2. **Analyse impact** — trace references,\n   then edit.\n\n"
+            "Closing paragraph.\n\n### C2 — Rules\n\n56. Keep it small.\n"
+            "57. **Never edit blindly**.\n",
+            encoding="utf-8",
+        )
+        result = search.get_section(self.tmp_dir, "RULES.md#Rule 57")
+        self.assertEqual(result["anchor"], "c2--rules-57")
+        self.assertEqual(result["title"], "57. Never edit blindly")
+        self.assertEqual(result["text"], "57. **Never edit blindly**.\n")
+
+        result = search.get_section(self.tmp_dir, "RULES.md#c1/2")
+        self.assertEqual(
+            result["text"],
+            "2. **Analyse impact** — trace references,\n   then edit.\n\n",
+        )
+        with self.assertRaises(LookupError):
+            search.get_section(self.tmp_dir, "RULES.md#c1/57")
+        # Headings still include their items; items are not search sections.
+        self.assertIn(
+            "Closing paragraph", search.get_section(self.tmp_dir, "RULES.md#c1")["text"]
+        )
+        anchors = [s["anchor"] for s in markdown.markdown_sections(b"## A\n\n1. x\n")]
+        self.assertEqual(anchors, ["a"])
+
+
+class TestContextPack(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.design = self.tmp_dir / ".design"
+        self.specs = self.design / "specifications"
+        self.specs.mkdir(parents=True)
+        (self.specs / "backups.md").write_text(SPEC_BACKUP, encoding="utf-8")
+        (self.specs / "architecture.md").write_text(SPEC_ARCH, encoding="utf-8")
+        (self.design / "INDEX.md").write_text(
+            "# Registry\n\n| File | Description | Status | Layer | Version |\n"
+            "| :--- | :--- | :--- | :--- | :--- |\n"
+            "| [backups.md](specifications/backups.md) | Backups | Stable "
+            "| implementation | 1.2.0 |\n"
+            "| [architecture.md](specifications/architecture.md) | Arch | Draft "
+            "| concept | 2.0.0 |\n",
+            encoding="utf-8",
+        )
+        (self.design / "RULES.md").write_text(
+            "\ufeff# Rules\n\n## C1 — Safety\n\nRead first.\n", encoding="utf-8"
+        )
+        (self.design / "TASKS.md").write_text(
+            "## Phase 1 — Core\n\n| ID | Title | Status | Assignee |\n"
+            "| :--- | :--- | :--- | :--- |\n"
+            "| [T-1A01] | Ship backups | Done | Agent |\n"
+            "| [T-1A02] | Write docs | In Progress | Agent |\n",
+            encoding="utf-8",
+        )
+        env = patch.dict(
+            os.environ, {"MAGIC_SPEC_CACHE_DIR": str(self.tmp_dir / "cache")}
+        )
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_budget_units(self):
+        self.assertEqual(pack._parse_budget("12000"), 12000)
+        self.assertEqual(pack._parse_budget("12kb"), 12000)
+        self.assertEqual(pack._parse_budget("3kt"), 12000)
+        with self.assertRaises(ValueError):
+            pack._parse_budget("lots")
+
+    def test_pack_contents_and_delta(self):
+        built = pack.build_context_pack(self.tmp_dir)
+        text = built["text"]
+        self.assertIn("## Pinned: .design/RULES.md", text)
+        self.assertIn("### C1 — Safety", text)
+        self.assertIn("| T-1A02 | Write docs | In Progress | Agent |", text)
+        self.assertNotIn("T-1A01", text)
+        # First pack: only specs that are not Stable yet.
+        self.assertIn("## Changed: .design/specifications/architecture.md", text)
+        self.assertNotIn("## Changed: .design/specifications/backups.md", text)
+
+        header = {"inputs": built["inputs"]}
+        with open(self.specs / "backups.md", "a", encoding="utf-8") as f:
+            f.write("\n## Retention\n\nKeep five.\n")
+        text = pack.build_context_pack(self.tmp_dir, previous=header)["text"]
+        self.assertIn("## Changed: .design/specifications/backups.md", text)
+        self.assertNotIn("## Changed: .design/specifications/architecture.md", text)
+
+    def test_budget_omits_sections_with_pointers(self):
+        built = pack.build_context_pack(self.tmp_dir, budget=200)
+        omitted = [s["source"] for s in built["sections"] if not s["included"]]
+        self.assertIn(".design/specifications/architecture.md", omitted)
+        self.assertLessEqual(built["bytes"], 200)
+        self.assertIn(
+            "`magic-spec get .design/specifications/architecture.md`", built["text"]
+        )
+
+    def test_pack_is_regenerated_only_when_inputs_change(self):
+        pack_path = self.design / "PACK.md"
+        self.assertEqual(pack.run_pack(self.tmp_dir, budget=4000), 0)
+        written = pack_path.stat().st_mtime_ns
+        self.assertEqual(pack.run_pack(self.tmp_dir, budget=4000, check=True), 0)
+        self.assertEqual(pack.run_pack(self.tmp_dir, budget=4000), 0)
+        self.assertEqual(pack_path.stat().st_mtime_ns, written)
+
+        (self.design / "RULES.md").write_text("# Rules v2\n", encoding="utf-8")
+        self.assertEqual(pack.run_pack(self.tmp_dir, budget=4000, check=True), 1)
+        # A different budget is a different pack as well.
+        self.assertTrue(
+            pack.pack_is_stale(
+                self.tmp_dir, pack_path, {"budget": 8000, "pins": ["RULES.md"]}
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "installers" / "python"))
+import magic_spec.__main__ as mp  # noqa: E402
+
+
+class ReleasesServer(ThreadingHTTPServer):
+    """Stand-in for the GitHub releases endpoint with ETag support."""
+
+    daemon_threads = True
+
+    def __init__(self, tag: str):
+        super().__init__(("127.0.0.1", 0), ReleasesHandler)
+        self.tag = tag
+        self.requests = []
+        self.url = f"http://127.0.0.1:{self.server_address[1]}/releases/latest"
+        threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class ReleasesHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        etag = f'"{self.server.tag}"'
+        if_none_match = self.headers.get("If-None-Match")
+        self.server.requests.append(if_none_match)
+        if if_none_match == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps({"tag_name": f"v{self.server.tag}"}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestLatestReleaseLookup(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.server = ReleasesServer("2.0.0")
+        self.addCleanup(self.server.close)
+        env = patch.dict(
+            os.environ,
+            {
+                "MAGIC_SPEC_CACHE_DIR": str(self.tmp_dir / "cache"),
+                "MAGIC_SPEC_RELEASES_URL": self.server.url,
+            },
+        )
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_cached_within_ttl_then_revalidated(self):
+        self.assertEqual(mp.fetch_latest_release(), ("2.0.0", "network"))
+        self.assertEqual(mp.fetch_latest_release(), ("2.0.0", "cache"))
+        self.assertEqual(self.server.requests, [None])
+
+        with patch.object(mp, "RELEASES_CACHE_TTL_SECONDS", 0):
+            self.assertEqual(mp.fetch_latest_release(), ("2.0.0", "not-modified"))
+        self.assertEqual(self.server.requests, [None, '"2.0.0"'])
+
+    def test_unreachable_endpoint_falls_back_to_cache(self):
+        mp.fetch_latest_release()
+        self.server.close()
+        with patch.object(mp, "RELEASES_CACHE_TTL_SECONDS", 0):
+            self.assertEqual(mp.fetch_latest_release(), ("2.0.0", "stale"))
+
+    def test_check_reports_newer_release(self):
+        (self.tmp_dir / ".magic").mkdir()
+        (self.tmp_dir / ".magic" / ".version").write_text("1.9.0", encoding="utf-8")
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            mp.run_check(self.tmp_dir)
+        self.assertIn("Newer release available: 2.0.0", out.getvalue())
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            mp.run_check(self.tmp_dir, remote=False)
+        self.assertNotIn("Latest release", out.getvalue())
+
+    def test_version_ordering(self):
+        self.assertGreater(mp._version_key("1.10.0"), mp._version_key("1.9.3"))
+        self.assertEqual(mp._version_key("v1.2.0"), mp._version_key("1.2.0"))
+
+
+if __name__ == "__main__":
+    unittest.main()